@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Admission control for one worker process.
+
+Under a burst, requests pile up in front of the worker's threads and every
+one of them waits longer, until they all miss their deadline. Instead, each
+request is checked when it reaches a thread. The worker estimates the
+latency it would have if served:
+
+    queue wait + service time of its endpoint
+
+queue wait is how long the request waited for a thread (measured by the
+gthread worker in gunicorn_flask.conf.py, see queue_wait()); requests in
+flight on the worker's other threads only delay it through that wait. The
+service time is a moving average of how long admitted requests to the same
+endpoint took to handle, so a single-row /predict is not judged by the
+cost of large batches. When the estimate exceeds the latency target, the
+request is rejected at once. The rejection costs a fraction of a
+prediction, so the queue drains and the requests that are admitted stay
+within the target.
+"""
+
+import threading
+from collections import Counter
+
+class AdmissionController:
+    """Tracks in-flight requests and service time of a worker and sheds requests that would miss a latency target."""
+
+    def __init__(self, target_seconds, smoothing=0.1):
+        self.target = float(target_seconds)
+        self.smoothing = float(smoothing)
+
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.service_times = {}
+        self.admitted = Counter()
+        self.shed = Counter()
+
+    def enter(self, endpoint, queue_wait):
+        """Count a request as in flight; returns whether to handle it (True) or shed it (False)."""
+        with self._lock:
+            self.in_flight += 1
+            # Counting at most half the target for the request's own service
+            # time keeps an endpoint that is slower than the target from being
+            # shed forever (its average would never update); it is shed only
+            # once its requests queue
+            expected = queue_wait + min(self.service_times.get(endpoint, 0.0), self.target / 2)
+            if expected > self.target:
+                self.shed[endpoint] += 1
+                return False
+            self.admitted[endpoint] += 1
+            return True
+
+    def leave(self, endpoint, seconds, admitted):
+        """Count a request entered with enter() as finished after handling it for seconds."""
+        with self._lock:
+            self.in_flight -= 1
+            if admitted:
+                average = self.service_times.get(endpoint)
+                self.service_times[endpoint] = seconds if average is None else \
+                    average + self.smoothing * (seconds - average)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'target_seconds': self.target,
+                'in_flight': self.in_flight,
+                'service_time_seconds': dict(self.service_times),
+                'admitted': dict(self.admitted),
+                'shed': dict(self.shed)
+            }
+
+def queue_wait():
+    """
+    Seconds the current request waited for the thread handling it.
+
+    QueueTimedWorker (gunicorn_flask.conf.py) stores it on the thread when
+    the thread picks the connection up; elsewhere it is 0.
+    """
+    return getattr(threading.current_thread(), 'request_queue_wait', 0.0)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Asyncio-native (ASGI) variant of the career prediction API.
+
+Serves the same /, /health, /predict, /predict/batch, /metrics and /admin contract as
+flask_server.py, with the same CORS origins, but holds connections on the
+event loop instead of in sync worker processes, so a single small instance
+can keep thousands of idle keep-alive connections from the frontend open.
+Request bodies are decoded, scored and encoded in a bounded thread or
+process pool so CPU-bound inference never blocks the event loop.
+
+Run it with uvicorn:
+
+    uvicorn scripts.asgi_server:app --port 8000
+
+or under gunicorn with the shipped config:
+
+    gunicorn -c scripts/gunicorn_asgi.conf.py scripts.asgi_server:app
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(SCRIPT_DIR)
+
+import prediction_service as service
+from metrics import metrics, profiler
+
+# 'thread' shares the model loaded in this process; 'process' runs inference
+# in separate interpreters (each loads its own copy of the model). Their stage
+# timings are sent back and counted in this process's /metrics, but the
+# profiler only samples this process, so it does not see inference there
+INFERENCE_EXECUTOR = os.environ.get('INFERENCE_EXECUTOR', 'thread')
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', os.cpu_count() or 1))
+
+# Predictions queued for the pool at once; further requests wait on the
+# event loop, which costs nothing but a coroutine per connection
+MAX_PENDING_PREDICTIONS = int(os.environ.get('MAX_PENDING_PREDICTIONS', 4 * INFERENCE_WORKERS))
+
+# Largest accepted request body
+MAX_BODY_BYTES = int(os.environ.get('MAX_BODY_BYTES', 8 * 1024 * 1024))
+
+CORS_ALLOW_METHODS = 'DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT'
+
+ROUTES = {
+    '/': {'GET'},
+    '/health': {'GET'},
+    '/predict': {'POST'},
+    '/predict/batch': {'POST'},
+    '/feedback': {'POST'},
+    '/metrics': {'GET'},
+    '/admin/model': {'GET'},
+    '/admin/model/rollback': {'POST'},
+    '/admin/profile': {'GET'},
+    '/admin/profile/start': {'POST'},
+    '/admin/profile/stop': {'POST'}
+}
+
+def handle_prediction(path, body, packed=False):
+    """
+    Decode, handle and encode a prediction or feedback request; runs in the inference pool.
+
+    Returns the response body, status, content type and extra headers.
+    """
+    service.request_started()
+    try:
+        if packed:
+            max_rows = 1 if path == '/predict' else service.MAX_BATCH_SIZE
+            payload, status, headers = service.predict_packed(body, max_rows)
+            if isinstance(payload, bytes):
+                return payload, status, service.BINARY_CONTENT_TYPE.encode(), [
+                    (name.lower().encode(), value.encode('latin-1')) for name, value in headers.items()
+                ]
+            return json.dumps(payload, sort_keys=True).encode(), status, b'application/json', []
+        try:
+            with metrics.timed('parse'):
+                data = json.loads(body)
+        except ValueError:
+            payload, status = service.error('Request body must be valid JSON', 400)
+        else:
+            if path == '/predict':
+                payload, status = service.predict_traits(data)
+            elif path == '/feedback':
+                payload, status = service.record_feedback(data)
+            else:
+                payload, status = service.predict_trait_batch(data)
+        with metrics.timed('serialize'):
+            return json.dumps(payload, sort_keys=True).encode(), status, b'application/json', []
+    finally:
+        profiler.request_finished()
+
+def handle_prediction_in_process(path, body, packed=False):
+    """handle_prediction for a process pool; also returns the stage timings it recorded."""
+    with metrics.capture() as stages:
+        return handle_prediction(path, body, packed), stages
+
+def _create_executor():
+    if INFERENCE_EXECUTOR == 'process':
+        return ProcessPoolExecutor(max_workers=INFERENCE_WORKERS)
+    return ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix='inference')
+
+executor = None
+pending = None
+_startup_lock = None
+
+async def startup():
+    """Create the inference pool once, from lifespan startup or from the first request."""
+    global executor, pending, _startup_lock
+    # Created on the serving loop; nothing awaits between the check and the assignment
+    if _startup_lock is None:
+        _startup_lock = asyncio.Lock()
+    async with _startup_lock:
+        if executor is not None:
+            return
+        pending = asyncio.Semaphore(MAX_PENDING_PREDICTIONS)
+        executor = _create_executor()
+        # /health answers 503 until the warm-up predictions have run in this process
+        service.ensure_warm_up()
+
+async def shutdown():
+    if executor is not None:
+        executor.shutdown(wait=True)
+    service.shutdown()
+
+def cors_headers(request_headers):
+    """Headers echoing an allowed Origin, as flask-cors does."""
+    origin = request_headers.get(b'origin', b'').decode('latin-1')
+    if origin not in service.CORS_ORIGINS:
+        return []
+    return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+
+async def send_response(send, status, body, headers, content_type=b'application/json'):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type),
+            (b'content-length', str(len(body)).encode())
+        ] + headers
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, payload, status, headers):
+    await send_response(send, status, json.dumps(payload, sort_keys=True).encode(), headers)
+
+async def read_body(receive):
+    """Read the full request body, or return None once it exceeds MAX_BODY_BYTES."""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await startup()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point."""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    start = time.perf_counter()
+    started = time.time()
+    path = scope['path'].rstrip('/') or '/'
+    endpoint = path if path in ROUTES else 'unmatched'
+    statuses = []
+    # Raw bodies for the request log; its writer thread encodes them
+    logged = service.logs_requests(endpoint)
+    request_chunks, response_chunks, response_types = [], [], []
+
+    async def receive_and_record():
+        message = await receive()
+        if logged and message['type'] == 'http.request':
+            request_chunks.append(message.get('body', b''))
+        return message
+
+    async def send_and_record(message):
+        if message['type'] == 'http.response.start':
+            statuses.append(message['status'])
+            if logged:
+                response_types.extend(value for name, value in message['headers'] if name == b'content-type')
+        elif logged and message['type'] == 'http.response.body':
+            response_chunks.append(message.get('body', b''))
+        await send(message)
+
+    try:
+        await handle_http(scope, receive_and_record, send_and_record)
+    finally:
+        status = statuses[0] if statuses else 500
+        seconds = time.perf_counter() - start
+        metrics.observe_request(endpoint, status, seconds)
+        if logged:
+            request_type = dict(scope['headers']).get(b'content-type', b'').split(b';')[0].strip().decode('latin-1')
+            response_type = response_types[0].split(b';')[0].decode('latin-1') if response_types else ''
+            service.log_request(started, scope['method'], endpoint, status, seconds, b''.join(request_chunks),
+                                request_type, b''.join(response_chunks), response_type)
+
+async def handle_http(scope, receive, send):
+    if executor is None:
+        # Servers without lifespan support; concurrent first requests share one pool
+        await startup()
+
+    path = scope['path'].rstrip('/') or '/'
+    method = scope['method']
+    request_headers = dict(scope['headers'])
+    headers = cors_headers(request_headers)
+
+    if path not in ROUTES:
+        await send_json(send, service.error('Not found', 404)[0], 404, headers)
+        return
+
+    if method == 'OPTIONS':
+        # CORS preflight
+        if headers:
+            headers.append((b'access-control-allow-methods', CORS_ALLOW_METHODS.encode()))
+            requested = request_headers.get(b'access-control-request-headers')
+            if requested:
+                headers.append((b'access-control-allow-headers', requested))
+        allow = ', '.join(sorted(ROUTES[path] | {'OPTIONS'})).encode()
+        await send_response(send, 200, b'', headers + [(b'allow', allow)], b'text/html; charset=utf-8')
+        return
+
+    if method not in ROUTES[path]:
+        await send_json(send, service.error('Method not allowed', 405)[0], 405, headers)
+        return
+
+    if path == '/':
+        await send_json(send, {
+            'message': 'Career Prediction API is running',
+            'endpoints': {
+                'health': '/health (GET)',
+                'predict': '/predict (POST)',
+                'predict_batch': '/predict/batch (POST)',
+                'feedback': '/feedback (POST)',
+                'metrics': '/metrics (GET)',
+                'model': '/admin/model (GET)',
+                'model_rollback': '/admin/model/rollback (POST)',
+                'profile': '/admin/profile (GET), /admin/profile/start (POST), /admin/profile/stop (POST)'
+            }
+        }, 200, headers)
+        return
+
+    if path == '/health':
+        payload, status = service.health()
+        await send_json(send, payload, status, headers)
+        return
+
+    if path == '/metrics':
+        await send_response(send, 200, service.metrics_text().encode(), headers,
+                            b'text/plain; version=0.0.4; charset=utf-8')
+        return
+
+    if path.startswith('/admin/'):
+        authorization = request_headers.get(b'authorization', b'').decode('latin-1')
+        denied = service.authorize_admin(authorization)
+        if denied:
+            await send_json(send, *denied, headers)
+            return
+        if path == '/admin/profile':
+            query = urllib.parse.parse_qs(scope.get('query_string', b'').decode('latin-1'))
+            top = int(query['top'][0]) if query.get('top', [''])[0].isdigit() else None
+            dump = profiler.dump(top, query.get('reset') == ['1'])
+            await send_response(send, 200, dump.encode(), headers, b'text/plain; charset=utf-8')
+            return
+        if path == '/admin/profile/start':
+            body = await read_body(receive)
+            try:
+                interval_ms = json.loads(body).get('interval_ms') if body else None
+            except (ValueError, AttributeError):
+                interval_ms = None
+            await send_json(send, *service.start_profiler(interval_ms), headers)
+            return
+        if path == '/admin/profile/stop':
+            await send_json(send, *service.stop_profiler(), headers)
+            return
+        # Rollback loads a model version, so keep it off the event loop
+        handler = service.model_info if path == '/admin/model' else service.rollback_model
+        payload, status = await asyncio.get_running_loop().run_in_executor(None, handler)
+        await send_json(send, payload, status, headers)
+        return
+
+    content_type = request_headers.get(b'content-type', b'').split(b';')[0].strip()
+    # Feedback only comes as JSON; the prediction endpoints also take packed rows
+    accepted = 'application/json' if path == '/feedback' else f'application/json or {service.BINARY_CONTENT_TYPE}'
+    packed = content_type == service.BINARY_CONTENT_TYPE.encode() and path != '/feedback'
+    if content_type != b'application/json' and not packed:
+        await send_json(send, service.error(f'Content-Type must be {accepted}', 415)[0], 415, headers)
+        return
+
+    body = await read_body(receive)
+    if body is None:
+        await send_json(send, service.error(f'Request body must be at most {MAX_BODY_BYTES} bytes', 413)[0],
+                        413, headers)
+        return
+
+    # Feedback is buffered by this process's feedback writer, which also
+    # flushes it at exit; inference pool processes exit without running it
+    pool = None if path == '/feedback' else executor
+    async with pending:
+        loop = asyncio.get_running_loop()
+        if pool is not None and INFERENCE_EXECUTOR == 'process':
+            (response, status, response_type, extra_headers), stages = await loop.run_in_executor(
+                pool, handle_prediction_in_process, path, body, packed)
+            for stage, seconds in stages:
+                metrics.observe_stage(stage, seconds)
+        else:
+            response, status, response_type, extra_headers = await loop.run_in_executor(
+                pool, handle_prediction, path, body, packed)
+    await send_response(send, status, response, headers + extra_headers, response_type)
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8000))
+    uvicorn.run(app, host='127.0.0.1', port=port, timeout_keep_alive=75, backlog=4096)
@@ -0,0 +1,359 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Load-testing and latency benchmark for the career prediction API.
+
+Starts the API locally (the Flask app in this process, or under gunicorn
+with gunicorn_flask.conf.py or ASGI workers) or targets a running server,
+drives /predict or /predict/batch and reports throughput and
+p50/p95/p99/p99.9 latency.
+
+Two load models are supported:
+
+- closed loop (--concurrency): N clients each send a request as soon as
+  their previous one completes; measures the throughput the server sustains
+- open loop (--rates): requests arrive on a fixed schedule whatever the
+  server does; latency is measured from the scheduled send time, so a
+  stalled server shows up in the tail instead of silently slowing the load
+
+    python benchmark_api.py --server gunicorn --workers 2 --concurrency 1 8 32 --rates 100 200 --output run.json
+    python benchmark_api.py --server gunicorn --compare baseline.json --output run.json
+
+Results are saved as JSON together with the git commit and model version;
+--compare fails (exit status 1) if any scenario's throughput dropped or its
+p99 latency grew by more than --tolerance relative to an earlier run.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPT_DIR)
+
+SERVERS = ('inprocess', 'gunicorn', 'gunicorn-asgi', 'url')
+PERCENTILES = (50, 95, 99, 99.9)
+
+class Client:
+    """A keep-alive HTTP connection that reconnects when the server closes it."""
+
+    def __init__(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.connection = None
+
+    def post(self, path, body):
+        return self.send(path, body)[0]
+
+    def send(self, path, body, content_type='application/json'):
+        """POST body; returns the status, the response body and its content type."""
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request('POST', path, body, {'Content-Type': content_type})
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.close()
+                return response.status, data, response.getheader('Content-Type', '')
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+def make_bodies(endpoint, batch_size, n_bodies=1000, seed=0, explain=False):
+    """Pre-encoded request bodies with random trait vectors."""
+    rng = np.random.default_rng(seed)
+    options = {'explain': True} if explain else {}
+    if endpoint == '/predict':
+        traits = np.round(rng.uniform(1, 10, (n_bodies, 5)), 1)
+        return [json.dumps({'personality_traits': row.tolist(), **options}).encode() for row in traits]
+    traits = np.round(rng.uniform(1, 10, (n_bodies, batch_size, 5)), 1)
+    return [json.dumps({'personality_traits': batch.tolist(), **options}).encode() for batch in traits]
+
+def summarize(latencies, statuses, seconds, rows_per_request):
+    latencies = np.array(latencies) * 1000
+    statuses = np.array(statuses)
+    ok = int((statuses == 200).sum())
+    summary = {
+        'requests': len(statuses),
+        'errors': len(statuses) - ok,
+        'seconds': seconds,
+        'requests_per_second': len(statuses) / seconds,
+        'rows_per_second': ok * rows_per_request / seconds,
+        'mean_ms': float(latencies.mean()) if len(latencies) else None,
+        'max_ms': float(latencies.max()) if len(latencies) else None
+    }
+    for p in PERCENTILES:
+        summary[f'p{p:g}_ms'] = float(np.percentile(latencies, p)) if len(latencies) else None
+    return summary
+
+def format_ms(value):
+    """A latency for the result table; '-' when the scenario completed no requests."""
+    return f"{value:>9.2f}" if value is not None else f"{'-':>9}"
+
+def run_closed_loop(url, endpoint, bodies, concurrency, duration):
+    """concurrency clients, each sending its next request when the last one completes."""
+    deadline = time.perf_counter() + duration
+    results = [[] for _ in range(concurrency)]
+
+    def client_loop(i):
+        client = Client(url)
+        j = i
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = client.post(endpoint, bodies[j % len(bodies)])
+            except (http.client.HTTPException, OSError):
+                status = 0
+            results[i].append((time.perf_counter() - start, status))
+            j += concurrency
+        client.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    samples = [sample for client_results in results for sample in client_results]
+    return [latency for latency, _ in samples], [status for _, status in samples], seconds
+
+def run_open_loop(url, endpoint, bodies, rate, duration, max_connections):
+    """Send rate requests per second on a fixed schedule through up to max_connections connections."""
+    scheduled = queue.Queue()
+    samples = []
+    lock = threading.Lock()
+
+    def sender():
+        client = Client(url)
+        while True:
+            item = scheduled.get()
+            if item is None:
+                break
+            send_at, body = item
+            try:
+                status = client.post(endpoint, body)
+            except (http.client.HTTPException, OSError):
+                status = 0
+            # Latency from the scheduled time includes any wait for a free connection
+            with lock:
+                samples.append((time.perf_counter() - send_at, status))
+        client.close()
+
+    threads = [threading.Thread(target=sender) for _ in range(max_connections)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    n_requests = int(rate * duration)
+    for i in range(n_requests):
+        send_at = start + i / rate
+        delay = send_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        scheduled.put((send_at, bodies[i % len(bodies)]))
+    for _ in threads:
+        scheduled.put(None)
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+
+    return [latency for latency, _ in samples], [status for _, status in samples], seconds
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def wait_until_healthy(url, timeout=120):
+    parsed = urllib.parse.urlsplit(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=5)
+            connection.request('GET', '/health')
+            response = connection.getresponse()
+            payload = json.loads(response.read())
+            connection.close()
+            if response.status == 200:
+                return payload
+        except (http.client.HTTPException, OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {url} did not become healthy within {timeout}s")
+
+def start_server(args, env=None):
+    """
+    Start the API as configured; returns its base URL and a function that stops it.
+
+    env holds environment variables to set for the server, e.g. to point its
+    logs elsewhere; an in-process server sees them if it is first imported here.
+    """
+    if args.server == 'url':
+        return args.url, lambda: None
+
+    port = free_port()
+    if args.server == 'inprocess':
+        os.environ.update(env or {})
+        from werkzeug.serving import make_server
+        # Per-request access log lines would cost more than the requests
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        sys.path.append(SCRIPT_DIR)
+        from flask_server import app
+        server = make_server('127.0.0.1', port, app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return f'http://127.0.0.1:{port}', server.shutdown
+
+    if args.server == 'gunicorn':
+        # The production settings (preloading, gc.freeze, gthread workers, warm-up)
+        command = ['gunicorn', '-c', 'scripts/gunicorn_flask.conf.py', 'scripts.flask_server:app',
+                   '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers)]
+        if args.threads:
+            command += ['--threads', str(args.threads)]
+    else:
+        command = ['gunicorn', '-c', 'scripts/gunicorn_asgi.conf.py', 'scripts.asgi_server:app',
+                   '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers)]
+    process = subprocess.Popen(command, cwd=REPO_DIR, env={**os.environ, **(env or {})},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop():
+        process.terminate()
+        process.wait()
+
+    return f'http://127.0.0.1:{port}', stop
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def scenario_key(result):
+    return (result['server'], result['endpoint'], result['batch_size'], result.get('explain', False),
+            result['mode'], result['load'])
+
+def compare(results, baseline, tolerance):
+    """Scenarios whose throughput or p99 latency regressed by more than tolerance against the baseline run."""
+    previous = {scenario_key(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(scenario_key(result))
+        if before is None:
+            continue
+        if result['requests_per_second'] < before['requests_per_second'] * (1 - tolerance):
+            regressions.append(f"{scenario_key(result)}: throughput {before['requests_per_second']:.1f} -> "
+                               f"{result['requests_per_second']:.1f} req/s")
+        if result['p99_ms'] is not None and before['p99_ms'] is not None \
+                and result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{scenario_key(result)}: p99 {before['p99_ms']:.1f} -> {result['p99_ms']:.1f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput and tail latency of the prediction API.")
+    parser.add_argument('--server', choices=SERVERS, default='inprocess',
+                        help="inprocess (Flask in this process), gunicorn (gunicorn_flask.conf.py), "
+                             "gunicorn-asgi (uvicorn workers) or url (an already running server)")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server to target with --server url")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int,
+                        help="threads per gunicorn worker (default: as in gunicorn_flask.conf.py)")
+    parser.add_argument('--endpoint', choices=('predict', 'batch'), default='predict')
+    parser.add_argument('--batch-size', type=int, default=100, help="rows per /predict/batch request")
+    parser.add_argument('--explain', action='store_true', help="request per-trait explanations with every prediction")
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8], help="closed-loop client counts")
+    parser.add_argument('--rates', type=float, nargs='*', default=[], help="open-loop arrival rates in requests/s")
+    parser.add_argument('--max-connections', type=int, default=64, help="connections available to open-loop runs")
+    parser.add_argument('--duration', type=float, default=10, help="seconds per scenario")
+    parser.add_argument('--warmup', type=float, default=2, help="seconds of load before measuring")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="earlier results JSON to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args()
+
+    endpoint = '/predict' if args.endpoint == 'predict' else '/predict/batch'
+    rows_per_request = 1 if args.endpoint == 'predict' else args.batch_size
+    bodies = make_bodies(endpoint, args.batch_size, explain=args.explain)
+
+    url, stop = start_server(args)
+    try:
+        health = wait_until_healthy(url)
+        if args.warmup:
+            run_closed_loop(url, endpoint, bodies, max(args.concurrency or [1]), args.warmup)
+
+        results = []
+        scenarios = [('closed', c) for c in args.concurrency] + [('open', r) for r in args.rates]
+        print(f"{'mode':<7} {'load':>8} {'req/s':>9} {'rows/s':>10} {'errors':>7} "
+              + ' '.join(f"{f'p{p:g} ms':>9}" for p in PERCENTILES))
+        for mode, load in scenarios:
+            if mode == 'closed':
+                latencies, statuses, seconds = run_closed_loop(url, endpoint, bodies, load, args.duration)
+            else:
+                latencies, statuses, seconds = run_open_loop(url, endpoint, bodies, load, args.duration,
+                                                             args.max_connections)
+            result = {
+                'server': args.server,
+                'endpoint': endpoint,
+                'batch_size': rows_per_request,
+                'explain': args.explain,
+                'mode': mode,
+                'load': load,
+                **summarize(latencies, statuses, seconds, rows_per_request)
+            }
+            results.append(result)
+            print(f"{mode:<7} {load:>8g} {result['requests_per_second']:>9.1f} {result['rows_per_second']:>10.0f} "
+                  f"{result['errors']:>7} " + ' '.join(format_ms(result[f'p{p:g}_ms']) for p in PERCENTILES))
+    finally:
+        stop()
+
+    run = {
+        'commit': git_commit(),
+        'model_version': health.get('model_version'),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'server': args.server,
+        'workers': args.workers if args.server.startswith('gunicorn') else None,
+        'threads': args.threads if args.server == 'gunicorn' else None,
+        'duration': args.duration,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit')}, "
+              f"model {baseline.get('model_version')}):")
+        if regressions:
+            for regression in regressions:
+                print(f"  REGRESSION {regression}")
+            sys.exit(1)
+        print(f"  no regressions beyond {args.tolerance:.0%}")
+
+if __name__ == "__main__":
+    main()
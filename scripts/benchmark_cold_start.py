@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cold-start benchmark of the serving process.
+
+On a scale-to-zero instance a request that wakes the service waits for the
+interpreter to start, the serving modules to import, the model to load and
+the worker to warm up. For each server this script reports:
+
+- the import time of the serving module, from python -X importtime, with the
+  heaviest packages it pulls in; pandas and sklearn (--forbid) must not be
+  among them, the compiled engine serves from NumPy arrays alone
+- the time from starting the server process to its first successful
+  /predict response, with the deployed settings and a single worker
+
+It exits with status 1 when a forbidden module is imported or the median
+time to first response exceeds --budget-ms, so it can run in CI:
+
+    python benchmark_cold_start.py [--servers gunicorn asgi] [--runs 3] [--budget-ms 1500]
+"""
+
+import argparse
+import http.client
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmark_api import REPO_DIR, SCRIPT_DIR, free_port
+
+# Module imported by each server, and the command starting it from the repository root
+SERVERS = {
+    'gunicorn': ('flask_server', ['gunicorn', '-c', 'scripts/gunicorn_flask.conf.py', 'scripts.flask_server:app',
+                                  '--workers', '1', '--bind', '127.0.0.1:{port}']),
+    'asgi': ('asgi_server', ['uvicorn', '--app-dir', 'scripts', 'asgi_server:app', '--port', '{port}'])
+}
+
+# About three times what a single-core instance needs today (interpreter,
+# imports, model load and warm-up), leaving room for slower cold disks
+DEFAULT_BUDGET_MS = 1500
+FORBIDDEN_MODULES = ('pandas', 'sklearn')
+
+def import_profile(module):
+    """
+    Import module in a fresh interpreter with -X importtime.
+
+    Returns the total import time in ms and {name: (self_ms, cumulative_ms)}
+    for every module imported.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+    modules = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            # Top-level imports include everything they import in turn
+            total_us += int(cumulative_us)
+        modules[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+    return total_us / 1000, modules
+
+def imported(modules, package):
+    return any(name == package or name.startswith(package + '.') for name in modules)
+
+def time_to_first_response(server, timeout=60):
+    """Seconds from starting the server process until /predict answers 200."""
+    port = free_port()
+    command = [part.format(port=port) for part in SERVERS[server][1]]
+    body = json.dumps({'personality_traits': [7.5, 8.0, 6.2, 7.0, 4.5]})
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+                connection.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+                status = connection.getresponse().status
+                connection.close()
+                if status == 200:
+                    return time.perf_counter() - start
+            except OSError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f"{server} exited with status {process.returncode} before responding")
+            time.sleep(0.005)
+        raise RuntimeError(f"{server} did not answer /predict within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first response of the API.")
+    parser.add_argument('--servers', nargs='+', choices=list(SERVERS), default=list(SERVERS))
+    parser.add_argument('--runs', type=int, default=3, help="cold starts per server; the median is reported")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help="largest acceptable median time to first response")
+    parser.add_argument('--forbid', nargs='*', default=list(FORBIDDEN_MODULES),
+                        help="packages the serving process must not import")
+    parser.add_argument('--top', type=int, default=8, help="heaviest imported packages to list")
+    args = parser.parse_args()
+
+    failures = []
+    for server in args.servers:
+        module = SERVERS[server][0]
+        profiles = [import_profile(module) for _ in range(args.runs)]
+        import_ms = statistics.median(total for total, _ in profiles)
+        modules = profiles[-1][1]
+
+        print(f"\n{server}: importing {module} takes {import_ms:.0f} ms (median of {args.runs})")
+        packages = sorted(((name, times) for name, times in modules.items() if '.' not in name and name != module),
+                          key=lambda item: -item[1][1])
+        for name, (self_ms, cumulative_ms) in packages[:args.top]:
+            print(f"  {name:<24} {cumulative_ms:>8.1f} ms ({self_ms:.1f} ms in the module itself)")
+        for package in args.forbid:
+            if imported(modules, package):
+                failures.append(f"{server} imports {package}")
+
+        timings = [time_to_first_response(server) * 1000 for _ in range(args.runs)]
+        first_response_ms = statistics.median(timings)
+        print(f"  time to first response: {first_response_ms:.0f} ms "
+              f"(runs: {', '.join(f'{t:.0f}' for t in timings)}; budget {args.budget_ms:.0f} ms)")
+        if first_response_ms > args.budget_ms:
+            failures.append(f"{server} took {first_response_ms:.0f} ms to its first response, "
+                            f"over the {args.budget_ms:.0f} ms budget")
+
+    if failures:
+        print('\n' + '\n'.join(failures))
+        sys.exit(1)
+    print("\nCold start within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compare per-worker memory and time to first prediction of the pickled model
+and the memory-mapped compiled forest.
+
+Starts a group of worker processes for each artifact format, the way gunicorn
+starts its workers. Every worker loads the model, makes one prediction and
+then waits until all workers of its group are up before reporting its
+resident set size (RSS), proportional set size (PSS, shared pages divided
+among the processes mapping them) and unique set size (USS). The PSS and USS
+figures show how much of the model each extra worker really costs.
+
+    python benchmark_model_load.py --workers 4 [--output results.json]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FORMATS = ('pickle', 'mmap')
+
+def memory_usage():
+    """RSS, PSS and USS of this process in MB (PSS and USS need Linux)."""
+    usage = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                usage['rss_mb'] = int(line.split()[1]) / 1024
+    try:
+        fields = {}
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+        usage['pss_mb'] = fields['Pss'] / 1024
+        usage['uss_mb'] = (fields['Private_Clean'] + fields['Private_Dirty']) / 1024
+    except (OSError, KeyError):
+        pass
+    return usage
+
+def run_worker(artifact_format, started_at):
+    """Body of one worker process: load, predict once, report."""
+    import numpy as np
+
+    load_start = time.time()
+    if artifact_format == 'pickle':
+        import pickle
+        import pandas as pd
+        with open(os.path.join(SCRIPT_DIR, 'models/career_prediction_model.pkl'), 'rb') as f:
+            model = pickle.load(f)
+        predict = lambda X: model.predict_proba(pd.DataFrame(X, columns=model.feature_names_in_))
+    else:
+        from forest_engine import load_compiled_forest
+        model = load_compiled_forest(os.path.join(SCRIPT_DIR, 'models/career_prediction_model'))
+        predict = model.predict_proba
+    load_seconds = time.time() - load_start
+
+    predict(np.array([[7.5, 8.0, 6.2, 7.0, 4.5]]))
+    first_prediction_seconds = time.time() - started_at
+
+    # Wait for the rest of the group so shared pages are counted once per group
+    print('ready', flush=True)
+    sys.stdin.readline()
+
+    print(json.dumps({
+        'load_ms': load_seconds * 1000,
+        'time_to_first_prediction_ms': first_prediction_seconds * 1000,
+        **memory_usage()
+    }), flush=True)
+
+def run_group(artifact_format, n_workers):
+    """Start n_workers processes at once and collect their reports."""
+    started_at = time.time()
+    workers = [
+        subprocess.Popen(
+            [sys.executable, '-W', 'ignore', __file__, '--worker', artifact_format, '--started-at', repr(started_at)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=SCRIPT_DIR
+        )
+        for _ in range(n_workers)
+    ]
+    for worker in workers:
+        if worker.stdout.readline().strip() != 'ready':
+            raise RuntimeError(f"{artifact_format} worker failed to start")
+
+    reports = []
+    for worker in workers:
+        worker.stdin.write('\n')
+        worker.stdin.flush()
+        reports.append(json.loads(worker.stdout.readline()))
+    for worker in workers:
+        worker.stdin.close()
+        worker.wait()
+    return reports
+
+def summarize(reports):
+    keys = reports[0].keys()
+    return {key: sum(report[key] for report in reports) / len(reports) for key in keys}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model artifact formats across worker processes.")
+    parser.add_argument('--workers', type=int, default=4, help="worker processes per format")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--worker', choices=FORMATS, help=argparse.SUPPRESS)
+    parser.add_argument('--started-at', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.append(SCRIPT_DIR)
+        run_worker(args.worker, args.started_at)
+        return
+
+    results = {}
+    for artifact_format in args.formats:
+        results[artifact_format] = summarize(run_group(artifact_format, args.workers))
+
+    print(f"Mean per worker over {args.workers} workers:")
+    print(f"{'format':<8} {'load ms':>9} {'first pred ms':>14} {'RSS MB':>8} {'PSS MB':>8} {'USS MB':>8}")
+    for artifact_format, summary in results.items():
+        print(f"{artifact_format:<8} {summary['load_ms']:>9.1f} {summary['time_to_first_prediction_ms']:>14.1f} "
+              f"{summary['rss_mb']:>8.1f} {summary.get('pss_mb', float('nan')):>8.1f} "
+              f"{summary.get('uss_mb', float('nan')):>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'workers': args.workers, 'results': results}, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
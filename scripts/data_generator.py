@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized, chunked and parallel generator of synthetic training data.
+
+Rows are labelled with the same rules as generate_sample_data() in
+train_model.py, applied to whole arrays with masks. Large datasets are
+produced in fixed-size chunks; chunk i draws from its own random stream
+derived from (seed, i) with numpy's SeedSequence, so the output depends only
+on the seed and chunk size, never on the number of worker processes.
+
+Chunks are written to a directory in a columnar layout, one uncompressed
+.npz file per chunk holding a float64 array per trait and the careers as
+uint8 codes into the class list in manifest.json:
+
+    python data_generator.py --rows 10000000 --output data/synthetic [--chunk-size 1000000] [--workers 4]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+TRAITS = ['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness', 'Neuroticism']
+
+# Careers in code order: the rule-based careers, then the fallback careers
+# assigned at random to rows no rule matches
+RULE_CAREERS = [
+    'Research Scientist',
+    'Marketing Creative',
+    'Healthcare Professional',
+    'Sales Representative',
+    'Financial Analyst',
+    'Software Developer',
+    'Entrepreneur'
+]
+FALLBACK_CAREERS = ['Project Manager', 'Teacher', 'HR Professional', 'Designer']
+CAREERS = RULE_CAREERS + FALLBACK_CAREERS
+FALLBACK_CODES = np.arange(len(RULE_CAREERS), len(CAREERS), dtype=np.uint8)
+
+DEFAULT_SEED = 42
+DEFAULT_CHUNK_SIZE = 1_000_000
+MANIFEST_NAME = 'manifest.json'
+
+def label_careers(openness, conscientiousness, extraversion, agreeableness, neuroticism, rng):
+    """
+    Career codes for arrays of trait scores.
+
+    The first matching rule wins, as in the original if/elif chain. Rows no
+    rule matches get a fallback career from rng.choice, drawn in row order
+    with a single call, which consumes the random stream exactly like one
+    call per row.
+    """
+    rules = [
+        (openness > 7) & (conscientiousness > 7),
+        (openness > 7) & (extraversion > 7),
+        (conscientiousness > 7) & (agreeableness > 7),
+        (extraversion > 7) & (agreeableness > 7),
+        (conscientiousness > 7) & (neuroticism < 4),
+        (openness > 7) & (neuroticism < 4),
+        (extraversion > 7) & (neuroticism < 4)
+    ]
+    codes = np.select(rules, np.arange(len(rules), dtype=np.uint8), default=len(CAREERS)).astype(np.uint8)
+    fallback = codes == len(CAREERS)
+    codes[fallback] = rng.choice(FALLBACK_CODES, size=int(fallback.sum()))
+    return codes
+
+def chunk_rng(seed, chunk_index):
+    """Independent random generator of one chunk."""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+
+def generate_chunk(chunk_index, n_rows, seed=DEFAULT_SEED):
+    """Trait columns and career codes of one chunk, as a dict of arrays."""
+    rng = chunk_rng(seed, chunk_index)
+    columns = {trait: rng.uniform(1, 10, n_rows) for trait in TRAITS}
+    columns['Career'] = label_careers(*(columns[trait] for trait in TRAITS), rng)
+    return columns
+
+def chunk_path(path, chunk_index):
+    return os.path.join(path, f'chunk-{chunk_index:05d}.npz')
+
+def _write_chunk(args):
+    path, chunk_index, n_rows, seed = args
+    np.savez(chunk_path(path, chunk_index), **generate_chunk(chunk_index, n_rows, seed))
+    return chunk_index, n_rows
+
+def generate_dataset(path, n_rows, chunk_size=DEFAULT_CHUNK_SIZE, seed=DEFAULT_SEED, workers=None):
+    """
+    Generate n_rows rows into directory path, chunks in parallel.
+
+    Each worker writes its chunks straight to disk, so memory use is bounded
+    by workers x chunk_size rows however large the dataset is.
+    """
+    os.makedirs(path, exist_ok=True)
+    tasks = [
+        (path, i, min(chunk_size, n_rows - start), seed)
+        for i, start in enumerate(range(0, n_rows, chunk_size))
+    ]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            _write_chunk(task)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(_write_chunk, tasks):
+                pass
+
+    manifest = {
+        'rows': n_rows,
+        'chunk_size': chunk_size,
+        'seed': seed,
+        'traits': TRAITS,
+        'classes': CAREERS,
+        'chunks': [os.path.basename(chunk_path(path, task[1])) for task in tasks]
+    }
+    with open(os.path.join(path, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Dataset not found at {path}. Please run data_generator.py first.")
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def load_chunk(path, manifest, chunk_index):
+    """(X, codes) of one chunk: an (N, 5) float64 trait matrix and uint8 career codes."""
+    with np.load(os.path.join(path, manifest['chunks'][chunk_index]), allow_pickle=False) as arrays:
+        X = np.column_stack([arrays[trait] for trait in manifest['traits']])
+        return X, arrays['Career']
+
+def iter_chunks(path):
+    """Yield (X, codes) for every chunk in order."""
+    manifest = read_manifest(path)
+    for chunk_index in range(len(manifest['chunks'])):
+        yield load_chunk(path, manifest, chunk_index)
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic personality trait data in parallel chunks.")
+    parser.add_argument('--rows', type=int, required=True, help="number of rows to generate")
+    parser.add_argument('--output', default='data/synthetic', help="output directory")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="rows per chunk")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help="dataset seed")
+    parser.add_argument('--workers', type=int, help="worker processes (default: number of cores)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    manifest = generate_dataset(args.output, args.rows, args.chunk_size, args.seed, args.workers)
+    seconds = time.perf_counter() - start
+    print(f"Generated {manifest['rows']} rows in {len(manifest['chunks'])} chunks to {args.output} "
+          f"in {seconds:.1f}s ({manifest['rows'] / seconds:,.0f} rows/s)")
+
+if __name__ == "__main__":
+    main()
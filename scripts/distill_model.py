@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Distill the career prediction forest into a much smaller student model.
+
+The labels of the sample data follow a handful of trait rules, so a
+100-tree forest is far more model than they need, and every tree adds cost
+to each prediction. The student, a single regression tree or a shallow
+regression forest, is fitted on the teacher forest's predict_proba over
+densely sampled trait space (uniform rows, half of them snapped to the 0.5
+quiz grid), so it learns the teacher's soft class distributions rather than
+the noisy hard labels.
+
+The student is compiled into the same export format as the teacher (see
+forest_engine.py), so the API serves it like any other model, for instance
+after registering it with --register. The script reports accuracy on fresh
+labelled data, top-1 agreement with the teacher and latency, and refuses to
+write a student that loses more than --max-accuracy-loss against the
+teacher. Agreement is reported rather than enforced: where the rules fall
+back to random careers the teacher's top classes are near ties fitted to
+label noise, which a small student does not (and should not) reproduce.
+
+    python distill_model.py [--trees 1] [--max-depth 8] [--samples 200000] [--register]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from data_generator import CAREERS, DEFAULT_SEED, TRAITS, generate_chunk
+from forest_engine import DEFAULT_COMPILED_PATH, DEFAULT_MODEL_PATH, compile_forest, load_forest, save_compiled_forest
+from quantize_model import agreement, latency, memory_added
+
+DEFAULT_DISTILLED_PATH = 'models/career_prediction_model_distilled'
+
+def transfer_set(n_samples, n_features, seed):
+    """Uniform trait rows, every other one snapped to the 0.5 grid quiz answers fall on."""
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(1, 10, (n_samples, n_features))
+    X[::2] = np.rint(X[::2] * 2) / 2
+    return X
+
+def train_student(teacher, X, trees=1, max_depth=8, min_samples_leaf=20, seed=DEFAULT_SEED):
+    """Fit a regression tree (or forest) on the teacher's class probabilities and compile it."""
+    soft_targets = teacher.predict_proba(X)
+    params = {'max_depth': max_depth, 'min_samples_leaf': min_samples_leaf, 'random_state': seed}
+    if trees == 1:
+        student = DecisionTreeRegressor(**params)
+    else:
+        student = RandomForestRegressor(n_estimators=trees, n_jobs=-1, **params)
+    student.fit(pd.DataFrame(X, columns=teacher.feature_names_in_), soft_targets)
+
+    forest = compile_forest(student, classes=teacher.classes_)
+    # The compiled student must reproduce the estimator it was compiled from
+    check = X[:10000]
+    expected = student.predict(pd.DataFrame(check, columns=teacher.feature_names_in_))
+    if not np.allclose(forest.predict_proba(check), expected):
+        raise AssertionError("Compiled student differs from the fitted regressor")
+    return forest
+
+def labelled_accuracy(forest, n_rows, seed):
+    """Accuracy against fresh rows labelled by the data generator's career rules."""
+    columns = generate_chunk(0, n_rows, seed)
+    X = np.column_stack([columns[trait] for trait in TRAITS])
+    return float((forest.predict(X) == np.array(CAREERS)[columns['Career']]).mean())
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the career forest into a smaller student model.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled teacher model")
+    parser.add_argument('--compiled', default=DEFAULT_COMPILED_PATH, help="compiled teacher export")
+    parser.add_argument('--output', default=DEFAULT_DISTILLED_PATH, help="where to write the student export")
+    parser.add_argument('--trees', type=int, default=1, help="trees in the student (1: a single decision tree)")
+    parser.add_argument('--max-depth', type=int, default=8)
+    parser.add_argument('--min-samples-leaf', type=int, default=20)
+    parser.add_argument('--samples', type=int, default=200000, help="rows of trait space labelled by the teacher")
+    parser.add_argument('--eval-samples', type=int, default=100000, help="fresh rows for accuracy and agreement")
+    parser.add_argument('--max-accuracy-loss', type=float, default=0.01,
+                        help="accuracy the student may give up against the teacher")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--register', action='store_true', help="register the student in the model registry")
+    args = parser.parse_args()
+
+    try:
+        teacher = load_forest(args.model, args.compiled)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
+
+    print(f"Labelling {args.samples} trait rows with the {teacher.n_estimators}-tree teacher...")
+    start = time.perf_counter()
+    X = transfer_set(args.samples, teacher.n_features_in_, args.seed)
+    student = train_student(teacher, X, args.trees, args.max_depth, args.min_samples_leaf, args.seed)
+    print(f"Trained a {args.trees}-tree student of depth {student.depth} with {len(student.threshold)} nodes "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    # Fresh inputs, independent of the transfer set
+    X_random = np.random.default_rng(args.seed + 1).uniform(1, 10, (args.eval_samples, teacher.n_features_in_))
+    X_grid = np.rint(X_random * 2) / 2
+    random_agreement, _ = agreement(teacher, student, X_random)
+    grid_agreement, _ = agreement(teacher, student, X_grid)
+
+    accuracy = {}
+    print(f"\n{'':<10} {'trees':>6} {'nodes':>8} {'rss':>10} {'pss':>10} {'accuracy':>9} {'us/row':>8} {'rows/s':>10}")
+    staging = tempfile.mkdtemp()
+    try:
+        for name, forest in (('teacher', teacher), ('student', student)):
+            accuracy[name] = labelled_accuracy(forest, args.eval_samples, args.seed + 2)
+            single, throughput = latency(forest, X_random[:10000])
+            # Memory a worker gains from loading the export, measured in a fresh process
+            save_compiled_forest(forest, os.path.join(staging, name))
+            memory = memory_added('compiled', os.path.join(staging, name))
+            pss = f"{memory['pss_mb']:>8.2f}MB" if 'pss_mb' in memory else f"{'-':>10}"
+            print(f"{name:<10} {forest.n_estimators:>6} {len(forest.threshold):>8} {memory['rss_mb']:>8.2f}MB {pss} "
+                  f"{accuracy[name]:>9.4f} {single:>8.0f} {throughput:>10,.0f}")
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    print(f"\nTop-1 agreement with the teacher: {random_agreement:.4%} on random rows, "
+          f"{grid_agreement:.4%} on 0.5 grid rows")
+
+    loss = accuracy['teacher'] - accuracy['student']
+    if loss > args.max_accuracy_loss:
+        print(f"\nThe student loses {loss:.4f} accuracy, more than the allowed {args.max_accuracy_loss:g}; "
+              f"nothing written. Try a deeper or larger student.")
+        sys.exit(1)
+
+    save_compiled_forest(student, args.output)
+    print(f"\nStudent {student.version} saved to {args.output}")
+
+    if args.register:
+        from model_registry import ModelRegistry
+        version = ModelRegistry().register(student, source=os.path.abspath(args.output))
+        print(f"Registered model version {version} (active)")
+
+if __name__ == "__main__":
+    main()
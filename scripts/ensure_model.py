@@ -6,11 +6,13 @@ This script ensures that a trained model exists for deployment.
 If no model exists, it will run the training script to create one.
 """
 
+import argparse
 import os
+import pickle
 import sys
 from pathlib import Path
 
-def ensure_model_exists():
+def ensure_model_exists(build_trait_grid=False, grid_step=None):
     # Get the directory of this script
     script_dir = Path(__file__).parent.absolute()
     
@@ -35,6 +37,48 @@ def ensure_model_exists():
             sys.exit(1)
     else:
         print(f"Model found at {model_path}")
+    
+    # Export the compiled forest if it is missing or older than the model
+    compiled_path = script_dir / 'models' / 'career_prediction_model'
+    compiled_manifest = compiled_path / 'manifest.json'
+    if model_path.exists() and (not compiled_manifest.exists()
+                                or compiled_manifest.stat().st_mtime < model_path.stat().st_mtime):
+        print("Compiled forest missing or out of date. Exporting...")
+        try:
+            sys.path.append(str(script_dir))
+            from forest_engine import export_compiled_forest
+            with open(model_path, 'rb') as f:
+                model = pickle.load(f)
+            export_compiled_forest(model, str(compiled_path))
+        except Exception as e:
+            print(f"Error exporting compiled forest: {e}")
+            sys.exit(1)
+    else:
+        print(f"Compiled forest found at {compiled_path}")
+    
+    # Optionally precompute the trait grid lookup table served with USE_TRAIT_GRID=1
+    if build_trait_grid:
+        grid_path = script_dir / 'models' / 'career_trait_grid.npz'
+        if (grid_step is None and grid_path.exists()
+                and grid_path.stat().st_mtime >= model_path.stat().st_mtime):
+            print(f"Trait grid found at {grid_path}")
+        else:
+            print("Building trait grid lookup table...")
+            try:
+                sys.path.append(str(script_dir))
+                from forest_engine import load_forest
+                from trait_grid import DEFAULT_STEP, export_trait_grid
+                forest = load_forest(str(model_path), str(compiled_path))
+                export_trait_grid(forest, str(grid_path), grid_step or DEFAULT_STEP)
+            except Exception as e:
+                print(f"Error building trait grid: {e}")
+                sys.exit(1)
 
 if __name__ == "__main__":
-    ensure_model_exists() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Make sure the trained model and its exports exist.")
+    parser.add_argument('--trait-grid', action='store_true',
+                        help="also build the trait grid lookup table")
+    parser.add_argument('--grid-step', type=float, default=None,
+                        help="trait grid resolution (rebuilds the table when given)")
+    args = parser.parse_args()
+    ensure_model_exists(build_trait_grid=args.trait_grid, grid_step=args.grid_step) 
\ No newline at end of file
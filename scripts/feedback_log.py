@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Append-only log of quiz feedback: the traits a user entered and the career
+they actually chose.
+
+The API records feedback without touching the disk on the request path.
+FeedbackLog.append() puts an entry in a bounded in-memory buffer and a
+background thread writes what has accumulated every flush interval (or as
+soon as max_batch entries wait) with a single write to the log opened in
+append mode, so the writes of several gunicorn workers land as whole lines.
+Each line is a JSON object:
+
+    {"time": 1760781234.5, "traits": [7.5, 8.0, 6.2, 7.0, 4.5], "career": "Engineer", "model_version": "5558cc3cf795"}
+
+refresh_model.py reads the entries logged since its previous run with
+read_feedback().
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+import numpy as np
+
+class FeedbackLog:
+    """Buffered, batched appender of feedback entries for one worker."""
+
+    def __init__(self, path, max_pending=10000, flush_interval=1.0, max_batch=1000):
+        self.path = path
+        self.max_pending = int(max_pending)
+        self.flush_interval = float(flush_interval)
+        self.max_batch = int(max_batch)
+
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+
+        self.written = 0
+        self.dropped = 0
+        # Servers flush on shutdown themselves; this covers the other exits
+        atexit.register(self.flush)
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own writer
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pending = []
+                thread = threading.Thread(target=self._run, name='feedback-writer', daemon=True)
+                thread.start()
+                self._pid = os.getpid()
+
+    def append(self, traits, career, model_version=None):
+        """Queue an entry for the next write; returns False if the buffer is full and it was dropped."""
+        self._ensure_started()
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((time.time(), traits, career, model_version))
+            if len(self._pending) >= self.max_batch:
+                self._wake.set()
+        return True
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Error writing feedback to {self.path}: {e}")
+
+    def flush(self):
+        """Write the buffered entries now."""
+        # Entries copied from a parent process at fork are not ours to write
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            entries, self._pending = self._pending, []
+        if not entries:
+            return
+        lines = ''.join(
+            json.dumps({'time': round(t, 3), 'traits': traits, 'career': career, 'model_version': version},
+                       separators=(',', ':')) + '\n'
+            for t, traits, career, version in entries
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'ab') as f:
+            f.write(lines.encode())
+        self.written += len(entries)
+
+def read_feedback(path, offset=0):
+    """
+    Feedback entries appended to the log after byte offset.
+
+    Returns (X, careers, offset): an (N, n_traits) float array, the chosen
+    careers and the offset to continue from next time. A line still being
+    written, and lines that do not parse, are skipped.
+    """
+    if not os.path.exists(path):
+        return np.empty((0, 0)), np.array([], dtype=str), offset
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+    complete = data[:data.rfind(b'\n') + 1]
+
+    traits, careers = [], []
+    for line in complete.splitlines():
+        try:
+            entry = json.loads(line)
+            row = [float(value) for value in entry['traits']]
+            career = str(entry['career'])
+        except (ValueError, KeyError, TypeError):
+            continue
+        traits.append(row)
+        careers.append(career)
+    X = np.array(traits, dtype=np.float64) if traits else np.empty((0, 0))
+    return X, np.array(careers, dtype=str), offset + len(complete)
@@ -7,52 +7,81 @@ This script loads the pre-trained RandomForestClassifier model and exposes
 an endpoint for making predictions.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
+from functools import partial
 import os
-import pickle
-import pandas as pd
-import numpy as np
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(SCRIPT_DIR)
+
+import prediction_service as service
+from metrics import metrics, profiler
 
 app = Flask(__name__)
 # Configure CORS to allow requests from both production and development environments
-CORS(app, origins=["https://r-career-fe999.web.app", "http://localhost:3000", "http://127.0.0.1:3000"])
-
-# Traits expected by the model
-EXPECTED_TRAITS = [
-    'Openness', 
-    'Conscientiousness', 
-    'Extraversion', 
-    'Agreeableness', 
-    'Neuroticism'
-]
-
-# Load the model when the server starts
-MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models/career_prediction_model.pkl')
-
-def load_model():
-    """Load the pre-trained model from disk."""
-    try:
-        if not os.path.exists(MODEL_PATH):
-            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}. "
-                                "Please run train_model.py first.")
-        
-        with open(MODEL_PATH, 'rb') as f:
-            model = pickle.load(f)
-        
-        return model
-    except Exception as e:
-        print(f"Error loading model: {e}")
-        # For production, we'll return None and handle this case
-        return None
-
-try:
-    # Load model at startup
-    model = load_model()
-    print(f"Successfully loaded model from {MODEL_PATH}")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+CORS(app, origins=service.CORS_ORIGINS)
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.request_time = time.time()
+    service.request_started()
+    # Under gunicorn_flask.conf.py workers warm up before accepting
+    # connections; other servers warm up in the background from here on
+    service.ensure_warm_up(warm_up)
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    if service.controls_admission(endpoint):
+        shed = service.admit(endpoint)
+        g.shed = shed is not None
+        if shed:
+            payload, status, headers = shed
+            return jsonify(payload), status, headers
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    seconds = time.perf_counter() - g.request_start
+    service.request_finished(endpoint, response.status_code, seconds)
+    if service.logs_requests(endpoint):
+        # Raw bodies only; the request log's writer thread encodes them
+        service.log_request(g.request_time, request.method, endpoint, response.status_code, seconds,
+                            request.get_data(), request.mimetype, response.get_data(), response.mimetype)
+    if service.shadow_sampled(endpoint, response.status_code):
+        # Queued for the shadow model once the response has been sent
+        response.call_on_close(partial(service.mirror_to_shadow, request.get_data(), request.mimetype,
+                                       response.get_data(), response.headers.get('X-Career-Classes')))
+    return response
+
+@app.teardown_request
+def end_request(exc):
+    # Teardown runs once for every request, whatever happened to it; an
+    # exception in a view still gets a 500 through after_request, but not one
+    # raised by an after_request hook itself, so the profiler's and admission
+    # control's per-request state is released here
+    profiler.request_finished()
+    if 'shed' in g:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        service.release(endpoint, time.perf_counter() - g.request_start, g.shed)
+
+def warm_up():
+    """Run the service's warm-up requests through the whole Flask stack, then report ready."""
+    with app.test_client() as client:
+        service.warm_up(lambda path, body, content_type: client.post(path, data=body, content_type=content_type))
+
+def respond(payload, status):
+    """Serialize a payload from prediction_service, timed as its own stage."""
+    with metrics.timed('serialize'):
+        response = jsonify(payload)
+    return response, status
+
+def respond_packed(payload, status, headers):
+    """Send a packed prediction response, or the JSON error it turned into."""
+    if isinstance(payload, bytes):
+        return Response(payload, status, headers, mimetype=service.BINARY_CONTENT_TYPE)
+    return respond(payload, status)
 
 @app.route('/', methods=['GET'])
 def home():
@@ -61,23 +90,23 @@ def home():
         'message': 'Career Prediction API is running',
         'endpoints': {
             'health': '/health (GET)',
-            'predict': '/predict (POST)'
+            'predict': '/predict (POST)',
+            'predict_batch': '/predict/batch (POST)',
+            'feedback': '/feedback (POST)',
+            'batcher_stats': '/batcher/stats (GET)',
+            'shadow_stats': '/shadow/stats (GET)',
+            'metrics': '/metrics (GET)',
+            'model': '/admin/model (GET)',
+            'model_rollback': '/admin/model/rollback (POST)',
+            'profile': '/admin/profile (GET), /admin/profile/start (POST), /admin/profile/stop (POST)'
         }
     })
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint to verify the API is running."""
-    if model is None:
-        return jsonify({
-            'status': 'error',
-            'message': 'Model not loaded properly'
-        }), 500
-    
-    return jsonify({
-        'status': 'healthy',
-        'message': 'API is running and model is loaded'
-    })
+    payload, status = service.health()
+    return jsonify(payload), status
 
 @app.route('/predict', methods=['POST'])
 def predict():
@@ -96,87 +125,148 @@ def predict():
     }
     
     All scores should be floats between 1 and 10.
+    
+    With Content-Type application/octet-stream the body is instead one
+    packed row of 5 little-endian float32 traits, answered in the packed
+    format described in prediction_service.py.
     """
-    # Check if model is loaded
-    if model is None:
-        return jsonify({
-            'status': 'error',
-            'message': 'Model not loaded properly'
-        }), 500
+    if request.mimetype == service.BINARY_CONTENT_TYPE:
+        return respond_packed(*service.predict_packed(request.get_data(), 1))
+    with metrics.timed('parse'):
+        data = request.get_json()
+    return respond(*service.predict_traits(data))
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Endpoint for scoring many trait vectors in one request.
     
-    # Get data from request
-    data = request.get_json()
+    Expected JSON request format:
+    {
+        "personality_traits": [
+            [<openness>, <conscientiousness>, <extraversion>, <agreeableness>, <neuroticism>],
+            ...
+        ]
+    }
     
-    # Validate input
-    if not data or 'personality_traits' not in data:
-        return jsonify({
-            'status': 'error',
-            'message': 'Request must include personality_traits array'
-        }), 400
+    Every row is validated independently. The response holds one entry in
+    "results" per input row (null for rows that failed validation) and the
+    validation failures in "errors".
     
-    traits = data['personality_traits']
+    With Content-Type application/octet-stream the body is instead N packed
+    rows of 5 little-endian float32 traits, answered with N packed results.
+    """
+    if request.mimetype == service.BINARY_CONTENT_TYPE:
+        return respond_packed(*service.predict_packed(request.get_data(), service.MAX_BATCH_SIZE))
+    with metrics.timed('parse'):
+        data = request.get_json()
+    return respond(*service.predict_trait_batch(data))
+
+@app.route('/feedback', methods=['POST'])
+def feedback():
+    """
+    Endpoint recording the career a user actually chose.
     
-    # Check if the right number of traits is provided
-    if not isinstance(traits, list) or len(traits) != 5:
-        return jsonify({
-            'status': 'error',
-            'message': f'personality_traits must be an array with 5 values (Openness, Conscientiousness, Extraversion, Agreeableness, Neuroticism)'
-        }), 400
+    Expected JSON request format:
+    {
+        "personality_traits": [<openness>, <conscientiousness>, <extraversion>, <agreeableness>, <neuroticism>],
+        "career": "<one of the careers the model predicts>"
+    }
     
-    # Validate trait values
-    try:
-        traits = [float(trait) for trait in traits]
-        for i, trait in enumerate(traits):
-            if trait < 1 or trait > 10:
-                return jsonify({
-                    'status': 'error',
-                    'message': f'{EXPECTED_TRAITS[i]} score must be between 1 and 10'
-                }), 400
-    except ValueError:
+    Entries are written to the feedback log in batches (see feedback_log.py)
+    and answered with 202 before they reach the disk.
+    """
+    with metrics.timed('parse'):
+        data = request.get_json()
+    return respond(*service.record_feedback(data))
+
+@app.route('/batcher/stats', methods=['GET'])
+def batcher_stats():
+    """Queue depth and batch size histograms of the /predict micro-batcher."""
+    if service.batcher is None:
         return jsonify({
-            'status': 'error',
-            'message': 'All personality trait scores must be numbers'
-        }), 400
+            'status': 'disabled',
+            'message': 'Micro-batching is off; set MICRO_BATCH=1 to enable it'
+        })
     
-    # Create input DataFrame for prediction
-    input_data = pd.DataFrame({
-        'Openness': [traits[0]],
-        'Conscientiousness': [traits[1]],
-        'Extraversion': [traits[2]],
-        'Agreeableness': [traits[3]],
-        'Neuroticism': [traits[4]]
+    return jsonify({
+        'status': 'enabled',
+        **service.batcher.stats()
     })
+
+@app.route('/shadow/stats', methods=['GET'])
+def shadow_stats():
+    """Agreement of the shadow model with the served predictions in this worker."""
+    if service.shadow is None:
+        return jsonify({
+            'status': 'disabled',
+            'message': 'No shadow model is loaded; set SHADOW_MODEL to enable it'
+        })
     
-    # Make prediction
-    prediction = model.predict(input_data)[0]
+    return jsonify({
+        'status': 'enabled',
+        **service.shadow.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Per-stage latency histograms, request counts, model load time and RSS of this worker."""
+    return Response(service.metrics_text(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/model', methods=['GET'])
+def model_info():
+    """Active registry version, the version this worker serves and the version history."""
+    denied = service.authorize_admin(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
     
-    # Get probability scores
-    probabilities = model.predict_proba(input_data)[0]
+    payload, status = service.model_info()
+    return jsonify(payload), status
+
+@app.route('/admin/model/rollback', methods=['POST'])
+def rollback_model():
+    """Reactivate the previous model version and swap it into this worker."""
+    denied = service.authorize_admin(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
     
-    # Get top 3 career predictions with probabilities
-    career_probs = list(zip(model.classes_, probabilities))
-    top_careers = sorted(career_probs, key=lambda x: x[1], reverse=True)[:3]
+    payload, status = service.rollback_model()
+    return jsonify(payload), status
+
+@app.route('/admin/profile/start', methods=['POST'])
+def start_profile():
+    """Start sampling request threads of this worker; optional JSON body {"interval_ms": 5}."""
+    denied = service.authorize_admin(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
     
-    top_careers_formatted = []
-    for career, prob in top_careers:
-        top_careers_formatted.append({
-            'career': career,
-            'probability': float(prob)
-        })
+    data = request.get_json(silent=True) or {}
+    payload, status = service.start_profiler(data.get('interval_ms'))
+    return jsonify(payload), status
+
+@app.route('/admin/profile/stop', methods=['POST'])
+def stop_profile():
+    """Stop the sampling profiler of this worker."""
+    denied = service.authorize_admin(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
     
-    # Get trait levels (high/low) for explanations
-    trait_levels = {}
-    for i, trait_name in enumerate(EXPECTED_TRAITS):
-        trait_level = "high" if traits[i] > 5.5 else "low"
-        trait_levels[trait_name.lower()] = trait_level
+    payload, status = service.stop_profiler()
+    return jsonify(payload), status
+
+@app.route('/admin/profile', methods=['GET'])
+def dump_profile():
+    """
+    Stacks sampled so far in the folded format of flamegraph.pl, hottest
+    first. ?top=N limits the output to N stacks, ?reset=1 clears them.
+    """
+    denied = service.authorize_admin(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
     
-    # Return prediction results
-    return jsonify({
-        'status': 'success',
-        'prediction': prediction,
-        'top_careers': top_careers_formatted,
-        'trait_levels': trait_levels
-    })
+    top = request.args.get('top', type=int)
+    reset = request.args.get('reset') == '1'
+    return Response(profiler.dump(top, reset), mimetype='text/plain')
 
 if __name__ == '__main__':
     # Run the Flask app
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compiled, sklearn-free inference engine for the career prediction forest.
+
+The trained RandomForestClassifier is flattened into a handful of contiguous
+NumPy arrays (split feature, threshold, children and leaf class distributions
+for every node of every tree). CompiledForest evaluates all trees at once with
+vectorized array operations and returns exactly the same probabilities as
+sklearn's predict_proba, without sklearn's per-call validation and dispatch.
+
+The export is a directory of raw .npy arrays plus a small manifest.json
+(class names, trait order, version). It is memory-mapped read-only when
+loaded, so every worker process on a machine shares one physical copy of the
+forest through the page cache and loading costs almost nothing.
+
+Run this script to export the pickled model, or with --check-parity to
+check an existing export against it:
+
+    python forest_engine.py [model.pkl] [compiled_dir] [--check-parity]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import sys
+import time
+import numpy as np
+
+DEFAULT_MODEL_PATH = 'models/career_prediction_model.pkl'
+DEFAULT_COMPILED_PATH = 'models/career_prediction_model'
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+ARRAY_NAMES = ('feature', 'threshold', 'children', 'value', 'roots')
+
+# Rows evaluated together; larger chunks fall out of cache without going faster
+CHUNK_SIZE = 512
+
+# Up to this many (row, tree) pairs the trees are walked node by node in
+# Python; below it the fixed cost of each vectorized step dominates (a
+# single-tree model such as a distilled student, scored one row at a time)
+SCALAR_WALK_LIMIT = 4
+
+class CompiledForest:
+    """
+    Array representation of a fitted RandomForestClassifier.
+
+    Nodes of all trees are stored back to back. children holds the left and
+    right child of node i at 2*i and 2*i + 1; leaves point back at themselves
+    so every tree can be walked for the same number of steps without
+    branching. value holds the class distribution predicted at each node.
+    """
+
+    array_names = ARRAY_NAMES
+
+    def __init__(self, classes, feature_names, feature, threshold, children, value, roots, depth,
+                 version=None):
+        self.classes_ = np.asarray(classes)
+        self.feature_names_in_ = np.asarray(feature_names)
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.children = np.ascontiguousarray(children, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.depth = int(depth)
+        self.version = version
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    @property
+    def n_features_in_(self):
+        return len(self.feature_names_in_)
+
+    def manifest_fields(self):
+        """Extra manifest entries describing the representation (none for the float forest)."""
+        return {}
+
+    def apply(self, X):
+        """Return the leaf reached in every tree, as an (n_trees, n_samples) array."""
+        # sklearn evaluates trees on float32 inputs, so compare the same values
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        flat = X.ravel()
+        row_offsets = np.arange(X.shape[0]) * X.shape[1]
+
+        node = np.repeat(self.roots[:, None], X.shape[0], axis=1)
+        for _ in range(self.depth):
+            split_values = np.take(flat, np.take(self.feature, node) + row_offsets)
+            go_right = split_values > np.take(self.threshold, node)
+            node = np.take(self.children, 2 * node + go_right)
+        return node
+
+    def predict_proba(self, X):
+        """Mean class distribution over all trees, identical to sklearn's predict_proba."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        if X.shape[0] * self.n_estimators <= SCALAR_WALK_LIMIT:
+            return self._walk_proba(X)
+
+        proba = np.empty((X.shape[0], self.value.shape[1]))
+        # Rows are scored in chunks so the (n_trees, chunk) working set stays
+        # in cache and memory is bounded for very large inputs
+        for start in range(0, X.shape[0], CHUNK_SIZE):
+            leaves = self.apply(X[start:start + CHUNK_SIZE])
+            # Summed tree by tree, in estimator order, like sklearn's accumulator
+            proba[start:start + CHUNK_SIZE] = np.add.reduce(np.take(self.value, leaves, axis=0), axis=0)
+        proba /= self.n_estimators
+        return proba
+
+    def _walk_proba(self, X):
+        """predict_proba for a handful of rows and trees, walking each tree in Python."""
+        feature, threshold, children = self.feature, self.threshold, self.children
+        proba = np.zeros((X.shape[0], self.value.shape[1]))
+        for i, row in enumerate(X.tolist()):
+            for node in self.roots.tolist():
+                while children[2 * node] != node:
+                    node = children[2 * node + (row[feature[node]] > threshold[node])]
+                proba[i] += self.value[node]
+        proba /= self.n_estimators
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+def top_k_classes(probabilities, k=3):
+    """
+    Indices of the k most probable classes for each row, ordered by
+    descending probability with ties resolved in class order (as a stable
+    sort of the probabilities would).
+    """
+    top = np.argpartition(-probabilities, k - 1, axis=1)[:, :k]
+    # Rows where a class outside the partition ties with the k-th probability
+    # fall back to a stable sort so the tie resolves in class order
+    kth = np.take_along_axis(probabilities, top, axis=1).min(axis=1)
+    ambiguous = (probabilities >= kth[:, None]).sum(axis=1) > k
+    if ambiguous.any():
+        top[ambiguous] = np.argsort(-probabilities[ambiguous], axis=1, kind='stable')[:, :k]
+
+    top_probs = np.take_along_axis(probabilities, top, axis=1)
+    order = np.lexsort((top, -top_probs))
+    return np.take_along_axis(top, order, axis=1)
+
+def compile_forest(model, classes=None):
+    """
+    Flatten a fitted RandomForestClassifier into a CompiledForest.
+
+    A multi-output regression forest or tree fitted on class probabilities
+    (see distill_model.py) is flattened the same way; classes then names
+    its outputs.
+    """
+    if classes is None:
+        classes = model.classes_
+    n_classes = len(classes)
+    features, thresholds, children, values, roots = [], [], [], [], []
+    depth = 0
+    offset = 0
+
+    for estimator in getattr(model, 'estimators_', [model]):
+        tree = estimator.tree_
+        n_nodes = tree.node_count
+        is_leaf = tree.children_left == -1
+        local = np.arange(n_nodes)
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, 0.0, tree.threshold))
+        left = np.where(is_leaf, local, tree.children_left) + offset
+        right = np.where(is_leaf, local, tree.children_right) + offset
+        children.append(np.column_stack([left, right]).ravel())
+
+        if tree.n_outputs == 1:
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+        else:
+            # Regression trees hold one value per output
+            value = tree.value[:, :n_classes, 0].astype(np.float64)
+        if not np.allclose(value.sum(axis=1), 1.0):
+            # Trees from scikit-learn < 1.4 store class counts, which
+            # predict_proba normalizes on the fly
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value /= normalizer
+        values.append(value)
+
+        roots.append(offset)
+        depth = max(depth, tree.max_depth)
+        offset += n_nodes
+
+    if hasattr(model, 'feature_names_in_'):
+        feature_names = model.feature_names_in_
+    else:
+        feature_names = [f'x{i}' for i in range(model.n_features_in_)]
+
+    return CompiledForest(
+        classes=np.asarray(classes).astype(str),
+        feature_names=np.asarray(feature_names).astype(str),
+        feature=np.concatenate(features),
+        threshold=np.concatenate(thresholds),
+        children=np.concatenate(children),
+        value=np.concatenate(values),
+        roots=np.array(roots),
+        depth=depth
+    )
+
+def forest_version(forest):
+    """Content hash identifying the forest's classes, traits and arrays."""
+    digest = hashlib.sha256()
+    identity = [forest.classes_.tolist(), forest.feature_names_in_.tolist(), forest.depth]
+    if forest.manifest_fields():
+        identity.append(forest.manifest_fields())
+    digest.update(json.dumps(identity, sort_keys=True).encode())
+    for name in forest.array_names:
+        digest.update(np.ascontiguousarray(getattr(forest, name)).tobytes())
+    return digest.hexdigest()[:12]
+
+def compiled_manifest_path(path=DEFAULT_COMPILED_PATH):
+    return os.path.join(path, MANIFEST_NAME)
+
+def save_compiled_forest(forest, path=DEFAULT_COMPILED_PATH):
+    """
+    Write the forest to directory path as one .npy file per array plus
+    manifest.json. The directory is assembled next to its destination and
+    renamed into place, so readers never see a partially written export.
+    """
+    staging = f'{path}.tmp-{os.getpid()}'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    arrays = {}
+    for name in forest.array_names:
+        array = np.ascontiguousarray(getattr(forest, name))
+        np.save(os.path.join(staging, f'{name}.npy'), array)
+        arrays[name] = {'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': forest_version(forest),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'classes': forest.classes_.tolist(),
+        'traits': forest.feature_names_in_.tolist(),
+        'n_estimators': forest.n_estimators,
+        'depth': forest.depth,
+        'arrays': arrays,
+        **forest.manifest_fields()
+    }
+    with open(compiled_manifest_path(staging), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    previous = f'{path}.old-{os.getpid()}'
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    forest.version = manifest['version']
+
+def load_compiled_forest(path=DEFAULT_COMPILED_PATH, mmap=True):
+    """
+    Load a forest written by save_compiled_forest.
+
+    With mmap the arrays are memory-mapped read-only instead of read into
+    the process heap. Exports written by quantize_model.py load as a
+    QuantizedForest.
+    """
+    manifest_path = compiled_manifest_path(path)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Compiled model not found at {path}. Please run forest_engine.py first.")
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported compiled model format {manifest.get('format_version')} at {path}")
+
+    forest_class, options = CompiledForest, {}
+    if 'quantization' in manifest:
+        from quantize_model import QuantizedForest
+        forest_class, options = QuantizedForest, manifest['quantization']
+
+    arrays = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None, allow_pickle=False)
+        for name in forest_class.array_names
+    }
+    return forest_class(
+        classes=manifest['classes'],
+        feature_names=manifest['traits'],
+        depth=manifest['depth'],
+        version=manifest['version'],
+        **options,
+        **arrays
+    )
+
+def load_forest(model_path=DEFAULT_MODEL_PATH, compiled_path=DEFAULT_COMPILED_PATH):
+    """
+    Load the forest used for serving.
+
+    The compiled export is used when it is at least as new as the pickled
+    model; otherwise the pickle is loaded and compiled in memory.
+    """
+    manifest_path = compiled_manifest_path(compiled_path)
+    if os.path.exists(manifest_path) and (
+            not os.path.exists(model_path) or os.path.getmtime(manifest_path) >= os.path.getmtime(model_path)):
+        return load_compiled_forest(compiled_path)
+
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}. Please run train_model.py first.")
+
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+
+    return compile_forest(model)
+
+def parity_inputs(forest, n_samples=20000, seed=0):
+    """
+    Inputs for checking the compiled forest against sklearn: uniform random
+    trait vectors, the 0.5-step trait grid corners and every split threshold
+    (plus its float32 neighbours) so that ties on a threshold are exercised.
+    """
+    rng = np.random.default_rng(seed)
+    n_features = forest.n_features_in_
+    samples = [rng.uniform(1, 10, (n_samples, n_features))]
+
+    grid = np.arange(1, 10.5, 0.5)
+    samples.append(rng.choice(grid, (n_samples, n_features)))
+
+    is_split = forest.children[0::2] != np.arange(len(forest.threshold))
+    thresholds = forest.threshold[is_split]
+    features = forest.feature[is_split]
+    at_split = rng.uniform(1, 10, (len(thresholds), n_features))
+    for shift in (-np.inf, 0, np.inf):
+        points = at_split.copy()
+        values = thresholds.astype(np.float32)
+        if shift:
+            values = np.nextafter(values, np.float32(shift))
+        points[np.arange(len(thresholds)), features] = values
+        samples.append(points)
+
+    return np.vstack(samples)
+
+def verify_parity(model, forest, X=None):
+    """
+    Check that the compiled forest reproduces model.predict_proba bit for bit.
+
+    Returns the number of rows compared; raises AssertionError on any
+    difference.
+    """
+    import pandas as pd
+
+    if X is None:
+        X = parity_inputs(forest)
+    expected = model.predict_proba(pd.DataFrame(X, columns=forest.feature_names_in_))
+    actual = forest.predict_proba(X)
+
+    if not np.array_equal(forest.classes_, model.classes_.astype(str)):
+        raise AssertionError("Compiled forest classes do not match the model")
+    mismatched = np.flatnonzero((expected != actual).any(axis=1))
+    if len(mismatched):
+        raise AssertionError(f"Compiled forest differs from predict_proba on {len(mismatched)} "
+                             f"of {len(X)} rows (first at row {mismatched[0]})")
+    return len(X)
+
+def export_compiled_forest(model, path=DEFAULT_COMPILED_PATH):
+    """Compile the model, verify it against sklearn and save it."""
+    forest = compile_forest(model)
+    n_checked = verify_parity(model, forest)
+    save_compiled_forest(forest, path)
+    print(f"Compiled forest matches predict_proba on {n_checked} rows; saved to {path}")
+    return forest
+
+def check_parity(model, path=DEFAULT_COMPILED_PATH):
+    """Load a saved export and check it against the model; returns the number of rows compared."""
+    return verify_parity(model, load_compiled_forest(path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the pickled forest as a compiled forest.")
+    parser.add_argument('model', nargs='?', default=DEFAULT_MODEL_PATH, help="pickled model")
+    parser.add_argument('compiled', nargs='?', default=DEFAULT_COMPILED_PATH, help="compiled forest directory")
+    parser.add_argument('--check-parity', action='store_true',
+                        help="check an existing export against the pickle instead of writing one; exits 1 on any difference")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Model file not found at {args.model}. Please run train_model.py first.")
+        sys.exit(1)
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+
+    if args.check_parity:
+        try:
+            n_checked = check_parity(model, args.compiled)
+        except (OSError, ValueError, AssertionError) as e:
+            print(f"Parity check of {args.compiled} failed: {e}")
+            sys.exit(1)
+        print(f"{args.compiled} matches predict_proba of {args.model} bit for bit on {n_checked} rows")
+        return
+
+    export_compiled_forest(model, args.compiled)
+
+if __name__ == "__main__":
+    main()
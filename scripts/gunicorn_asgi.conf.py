@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+"""
+Gunicorn settings for serving asgi_server.py with uvicorn workers.
+
+    gunicorn -c scripts/gunicorn_asgi.conf.py scripts.asgi_server:app
+
+Each worker runs one event loop that holds every open connection and hands
+inference to its bounded pool (see INFERENCE_WORKERS in asgi_server.py), so
+one or two workers are enough for a small instance.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = 'uvicorn_worker.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# Keep idle keep-alive connections from the frontend open for longer than
+# the load balancer's idle timeout, and queue bursts of new connections
+keepalive = 75
+backlog = 4096
+
+timeout = 30
+graceful_timeout = 30
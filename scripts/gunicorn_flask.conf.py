@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+"""
+Gunicorn settings for serving flask_server.py.
+
+    gunicorn -c scripts/gunicorn_flask.conf.py scripts.flask_server:app
+
+The app, and with it the model, is loaded once in the master and shared
+with the workers through fork. The garbage collector stays off while it
+loads and everything allocated until then is frozen before each fork, so
+collections in the workers never touch (and copy) the shared pages. Each
+worker then runs WARMUP_REQUESTS synthetic predictions through the full
+Flask stack before it accepts connections. Workers record how long each
+request waited for a thread, which admission control (see admission.py)
+sheds requests on.
+"""
+
+import gc
+import math
+import os
+import sys
+import threading
+import time
+from gunicorn.workers.gthread import ThreadWorker
+
+def cpu_quota():
+    """The container's CPU quota in cores (cgroup v2 or v1), or None without one."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+            period = int(f.read())
+        # cgroup v1 writes -1 for no quota
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+def available_cores():
+    """CPUs this process may run on, within the container's CPU quota if it has one."""
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        cores = min(cores, max(1, int(quota)))
+    return cores
+
+class QueueTimedWorker(ThreadWorker):
+    """gthread worker that tells the app how long each request waited for a thread."""
+
+    def enqueue_req(self, conn):
+        # Called for new connections and for keep-alive connections with a new request
+        conn.enqueued = time.perf_counter()
+        super().enqueue_req(conn)
+
+    def handle(self, conn):
+        # Read back by admission.queue_wait() on this thread
+        threading.current_thread().request_queue_wait = time.perf_counter() - conn.enqueued
+        return super().handle(conn)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# One process per core runs the model. Threads overlap request I/O with
+# scoring (and feed the micro-batcher when MICRO_BATCH=1): two per core a
+# worker has to itself, so 2 when there is a worker per core and more when
+# WEB_CONCURRENCY runs fewer workers than cores, e.g. to save memory
+worker_class = QueueTimedWorker
+workers = int(os.environ.get('WEB_CONCURRENCY', max(2, available_cores())))
+threads = int(os.environ.get('GUNICORN_THREADS', 2 * max(1, math.ceil(available_cores() / workers))))
+
+preload_app = True
+
+# Same connection handling as gunicorn_asgi.conf.py
+keepalive = 75
+backlog = 4096
+
+timeout = 30
+graceful_timeout = 30
+
+# Load shedding is off unless ADMISSION_TARGET_MS is set in the environment
+# (e.g. in render.yaml): requests to the prediction endpoints that would take
+# longer than that many milliseconds, from their wait for a thread, are then
+# answered with 503 and Retry-After (see admission.py)
+
+# Objects created while the app loads are never collected by the master, so
+# keep collections from touching them before they are frozen
+gc.disable()
+
+def pre_fork(server, worker):
+    # Move everything allocated so far out of the collector's generations;
+    # their headers are then never written to, and stay shared with the master
+    gc.freeze()
+
+def post_fork(server, worker):
+    gc.enable()
+
+def post_worker_init(worker):
+    # Runs after the worker loaded the app and before it accepts connections
+    flask_server = sys.modules[worker.wsgi.import_name]
+    flask_server.warm_up()
+    worker.log.info("Worker %s warmed up with %s synthetic predictions",
+                    os.getpid(), flask_server.service.WARMUP_REQUESTS)
+
+def worker_exit(server, worker):
+    # Write the feedback this worker still holds in memory
+    sys.modules[worker.wsgi.import_name].service.shutdown()
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Parallel hyperparameter search for the career prediction forest.
+
+Sweeps a grid of RandomForestClassifier settings over stratified
+cross-validation folds in a process pool. The dataset and fold assignment
+are written once as .npy files and memory-mapped by every worker, so the
+workers share one copy through the page cache instead of each receiving a
+pickled copy. Every finished (params, fold) result is appended to a JSONL
+cache keyed by a fingerprint of the data, so an interrupted search resumes
+where it stopped.
+
+Candidates are ranked on mean fold accuracy and on the single-row
+predict_proba latency of their compiled forest (the engine the API serves
+with). Each worker saves the compiled forest it fitted on the first fold;
+once every fit has finished they are timed one after another in the main
+process, so no timing competes with fits for the CPU, and a resumed search
+times every candidate again on the same machine instead of reusing old
+figures. The recommendation is the fastest candidate whose accuracy is
+within --accuracy-budget of the best:
+
+    python hyperparameter_search.py --n-estimators 25 50 100 --max-depth 6 8 10 --workers 4
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
+
+from data_generator import CAREERS, DEFAULT_SEED, iter_chunks, read_manifest
+from forest_engine import compile_forest, compiled_manifest_path, load_compiled_forest, save_compiled_forest
+
+DEFAULT_WORK_DIR = 'models/search'
+RESULTS_NAME = 'results.jsonl'
+
+# Single-row predictions timed per candidate
+LATENCY_REPEATS = 1000
+
+def load_training_data(n_samples, data_path=None):
+    """Trait matrix and career codes: the first n_samples rows of a chunked dataset, or train_model's sample data."""
+    if data_path is None:
+        from train_model import generate_sample_data
+        data = generate_sample_data(n_samples)
+        codes = np.array([CAREERS.index(career) for career in data['Career']], dtype=np.uint8)
+        return data.drop('Career', axis=1).to_numpy(), codes
+
+    classes = read_manifest(data_path)['classes']
+    if classes != CAREERS:
+        raise ValueError(f"Dataset at {data_path} has classes {classes}, expected {CAREERS}")
+    X_parts, y_parts, n_rows = [], [], 0
+    for X, codes in iter_chunks(data_path):
+        X_parts.append(X[:n_samples - n_rows])
+        y_parts.append(codes[:n_samples - n_rows])
+        n_rows += len(y_parts[-1])
+        if n_rows >= n_samples:
+            break
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+def prepare_search(work_dir, X, y, n_folds, seed):
+    """
+    Write the data and fold assignment once and return the directory of this dataset.
+
+    The directory is named by a fingerprint of the data and folds, so cached
+    results are only reused for exactly the same inputs.
+    """
+    folds = np.empty(len(y), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+    for fold, (_, test) in enumerate(splitter.split(X, y)):
+        folds[test] = fold
+
+    digest = hashlib.sha256()
+    for array in (X, y, folds):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    path = os.path.join(work_dir, digest.hexdigest()[:12])
+
+    if not os.path.exists(os.path.join(path, 'folds.npy')):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'X.npy'), X)
+        np.save(os.path.join(path, 'y.npy'), y)
+        # Written last: its presence marks a complete dataset
+        np.save(os.path.join(path, 'folds.npy'), folds)
+    return path
+
+_shared = {}
+
+def _init_worker(path):
+    """Memory-map the shared dataset once per worker process."""
+    for name in ('X', 'y', 'folds'):
+        _shared[name] = np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+
+def single_row_latency_us(forest, X, repeats=LATENCY_REPEATS):
+    """Median time of one single-row predict_proba call, in microseconds."""
+    rows = np.asarray(X[:repeats], dtype=np.float64)
+    forest.predict_proba(rows[:1])
+    timings = []
+    for i in range(repeats):
+        row = rows[i % len(rows)][None, :]
+        start = time.perf_counter()
+        forest.predict_proba(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1e6)
+
+def forest_path(path, params):
+    """Where the compiled forest a candidate fitted on fold 0 is kept for timing."""
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(path, 'forests', digest)
+
+def fit_fold(params, fold, seed):
+    """Fit a candidate on every fold but one; returns the model and the held-out mask."""
+    X, y, folds = _shared['X'], _shared['y'], _shared['folds']
+    test = folds == fold
+    model = RandomForestClassifier(random_state=seed, n_jobs=1, **params)
+    model.fit(X[~test], y[~test])
+    return model, test
+
+def evaluate_candidate(params, fold, seed, path):
+    """Fit on every fold but one and score on that fold; the fold 0 forest is saved for timing."""
+    start = time.perf_counter()
+    model, test = fit_fold(params, fold, seed)
+    fit_seconds = time.perf_counter() - start
+
+    accuracy = float((model.predict(_shared['X'][test]) == _shared['y'][test]).mean())
+    if fold == 0:
+        save_compiled_forest(compile_forest(model), forest_path(path, params))
+    return {
+        'params': params,
+        'fold': fold,
+        'accuracy': accuracy,
+        'fit_seconds': fit_seconds,
+        'n_nodes': int(sum(estimator.tree_.node_count for estimator in model.estimators_))
+    }
+
+def measure_latencies(path, candidates, seed):
+    """
+    Single-row latency of each candidate's compiled forest, in microseconds.
+
+    Runs in the main process after the pool has shut down, one candidate at
+    a time. Forests missing from an older cache are refitted on fold 0.
+    """
+    _init_worker(path)
+    rows = _shared['X'][_shared['folds'] == 0]
+    latencies = {}
+    for params in candidates:
+        saved = forest_path(path, params)
+        if not os.path.exists(compiled_manifest_path(saved)):
+            save_compiled_forest(compile_forest(fit_fold(params, 0, seed)[0]), saved)
+        # Read into memory so that page faults are not timed
+        forest = load_compiled_forest(saved, mmap=False)
+        latencies[json.dumps(params, sort_keys=True)] = single_row_latency_us(forest, rows)
+    return latencies
+
+def result_key(params, fold):
+    return json.dumps([params, fold], sort_keys=True)
+
+def load_cached_results(path):
+    """Finished results of earlier runs on the same data, keyed by (params, fold)."""
+    results = {}
+    results_path = os.path.join(path, RESULTS_NAME)
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # A line cut short by an interrupted run
+                    continue
+                results[result_key(result['params'], result['fold'])] = result
+    return results
+
+def parameter_grid(grid):
+    """Every combination of the listed values, as dicts."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_search(path, candidates, n_folds, seed, workers):
+    """Evaluate every (candidate, fold) pair not already cached and return all results."""
+    results = load_cached_results(path)
+    pending = [
+        (params, fold)
+        for params in candidates
+        for fold in range(n_folds)
+        if result_key(params, fold) not in results
+    ]
+    print(f"{len(candidates) * n_folds - len(pending)} of {len(candidates) * n_folds} fits cached; "
+          f"running {len(pending)} on {workers} workers")
+
+    with open(os.path.join(path, RESULTS_NAME), 'a') as cache, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as executor:
+        futures = [executor.submit(evaluate_candidate, params, fold, seed, path) for params, fold in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            cache.write(json.dumps(result) + '\n')
+            cache.flush()
+            results[result_key(result['params'], result['fold'])] = result
+            print(f"[{done}/{len(pending)}] {result['params']} fold {result['fold']}: "
+                  f"accuracy {result['accuracy']:.4f}")
+
+    return [results[result_key(params, fold)] for params in candidates for fold in range(n_folds)]
+
+def summarize(results, latencies, accuracy_budget):
+    """Per-candidate means, ranked by accuracy, and the fastest candidate within the accuracy budget."""
+    by_params = {}
+    for result in results:
+        by_params.setdefault(json.dumps(result['params'], sort_keys=True), []).append(result)
+
+    summary = []
+    for key, fold_results in by_params.items():
+        accuracies = [result['accuracy'] for result in fold_results]
+        summary.append({
+            'params': json.loads(key),
+            'accuracy': float(np.mean(accuracies)),
+            'accuracy_std': float(np.std(accuracies)),
+            'latency_us': latencies[key],
+            'n_nodes': int(np.mean([result['n_nodes'] for result in fold_results]))
+        })
+    summary.sort(key=lambda candidate: (-candidate['accuracy'], candidate['latency_us']))
+
+    best_accuracy = summary[0]['accuracy']
+    eligible = [candidate for candidate in summary if candidate['accuracy'] >= best_accuracy - accuracy_budget]
+    recommended = min(eligible, key=lambda candidate: candidate['latency_us'])
+    return summary, recommended
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the career forest.")
+    parser.add_argument('--samples', type=int, default=1000, help="training rows")
+    parser.add_argument('--data', help="chunked dataset from data_generator.py (default: train_model.py sample data)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--n-estimators', type=int, nargs='+', default=[25, 50, 100, 200])
+    parser.add_argument('--max-depth', type=int, nargs='+', default=[6, 8, 10, 12])
+    parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=[1, 5])
+    parser.add_argument('--accuracy-budget', type=float, default=0.01,
+                        help="accuracy a recommended candidate may give up against the best one")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--work-dir', default=DEFAULT_WORK_DIR, help="where shared data and cached results are kept")
+    parser.add_argument('--output', help="write the ranked candidates to this JSON file")
+    args = parser.parse_args()
+
+    X, y = load_training_data(args.samples, args.data)
+    path = prepare_search(args.work_dir, X, y, args.folds, args.seed)
+    del X, y
+    print(f"Searching on {args.samples} rows in {args.folds} folds; data and cache in {path}")
+
+    candidates = parameter_grid({
+        'n_estimators': args.n_estimators,
+        'max_depth': args.max_depth,
+        'min_samples_leaf': args.min_samples_leaf
+    })
+    start = time.perf_counter()
+    results = run_search(path, candidates, args.folds, args.seed, args.workers)
+    print(f"\nSearch finished in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    latencies = measure_latencies(path, candidates, args.seed)
+    print(f"Timed {len(candidates)} candidates in {time.perf_counter() - start:.1f}s")
+
+    summary, recommended = summarize(results, latencies, args.accuracy_budget)
+    print(f"\n{'n_estimators':>12} {'max_depth':>9} {'min_leaf':>8} {'accuracy':>9} {'std':>7} {'us/row':>8} {'nodes':>8}")
+    for candidate in summary:
+        params = candidate['params']
+        marker = ' <' if candidate is recommended else ''
+        print(f"{params['n_estimators']:>12} {params['max_depth']:>9} {params['min_samples_leaf']:>8} "
+              f"{candidate['accuracy']:>9.4f} {candidate['accuracy_std']:>7.4f} {candidate['latency_us']:>8.0f} "
+              f"{candidate['n_nodes']:>8}{marker}")
+    print(f"\nFastest within {args.accuracy_budget:g} of the best accuracy: {recommended['params']} "
+          f"(accuracy {recommended['accuracy']:.4f}, {recommended['latency_us']:.0f} us/row)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'candidates': summary, 'recommended': recommended,
+                       'accuracy_budget': args.accuracy_budget}, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-worker request metrics and an on-demand sampling profiler.
+
+Each stage of a prediction request (JSON parsing, validation, grid lookup,
+DataFrame construction, the model call, top-k selection, response
+formatting and serialization) is timed into a histogram with power-of-two
+microsecond buckets. Together with request counts by endpoint and status,
+model load time and worker memory they are rendered in the Prometheus text
+format for the /metrics endpoint. All figures are per worker process.
+
+Timing a stage costs two perf_counter() calls and a locked increment:
+
+    with metrics.timed('validate'):
+        ...
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+class Histogram:
+    """Counts of observed values in power-of-two buckets up to a maximum."""
+
+    def __init__(self, max_value):
+        self.bounds = [1]
+        while self.bounds[-1] < max_value:
+            self.bounds.append(self.bounds[-1] * 2)
+        self.counts = [0] * len(self.bounds)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        # Index of the smallest power of two >= value, clamped to the last bucket
+        i = min((math.ceil(value) - 1).bit_length(), len(self.bounds) - 1) if value > 1 else 0
+        self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+    def to_dict(self):
+        return {
+            'buckets': {f'le_{bound}': count for bound, count in zip(self.bounds, self.counts)},
+            'count': self.total,
+            'mean': self.sum / self.total if self.total else 0.0
+        }
+
+# Stage and request latencies are kept in microseconds, up to about 16 s
+MAX_LATENCY_US = 2 ** 24
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe_stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    """Stage and request latency histograms, request counters and gauges of one worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.requests = {}
+        self.request_counts = Counter()
+        self.gauges = {}
+        self.info = {}
+        self._captured = threading.local()
+
+    def timed(self, stage):
+        """Context manager timing a stage of the current request."""
+        return _Timer(self, stage)
+
+    def observe_stage(self, stage, seconds):
+        captured = getattr(self._captured, 'stages', None)
+        if captured is not None:
+            captured.append((stage, seconds))
+            return
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(MAX_LATENCY_US)
+            histogram.observe(seconds * 1e6)
+
+    @contextmanager
+    def capture(self):
+        """Collect the current thread's stage timings as (stage, seconds) in a list instead of the histograms."""
+        self._captured.stages = stages = []
+        try:
+            yield stages
+        finally:
+            self._captured.stages = None
+
+    def observe_request(self, endpoint, status, seconds):
+        with self._lock:
+            histogram = self.requests.get(endpoint)
+            if histogram is None:
+                histogram = self.requests[endpoint] = Histogram(MAX_LATENCY_US)
+            histogram.observe(seconds * 1e6)
+            self.request_counts[endpoint, status] += 1
+
+    def reset(self):
+        """Drop the latency histograms and request counters, e.g. after warm-up traffic; gauges stay."""
+        with self._lock:
+            self.stages = {}
+            self.requests = {}
+            self.request_counts = Counter()
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def set_info(self, **labels):
+        """Constant labels exported as the career_api_info series, e.g. the model version."""
+        self.info.update(labels)
+
+    def render(self, extra_histograms=(), extra_gauges=()):
+        """
+        The metrics in the Prometheus text exposition format.
+
+        extra_histograms holds (name, help, Histogram, scale) tuples for
+        histograms kept elsewhere (e.g. by the micro-batcher); bucket bounds
+        are divided by scale. extra_gauges holds (name, help, value) tuples,
+        or (name, help, {label value: value}, label) for a labelled gauge.
+        """
+        with self._lock:
+            lines = []
+            _render_histograms(lines, 'career_api_stage_seconds', 'Time spent in each stage of a request',
+                               'stage', self.stages, 1e6)
+            _render_histograms(lines, 'career_api_request_seconds', 'Request latency by endpoint',
+                               'endpoint', self.requests, 1e6)
+
+            lines.append('# HELP career_api_requests_total Requests by endpoint and status code')
+            lines.append('# TYPE career_api_requests_total counter')
+            for (endpoint, status), count in sorted(self.request_counts.items()):
+                lines.append(f'career_api_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            gauges = dict(self.gauges)
+            info = dict(self.info)
+
+        for name, help_text, histogram, scale in extra_histograms:
+            _render_histograms(lines, name, help_text, None, {None: histogram}, scale)
+
+        gauges['career_api_process_resident_memory_bytes'] = resident_memory_bytes()
+        for name, value in sorted(gauges.items()):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        for name, help_text, value, *label in extra_gauges:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            if label:
+                for key, labelled in sorted(value.items()):
+                    lines.append(f'{name}{{{label[0]}="{key}"}} {labelled}')
+            else:
+                lines.append(f'{name} {value}')
+
+        labels = ','.join(f'{key}="{value}"' for key, value in sorted({'pid': os.getpid(), **info}.items()))
+        lines.append('# TYPE career_api_info gauge')
+        lines.append(f'career_api_info{{{labels}}} 1')
+        return '\n'.join(lines) + '\n'
+
+def _render_histograms(lines, name, help_text, label, histograms, scale):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(histograms.items(), key=lambda item: str(item[0])):
+        prefix = f'{label}="{key}",' if label else ''
+        cumulative = 0
+        for bound, count in zip(histogram.bounds, histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound / scale:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {histogram.total}')
+        suffix = f'{{{prefix.rstrip(",")}}}' if prefix else ''
+        lines.append(f'{name}_sum{suffix} {histogram.sum / scale:g}')
+        lines.append(f'{name}_count{suffix} {histogram.total}')
+
+def resident_memory_bytes():
+    """Resident set size of this process (Linux; 0 elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class SamplingProfiler:
+    """
+    Statistical profiler of the worker's request threads.
+
+    While running, a background thread samples the stack of every thread
+    that is inside a request (between request_started() and
+    request_finished()) every interval seconds and counts identical stacks,
+    so idle workers and background threads do not drown the profile. dump()
+    returns them in the folded format ("outer;inner;leaf count" per line)
+    read by flamegraph.pl and speedscope, hottest first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = Counter()
+        self._active = set()
+        self._stop = None
+        self._pid = None
+        self.interval = None
+        self.started = None
+
+    @property
+    def running(self):
+        # A profiler started before fork is not running in the child
+        return self._stop is not None and self._pid == os.getpid()
+
+    def request_started(self):
+        self._active.add(threading.get_ident())
+
+    def request_finished(self):
+        self._active.discard(threading.get_ident())
+
+    def start(self, interval=0.005):
+        with self._lock:
+            if self.running:
+                return
+            self.interval = interval
+            self.started = time.time()
+            self._samples = Counter()
+            self._stop = threading.Event()
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, args=(self._stop,), name='sampling-profiler', daemon=True)
+            thread.start()
+
+    def stop(self):
+        with self._lock:
+            if self._stop is not None:
+                self._stop.set()
+                self._stop = None
+
+    def _run(self, stop):
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id in list(self._active):
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(stack)))
+            del frames
+            with self._lock:
+                self._samples.update(stacks)
+
+    def dump(self, top=None, reset=False):
+        """Folded stacks sampled so far, most frequent first."""
+        with self._lock:
+            samples = self._samples.most_common(top)
+            if reset:
+                self._samples = Counter()
+        return '\n'.join(f'{stack} {count}' for stack, count in samples) + '\n'
+
+# Per-process instances shared by the API servers
+metrics = Metrics()
+profiler = SamplingProfiler()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Dynamic micro-batching for prediction requests.
+
+Forest inference costs about the same for one row as for a few dozen, so
+when several requests are in flight in the same worker (gunicorn gthread
+workers, or the Flask development server) it pays to score them together.
+Callers hand their trait vector to MicroBatcher.submit() and block; a
+background thread collects queued vectors until either max_batch_size rows
+are waiting or the oldest one has waited max_wait_us microseconds, scores
+them with one vectorized call and hands each caller its slice.
+"""
+
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+from metrics import Histogram
+
+class _Pending:
+    """A queued row and the slot its result is delivered to."""
+
+    __slots__ = ('row', 'enqueued', 'done', 'result', 'error')
+
+    def __init__(self, row):
+        self.row = row
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """
+    Queue single-row predictions and score them in batches.
+
+    score_fn takes an (N, n_features) array and returns a tuple of arrays
+    whose first axis has length N; submit() returns the same tuple sliced
+    to the caller's row (each array keeps a leading axis of length 1).
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_us=1000):
+        self.score_fn = score_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max_wait_us / 1e6
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+        self.batch_sizes = Histogram(self.max_batch_size)
+        self.queue_depths = Histogram(self.max_batch_size * 4)
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so a worker forked from a parent that
+        # already started the batcher has to start its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+                thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+                thread.start()
+                self._pid = os.getpid()
+
+    def submit(self, row):
+        """Score a single row as part of the next batch and return its slice."""
+        self._ensure_started()
+        pending = _Pending(row)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        """Block for the first row, then gather more until the batch is full or the window closes."""
+        batch = [self._queue.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.queue_depths.observe(len(batch) + self._queue.qsize())
+            self.batch_sizes.observe(len(batch))
+            self.batches += 1
+            self.requests += len(batch)
+
+            try:
+                outputs = self.score_fn(np.array([pending.row for pending in batch]))
+                for i, pending in enumerate(batch):
+                    pending.result = tuple(output[i:i + 1] for output in outputs)
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def stats(self):
+        """Queue depth and batch size histograms for the stats endpoint."""
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_us': int(self.max_wait * 1e6),
+            'queue_depth': self._queue.qsize(),
+            'batches': self.batches,
+            'requests': self.requests,
+            'batch_size': self.batch_sizes.to_dict(),
+            'queue_depth_at_flush': self.queue_depths.to_dict()
+        }
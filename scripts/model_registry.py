@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Local versioned model registry and per-worker hot reload.
+
+The registry is a directory holding one compiled forest export per version
+(see forest_engine.py) and a registry.json manifest naming the active
+version and the order in which versions were activated:
+
+    models/registry/
+        registry.json
+        5558cc3cf795/manifest.json, feature.npy, ...
+        91b0e2d4a7c3/...
+
+Prediction workers run a ModelWatcher that polls the manifest. When the
+active version changes it loads and warms the new version in the background
+and only then swaps it in, so requests already in flight finish on the old
+version and no request ever waits for a load.
+
+Command line usage:
+
+    python model_registry.py register [--model models/career_prediction_model.pkl] [--no-activate]
+    python model_registry.py list
+    python model_registry.py activate <version>
+    python model_registry.py rollback
+"""
+
+import argparse
+import contextlib
+import fcntl
+import json
+import os
+import pickle
+import sys
+import threading
+import time
+import numpy as np
+
+from forest_engine import (DEFAULT_MODEL_PATH, compile_forest, compiled_manifest_path, forest_version,
+                           load_compiled_forest, save_compiled_forest, verify_parity)
+
+DEFAULT_REGISTRY_DIR = 'models/registry'
+REGISTRY_MANIFEST = 'registry.json'
+
+class RegistryError(Exception):
+    """Raised when a registry operation cannot be carried out."""
+
+class ModelRegistry:
+    """Versioned compiled forests in a local directory."""
+
+    def __init__(self, path=DEFAULT_REGISTRY_DIR):
+        self.path = path
+        self.manifest_path = os.path.join(path, REGISTRY_MANIFEST)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def version_path(self, version):
+        return os.path.join(self.path, version)
+
+    def read_manifest(self):
+        if not self.exists():
+            return {'active': None, 'history': [], 'versions': {}}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    @contextlib.contextmanager
+    def _update(self):
+        """Read-modify-write the manifest under an exclusive lock."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self.read_manifest()
+            yield manifest
+            staging = f'{self.manifest_path}.tmp-{os.getpid()}'
+            with open(staging, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(staging, self.manifest_path)
+
+    def active_version(self):
+        return self.read_manifest()['active']
+
+    def load(self, version):
+        """Memory-map the compiled forest of a registered version."""
+        if version not in self.read_manifest()['versions']:
+            raise RegistryError(f"Model version {version} is not registered")
+        return load_compiled_forest(self.version_path(version))
+
+    def register(self, forest, activate=True, source=None):
+        """Store a compiled forest as a new version and optionally activate it."""
+        version = forest_version(forest)
+        if not os.path.exists(compiled_manifest_path(self.version_path(version))):
+            # Versions are content hashes, so an existing export is identical
+            save_compiled_forest(forest, self.version_path(version))
+        with self._update() as manifest:
+            manifest['versions'].setdefault(version, {
+                'registered': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'source': source
+            })
+            if activate:
+                _activate(manifest, version)
+        return version
+
+    def activate(self, version):
+        with self._update() as manifest:
+            if version not in manifest['versions']:
+                raise RegistryError(f"Model version {version} is not registered")
+            _activate(manifest, version)
+        return version
+
+    def rollback(self):
+        """Reactivate the version that was active before the current one."""
+        with self._update() as manifest:
+            if len(manifest['history']) < 2:
+                raise RegistryError("No earlier model version to roll back to")
+            manifest['history'].pop()
+            manifest['active'] = manifest['history'][-1]
+        return manifest['active']
+
+def _activate(manifest, version):
+    if manifest['active'] != version:
+        manifest['history'].append(version)
+    manifest['active'] = version
+
+def warm_up(forest, n_rows=256, seed=0):
+    """Run predictions over random trait vectors so the arrays are paged in before serving."""
+    rng = np.random.default_rng(seed)
+    forest.predict_proba(rng.uniform(1, 10, (n_rows, forest.n_features_in_)))
+    forest.predict_proba(rng.uniform(1, 10, (1, forest.n_features_in_)))
+
+class ModelWatcher:
+    """
+    Poll a registry for a change of active version and hot-swap it in.
+
+    on_swap(forest) is called from the watcher thread with the loaded and
+    warmed forest; it must install it with a single reference assignment.
+    """
+
+    def __init__(self, registry, current_version, on_swap, interval=5.0, load=None):
+        self.registry = registry
+        self.current_version = current_version
+        self.on_swap = on_swap
+        self.interval = interval
+        self.load = load or registry.load
+        self.last_error = None
+        self.last_swap = None
+        self._lock = threading.Lock()
+        self._pid = None
+        self._manifest_mtime = None
+
+    def ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own watcher
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+                thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                mtime = os.stat(self.registry.manifest_path).st_mtime_ns
+            except OSError:
+                continue
+            if mtime != self._manifest_mtime:
+                self._manifest_mtime = mtime
+                self.check_now()
+
+    def check_now(self):
+        """Load and swap in the active version if it differs from the one being served."""
+        with self._lock:
+            try:
+                version = self.registry.active_version()
+                if version is None or version == self.current_version:
+                    return False
+                forest = self.load(version)
+                warm_up(forest)
+                self.on_swap(forest)
+                self.current_version = version
+                self.last_swap = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+                self.last_error = None
+                print(f"Swapped in model version {version}")
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error reloading model, keeping version {self.current_version}: {e}")
+                return False
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local model registry.")
+    parser.add_argument('--registry', default=DEFAULT_REGISTRY_DIR, help="registry directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    register = commands.add_parser('register', help="compile a pickled model and register it")
+    register.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled model to register")
+    register.add_argument('--no-activate', action='store_true', help="register without activating")
+
+    commands.add_parser('list', help="list registered versions")
+
+    activate = commands.add_parser('activate', help="activate a registered version")
+    activate.add_argument('version')
+
+    commands.add_parser('rollback', help="reactivate the previously active version")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.registry)
+
+    try:
+        if args.command == 'register':
+            with open(args.model, 'rb') as f:
+                model = pickle.load(f)
+            forest = compile_forest(model)
+            verify_parity(model, forest)
+            version = registry.register(forest, activate=not args.no_activate, source=os.path.abspath(args.model))
+            print(f"Registered model version {version}" + ("" if args.no_activate else " (active)"))
+        elif args.command == 'list':
+            manifest = registry.read_manifest()
+            for version, info in manifest['versions'].items():
+                marker = '*' if version == manifest['active'] else ' '
+                print(f"{marker} {version}  registered {info['registered']}  {info.get('source') or ''}")
+        elif args.command == 'activate':
+            print(f"Activated model version {registry.activate(args.version)}")
+        elif args.command == 'rollback':
+            print(f"Rolled back to model version {registry.rollback()}")
+    except (RegistryError, FileNotFoundError) as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
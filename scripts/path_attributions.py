@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Per-trait contributions to a prediction, from the decision paths of the forest.
+
+Every split on the way from a tree's root to a leaf moves the class
+distribution from the parent's to the child's; the change is credited to
+the trait the parent splits on. Summed along the path, the tree's prediction
+is its root distribution (the bias) plus one contribution per trait, and
+averaged over the trees the same holds for the forest:
+
+    predict_proba(x)[c] == bias[c] + sum(contributions[t, c] for each trait t)
+
+The sums only depend on the leaf, so they are precomputed for every leaf
+when the model is loaded. Explaining a row then costs the tree walk the
+prediction needs anyway plus one gather and a mean over the trees, fully
+vectorized for batches. Run the script for a benchmark of the added cost:
+
+    python path_attributions.py [--repeats 200]
+"""
+
+import argparse
+import time
+import numpy as np
+
+from forest_engine import CHUNK_SIZE, load_forest
+
+class PathAttributions:
+    """Leaf contribution tables of a CompiledForest."""
+
+    def __init__(self, forest):
+        if not hasattr(forest, 'value') or len(forest.value) != len(forest.threshold):
+            # Quantized forests only keep leaf distributions, not the ones along the path
+            raise ValueError("Path attributions need the class distribution of every node")
+        self.forest = forest
+        n_nodes = len(forest.threshold)
+        n_features = forest.n_features_in_
+        feature = np.asarray(forest.feature)
+        children = np.asarray(forest.children)
+        value = np.asarray(forest.value)
+        roots = np.asarray(forest.roots)
+
+        # Walked level by level from the roots, all trees at once
+        contributions = np.zeros((n_nodes, n_features, value.shape[1]))
+        frontier = roots
+        while len(frontier):
+            parents = frontier[children[2 * frontier] != frontier]
+            next_frontier = []
+            for side in (0, 1):
+                child = children[2 * parents + side]
+                contributions[child] = contributions[parents]
+                contributions[child, feature[parents]] += value[child] - value[parents]
+                next_frontier.append(child)
+            frontier = np.concatenate(next_frontier)
+
+        is_leaf = children[0::2] == np.arange(n_nodes)
+        self.leaf_row = np.where(is_leaf, np.cumsum(is_leaf) - 1, 0).astype(np.int32)
+        self.contributions = contributions[is_leaf].astype(np.float32)
+        self.bias = value[roots].mean(axis=0)
+
+    @property
+    def nbytes(self):
+        return self.leaf_row.nbytes + self.contributions.nbytes
+
+    def predict_proba_explained(self, X, classes=None):
+        """
+        Class probabilities and the attributions of one class per row.
+
+        classes holds a class index per row, by default the predicted one.
+        Returns (probabilities (N, n_classes), bias (N,), contributions
+        (N, n_features)); the probabilities are identical to the forest's
+        predict_proba.
+        """
+        forest = self.forest
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        proba = np.empty((X.shape[0], self.contributions.shape[2]))
+        rows = np.empty((forest.n_estimators, X.shape[0]), dtype=np.int32)
+        for start in range(0, X.shape[0], CHUNK_SIZE):
+            leaves = forest.apply(X[start:start + CHUNK_SIZE])
+            # As CompiledForest.predict_proba, from the same leaves
+            proba[start:start + CHUNK_SIZE] = np.add.reduce(np.take(forest.value, leaves, axis=0), axis=0)
+            rows[:, start:start + CHUNK_SIZE] = np.take(self.leaf_row, leaves)
+        proba /= forest.n_estimators
+
+        if classes is None:
+            classes = proba.argmax(axis=1)
+        contributions = np.empty(X.shape)
+        for start in range(0, X.shape[0], CHUNK_SIZE):
+            chunk = rows[:, start:start + CHUNK_SIZE]
+            # (n_trees, chunk, n_features) contributions of each row's class
+            per_tree = self.contributions[chunk, :, classes[None, start:start + CHUNK_SIZE]]
+            contributions[start:start + CHUNK_SIZE] = per_tree.mean(axis=0, dtype=np.float64)
+        return proba, self.bias[classes], contributions
+
+def time_call(function, X, repeats):
+    """Median seconds of function(X)."""
+    function(X)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(X)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cost of path attributions on top of predict_proba.")
+    parser.add_argument('--repeats', type=int, default=200, help="timed calls per batch size")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 10000])
+    args = parser.parse_args()
+
+    forest = load_forest()
+    start = time.perf_counter()
+    attributions = PathAttributions(forest)
+    print(f"Precomputed attributions for {len(attributions.contributions)} leaves of {forest.n_estimators} trees "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms ({attributions.nbytes / 1e6:.1f} MB)")
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(1, 10, (max(args.batch_sizes), forest.n_features_in_))
+    proba, bias, contributions = attributions.predict_proba_explained(X)
+    predicted = proba.argmax(axis=1)
+    error = np.abs(bias + contributions.sum(axis=1) - proba[np.arange(len(X)), predicted]).max()
+    print(f"Largest gap between bias + contributions and the predicted probability: {error:.2e}")
+
+    print(f"\n{'rows':>7} {'predict us':>11} {'explained us':>13} {'added us':>9} {'added us/row':>13}")
+    for batch_size in args.batch_sizes:
+        rows = X[:batch_size]
+        repeats = max(3, args.repeats // max(1, batch_size // 100))
+        plain = time_call(forest.predict_proba, rows, repeats)
+        explained = time_call(attributions.predict_proba_explained, rows, repeats)
+        added = (explained - plain) * 1e6
+        print(f"{batch_size:>7} {plain * 1e6:>11.0f} {explained * 1e6:>13.0f} {added:>9.0f} {added / batch_size:>13.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,948 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Framework-independent core of the career prediction API.
+
+Loads the model (and optional trait grid and micro-batcher) once per process
+and implements validation, scoring and response formatting for the
+prediction endpoints. flask_server.py (WSGI) and asgi_server.py (ASGI) are
+thin HTTP layers over the functions here, so both serve the same contract.
+"""
+
+import hmac
+import json
+import os
+import pickle
+import threading
+import time
+import numpy as np
+
+from forest_engine import CompiledForest, compile_forest, load_compiled_forest, load_forest, top_k_classes
+from path_attributions import PathAttributions
+from trait_grid import load_trait_grid
+from micro_batcher import MicroBatcher
+from model_registry import ModelRegistry, ModelWatcher, RegistryError
+from metrics import metrics, profiler
+from feedback_log import FeedbackLog
+from request_log import RequestLog
+from admission import AdmissionController, queue_wait
+from shadow_model import DELTA_SCALE as SHADOW_DELTA_SCALE, ShadowScorer
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Frontends allowed to call the API, in production and development
+CORS_ORIGINS = ["https://r-career-fe999.web.app", "http://localhost:3000", "http://127.0.0.1:3000"]
+
+# Traits expected by the model
+EXPECTED_TRAITS = [
+    'Openness', 
+    'Conscientiousness', 
+    'Extraversion', 
+    'Agreeableness', 
+    'Neuroticism'
+]
+
+# Number of top career matches returned for each prediction
+TOP_K = 3
+
+# Content type of the packed protocol of the prediction endpoints: the
+# request body is N little-endian float32 trait vectors of 5 values, the
+# response N PACKED_RESULT records (the top-k class ids, as indices into the
+# X-Career-Classes header, then their float32 probabilities)
+BINARY_CONTENT_TYPE = 'application/octet-stream'
+PACKED_RESULT = np.dtype([('classes', 'u1', (TOP_K,)), ('probabilities', '<f4', (TOP_K,))])
+
+# Class id and probability of the rows of a packed request that failed validation
+INVALID_CLASS_ID = 255
+
+# Upper bound on the number of trait vectors accepted by /predict/batch
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 10000))
+
+# Load the model when the server starts
+MODEL_PATH = os.path.join(SCRIPT_DIR, 'models/career_prediction_model.pkl')
+COMPILED_MODEL_PATH = os.path.join(SCRIPT_DIR, 'models/career_prediction_model')
+
+# 'compiled' serves predictions with the NumPy forest engine (see forest_engine.py),
+# 'sklearn' with the pickled RandomForestClassifier itself
+MODEL_ENGINE = os.environ.get('MODEL_ENGINE', 'compiled')
+
+# Answer inputs that lie exactly on the trait grid from the precomputed lookup
+# table built by trait_grid.py; off-grid inputs still go through the model
+USE_TRAIT_GRID = os.environ.get('USE_TRAIT_GRID', '0') == '1'
+TRAIT_GRID_PATH = os.path.join(SCRIPT_DIR, 'models/career_trait_grid.npz')
+
+# Queue concurrent /predict requests within a worker and score them together.
+# Only useful when a worker serves several requests at once (e.g. gunicorn
+# --threads); a longer window trades single-request latency for throughput
+MICRO_BATCH = os.environ.get('MICRO_BATCH', '0') == '1'
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+MICRO_BATCH_MAX_WAIT_US = int(os.environ.get('MICRO_BATCH_MAX_WAIT_US', 1000))
+
+# Precompute per-leaf path attributions when a model is loaded so that
+# requests with "explain": true get per-trait contributions (about 3 MB per
+# worker for the default forest); explain requests are rejected when off
+EXPLANATIONS = os.environ.get('EXPLANATIONS', '1') == '1'
+
+# Versioned model directory managed by model_registry.py. When it has an
+# active version the compiled engine serves that version and each worker
+# polls the registry every MODEL_RELOAD_INTERVAL seconds (0 disables it),
+# swapping newly activated versions in without a restart
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', os.path.join(SCRIPT_DIR, 'models/registry'))
+MODEL_RELOAD_INTERVAL = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+
+# Bearer token required by the /admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# Run the sampling profiler (see metrics.py) from the first request on
+# instead of only between /admin/profile/start and /admin/profile/stop
+PROFILER = os.environ.get('PROFILER', '0') == '1'
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', 5))
+
+# Append-only log of POST /feedback entries (the traits and the career the
+# user chose), which refresh_model.py grows the forest from. A background
+# thread writes buffered entries every FEEDBACK_FLUSH_INTERVAL seconds; a
+# worker holds at most FEEDBACK_MAX_PENDING unwritten entries and answers
+# 503 beyond that
+FEEDBACK_LOG = os.environ.get('FEEDBACK_LOG', os.path.join(SCRIPT_DIR, 'feedback/feedback.jsonl'))
+FEEDBACK_FLUSH_INTERVAL = float(os.environ.get('FEEDBACK_FLUSH_INTERVAL', 1))
+FEEDBACK_MAX_PENDING = int(os.environ.get('FEEDBACK_MAX_PENDING', 10000))
+
+# Structured log of the requests to LOGGED_ENDPOINTS and their responses
+# (see request_log.py), off unless REQUEST_LOG=1 as the bodies hold users'
+# trait vectors; one file per worker in REQUEST_LOG_DIR, written in
+# batches by a background thread. Records are dropped and counted rather
+# than waited for once REQUEST_LOG_QUEUE of them are queued. Files rotate at
+# REQUEST_LOG_MAX_MB or after REQUEST_LOG_ROTATE_SECONDS and are gzipped;
+# the newest REQUEST_LOG_BACKUPS rotated files are kept
+REQUEST_LOG = os.environ.get('REQUEST_LOG', '0') == '1'
+REQUEST_LOG_DIR = os.environ.get('REQUEST_LOG_DIR', os.path.join(SCRIPT_DIR, 'logs'))
+REQUEST_LOG_QUEUE = int(os.environ.get('REQUEST_LOG_QUEUE', 10000))
+REQUEST_LOG_MAX_MB = float(os.environ.get('REQUEST_LOG_MAX_MB', 64))
+REQUEST_LOG_ROTATE_SECONDS = float(os.environ.get('REQUEST_LOG_ROTATE_SECONDS', 3600))
+REQUEST_LOG_BACKUPS = int(os.environ.get('REQUEST_LOG_BACKUPS', 20))
+LOGGED_ENDPOINTS = ('/predict', '/predict/batch', '/feedback')
+
+# Candidate model scored in the background on a sample of the /predict
+# traffic of flask_server.py (see shadow_model.py): a registered version or
+# the path of a compiled export, e.g. models/career_prediction_model_distilled.
+# SHADOW_SAMPLE_RATE of the successful requests are mirrored once their
+# response has been sent, to a pool of SHADOW_WORKERS threads per worker;
+# mirrored requests are dropped once SHADOW_QUEUE of them wait
+SHADOW_MODEL = os.environ.get('SHADOW_MODEL')
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1))
+SHADOW_QUEUE = int(os.environ.get('SHADOW_QUEUE', 100))
+SHADOW_WORKERS = int(os.environ.get('SHADOW_WORKERS', 1))
+
+# Admission control (see admission.py): a worker rejects requests to
+# ADMITTED_ENDPOINTS with 503 and a Retry-After of ADMISSION_RETRY_AFTER
+# seconds once their expected latency, from their queue wait and the
+# service time of their endpoint, exceeds ADMISSION_TARGET_MS; 0 (the
+# default) turns it off. Other endpoints, /health in particular, are
+# always served
+ADMISSION_TARGET_MS = float(os.environ.get('ADMISSION_TARGET_MS', 0))
+ADMISSION_RETRY_AFTER = int(os.environ.get('ADMISSION_RETRY_AFTER', 1))
+ADMITTED_ENDPOINTS = ('/predict', '/predict/batch', '/feedback')
+
+# Synthetic predictions each worker runs before /health reports it ready, so
+# that real traffic does not pay for lazy initialization (the micro-batcher
+# and watcher threads, first calls into NumPy and the JSON encoder, faulting
+# in the memory-mapped model); 0 reports workers ready at once
+WARMUP_REQUESTS = int(os.environ.get('WARMUP_REQUESTS', 20))
+
+class ModelState:
+    """
+    A loaded model with the trait grid built for it and its version.
+
+    The serving state is replaced as a whole by assigning a new instance to
+    the module global, so a request that read it once keeps a consistent
+    model, grid and version even if a new version is swapped in meanwhile.
+    """
+
+    __slots__ = ('model', 'trait_grid', 'attributions', 'version')
+
+    def __init__(self, model, trait_grid=None, attributions=None):
+        self.model = model
+        self.trait_grid = trait_grid
+        self.attributions = attributions
+        self.version = getattr(model, 'version', None)
+
+registry = ModelRegistry(MODEL_REGISTRY_DIR) if MODEL_ENGINE == 'compiled' else None
+
+def check_traits(forest):
+    if list(forest.feature_names_in_) != EXPECTED_TRAITS:
+        raise ValueError(f"Model expects traits {list(forest.feature_names_in_)}, not {EXPECTED_TRAITS}")
+    return forest
+
+def load_version(version):
+    """Memory-map a registered model version."""
+    return check_traits(registry.load(version))
+
+def load_model():
+    """Load the pre-trained model from disk."""
+    try:
+        if MODEL_ENGINE == 'compiled':
+            if registry.active_version() is not None:
+                return load_version(registry.active_version())
+            return check_traits(load_forest(MODEL_PATH, COMPILED_MODEL_PATH))
+        
+        if not os.path.exists(MODEL_PATH):
+            raise FileNotFoundError(f"Model file not found at {MODEL_PATH}. "
+                                "Please run train_model.py first.")
+        
+        with open(MODEL_PATH, 'rb') as f:
+            model = pickle.load(f)
+        
+        return model
+    except Exception as e:
+        print(f"Error loading model: {e}")
+        # For production, we'll return None and handle this case
+        return None
+
+def load_grid(model):
+    """Load the trait grid lookup table if it was built for the given model."""
+    try:
+        grid = load_trait_grid(TRAIT_GRID_PATH)
+        if grid.model_version is not None:
+            if grid.model_version != getattr(model, 'version', None):
+                raise ValueError(f"Trait grid was built for model version {grid.model_version}")
+        elif os.path.exists(MODEL_PATH) and os.path.getmtime(TRAIT_GRID_PATH) < os.path.getmtime(MODEL_PATH):
+            raise ValueError("Trait grid is older than the model; rebuild it with trait_grid.py")
+        if model is None or not np.array_equal(grid.classes_, np.asarray(model.classes_).astype(str)):
+            raise ValueError("Trait grid classes do not match the model")
+        return grid
+    except Exception as e:
+        print(f"Error loading trait grid, serving every request from the model: {e}")
+        return None
+
+def load_attributions(model):
+    """Precompute the path attributions of a model, or None if it has none."""
+    try:
+        forest = model if isinstance(model, CompiledForest) else compile_forest(model)
+        return PathAttributions(forest)
+    except Exception as e:
+        print(f"Path attributions are unavailable for this model, explain requests will be rejected: {e}")
+        return None
+
+def load_state(model):
+    """Wrap a model, and the trait grid and attributions when enabled, into a ModelState."""
+    grid = None
+    if USE_TRAIT_GRID and model is not None:
+        grid = load_grid(model)
+        if grid is not None:
+            print(f"Serving on-grid inputs from the trait grid at {TRAIT_GRID_PATH} (step {grid.step:g})")
+    attributions = load_attributions(model) if EXPLANATIONS and model is not None else None
+    state = ModelState(model, grid, attributions)
+    metrics.set_info(engine=MODEL_ENGINE, model_version=state.version or '', trait_grid=grid is not None)
+    return state
+
+try:
+    # Load model at startup
+    load_start = time.perf_counter()
+    state = load_state(load_model())
+    metrics.set_gauge('career_api_model_load_seconds', time.perf_counter() - load_start)
+    print(f"Successfully loaded model version {state.version} ({MODEL_ENGINE} engine)")
+except Exception as e:
+    print(f"Error loading model: {e}")
+    state = ModelState(None)
+
+def swap_model(forest):
+    """Install a loaded and warmed forest as the serving model."""
+    global state
+    state = load_state(forest)
+    metrics.set_gauge('career_api_model_swap_timestamp_seconds', time.time())
+
+watcher = None
+if registry is not None:
+    watcher = ModelWatcher(registry, state.version, swap_model, MODEL_RELOAD_INTERVAL, load_version)
+
+def current_state():
+    """The serving ModelState; read it once per request."""
+    if watcher is not None and MODEL_RELOAD_INTERVAL > 0:
+        watcher.ensure_started()
+    return state
+
+def validate_trait_matrix(rows):
+    """
+    Validate a batch of trait vectors using array operations.
+
+    Returns a tuple (X, valid, errors) where X is an (N, 5) float array,
+    valid is a boolean mask of rows that passed validation and errors is a
+    list of {'index', 'message'} dicts for the rows that did not.
+    """
+    n_traits = len(EXPECTED_TRAITS)
+    try:
+        X = np.asarray(rows, dtype=np.float64)
+    except (TypeError, ValueError):
+        X = None
+
+    if X is None or X.ndim != 2 or X.shape[1] != n_traits:
+        # Ragged or non-numeric input: convert row by row so that a single
+        # bad vector only invalidates itself
+        X = np.full((len(rows), n_traits), np.nan)
+        shape_errors = {}
+        for i, row in enumerate(rows):
+            if not isinstance(row, list) or len(row) != n_traits:
+                shape_errors[i] = (f'personality_traits must be an array with {n_traits} values '
+                                   '(Openness, Conscientiousness, Extraversion, Agreeableness, Neuroticism)')
+                continue
+            try:
+                X[i] = [float(trait) for trait in row]
+            except (TypeError, ValueError):
+                shape_errors[i] = 'All personality trait scores must be numbers'
+    else:
+        shape_errors = {}
+
+    out_of_range = ~((X >= 1) & (X <= 10))
+    valid = ~out_of_range.any(axis=1)
+    first_bad = out_of_range.argmax(axis=1)
+
+    errors = []
+    for i in np.flatnonzero(~valid):
+        message = shape_errors.get(i, f'{EXPECTED_TRAITS[first_bad[i]]} score must be between 1 and 10')
+        errors.append({'index': int(i), 'message': message})
+
+    return X, valid, errors
+
+def score_trait_matrix(state, X, k=TOP_K):
+    """
+    Score an (N, 5) trait matrix with a single predict_proba call.
+
+    Rows lying on the trait grid are answered from the lookup table when one
+    is loaded; the rest go through the model. Returns the predicted class
+    indices (N,), the top-k class indices (N, k) ordered by descending
+    probability and their probabilities (N, k).
+    """
+    predicted = np.empty(len(X), dtype=np.intp)
+    top = np.empty((len(X), k), dtype=np.intp)
+    top_probs = np.empty((len(X), k))
+
+    model, trait_grid = state.model, state.trait_grid
+    if trait_grid is not None and k <= trait_grid.k:
+        with metrics.timed('grid_lookup'):
+            on_grid, cells = trait_grid.locate(X)
+            cells = cells[on_grid]
+            predicted[on_grid] = trait_grid.predicted[cells]
+            top[on_grid] = trait_grid.top_classes[cells, :k]
+            top_probs[on_grid] = trait_grid.top_probs[cells, :k]
+        off_grid = ~on_grid
+    else:
+        off_grid = np.ones(len(X), dtype=bool)
+
+    if off_grid.all():
+        X_model = X
+    elif off_grid.any():
+        X_model = X[off_grid]
+    else:
+        return predicted, top, top_probs
+
+    if isinstance(model, CompiledForest):
+        input_data = X_model
+    else:
+        # Only the sklearn engine needs pandas; importing it costs about 0.4 s of cold start
+        import pandas as pd
+        with metrics.timed('dataframe'):
+            input_data = pd.DataFrame(X_model, columns=EXPECTED_TRAITS)
+    with metrics.timed('model'):
+        probabilities = model.predict_proba(input_data)
+
+    with metrics.timed('top_k'):
+        # RandomForestClassifier.predict is the argmax of predict_proba
+        predicted[off_grid] = probabilities.argmax(axis=1)
+        model_top = top_k_classes(probabilities, k)
+        top[off_grid] = model_top
+        top_probs[off_grid] = np.take_along_axis(probabilities, model_top, axis=1)
+
+    return predicted, top, top_probs
+
+def explain_trait_matrix(state, X, k=TOP_K):
+    """
+    Score an (N, 5) trait matrix like score_trait_matrix and attribute each
+    prediction to the traits.
+
+    Every row goes through the model, as the attributions come from the same
+    tree walk. Returns predicted, top and top_probs as score_trait_matrix
+    does, plus the bias (N,) and per-trait contributions (N, 5) to the
+    predicted class's probability.
+    """
+    with metrics.timed('explain'):
+        probabilities, bias, contributions = state.attributions.predict_proba_explained(X)
+
+    with metrics.timed('top_k'):
+        predicted = probabilities.argmax(axis=1)
+        top = top_k_classes(probabilities, k)
+        top_probs = np.take_along_axis(probabilities, top, axis=1)
+
+    return predicted, top, top_probs, bias, contributions
+
+def add_explanations(results, bias, contributions):
+    """Attach the attribution of each result's predicted career to it."""
+    trait_keys = [trait_name.lower() for trait_name in EXPECTED_TRAITS]
+    for result, base, row in zip(results, bias.tolist(), contributions.tolist()):
+        result['explanation'] = {
+            'career': result['prediction'],
+            'base_probability': base,
+            'contributions': dict(zip(trait_keys, row))
+        }
+    return results
+
+def explain_flag(data, state):
+    """Whether the request asks for explanations, or an error response if it cannot have them."""
+    explain = data.get('explain', False)
+    if not isinstance(explain, bool):
+        return None, error('explain must be true or false', 400)
+    if explain and state.attributions is None:
+        return None, error('Explanations are not available for this model', 400)
+    return explain, None
+
+def format_predictions(state, X, predicted, top, top_probs):
+    """Build the JSON-ready result dict for each scored row."""
+    with metrics.timed('format'):
+        return _format_predictions(state, X, predicted, top, top_probs)
+
+def _format_predictions(state, X, predicted, top, top_probs):
+    classes = [str(c) for c in state.model.classes_]
+    trait_keys = [trait_name.lower() for trait_name in EXPECTED_TRAITS]
+    high = X > 5.5
+
+    results = []
+    for i in range(len(predicted)):
+        results.append({
+            'prediction': classes[predicted[i]],
+            'top_careers': [
+                {'career': classes[j], 'probability': float(p)}
+                for j, p in zip(top[i], top_probs[i])
+            ],
+            'trait_levels': {
+                key: 'high' if is_high else 'low'
+                for key, is_high in zip(trait_keys, high[i])
+            }
+        })
+    return results
+
+def score_batch(X):
+    """Score a micro-batch with the serving state, which is returned with each row."""
+    batch_state = current_state()
+    states = np.empty(len(X), dtype=object)
+    states[:] = [batch_state] * len(X)
+    return (*score_trait_matrix(batch_state, X), states)
+
+feedback_log = FeedbackLog(FEEDBACK_LOG, FEEDBACK_MAX_PENDING, FEEDBACK_FLUSH_INTERVAL)
+
+request_log = None
+if REQUEST_LOG:
+    request_log = RequestLog(REQUEST_LOG_DIR, REQUEST_LOG_QUEUE, max_bytes=REQUEST_LOG_MAX_MB * 1024 * 1024,
+                             rotate_seconds=REQUEST_LOG_ROTATE_SECONDS, backups=REQUEST_LOG_BACKUPS)
+
+def load_shadow_model(name):
+    """Memory-map the shadow model, a registered version or a compiled export directory."""
+    if registry is not None and registry.exists() and name in registry.read_manifest()['versions']:
+        return load_version(name)
+    return check_traits(load_compiled_forest(name))
+
+def decode_shadow_job(request_body, request_type, response_body, response_classes):
+    """
+    Rows of a mirrored /predict request with the careers and probabilities it was served.
+
+    Packed responses name careers by index into response_classes (their
+    X-Career-Classes header); rows that failed validation are left out.
+    """
+    if request_type == BINARY_CONTENT_TYPE:
+        X = np.frombuffer(request_body, dtype='<f4').reshape(-1, len(EXPECTED_TRAITS)).astype(np.float64)
+        served = np.frombuffer(response_body, dtype=PACKED_RESULT)
+        valid = served['classes'][:, 0] != INVALID_CLASS_ID
+        classes = np.array(response_classes.split(','))
+        return X[valid], classes[served['classes'][valid]], served['probabilities'][valid].astype(np.float64)
+    
+    X = np.array([json.loads(request_body)['personality_traits']], dtype=np.float64)
+    top = json.loads(response_body)['top_careers']
+    return X, [[match['career'] for match in top]], np.array([[match['probability'] for match in top]])
+
+shadow = None
+if SHADOW_MODEL:
+    try:
+        shadow = ShadowScorer(load_shadow_model(SHADOW_MODEL), decode_shadow_job, SHADOW_SAMPLE_RATE,
+                              SHADOW_QUEUE, SHADOW_WORKERS)
+        metrics.set_info(shadow_model_version=shadow.version or '')
+        print(f"Scoring {SHADOW_SAMPLE_RATE:.0%} of /predict requests with shadow model {shadow.version}")
+    except Exception as e:
+        print(f"Error loading shadow model {SHADOW_MODEL}, shadow scoring is off: {e}")
+
+admission = AdmissionController(ADMISSION_TARGET_MS / 1000) if ADMISSION_TARGET_MS > 0 else None
+
+batcher = None
+if MICRO_BATCH:
+    batcher = MicroBatcher(score_batch, MICRO_BATCH_MAX_SIZE, MICRO_BATCH_MAX_WAIT_US)
+
+def error(message, status):
+    """Payload and status code of an error response."""
+    return {'status': 'error', 'message': message}, status
+
+def health():
+    """Payload and status code of the health check."""
+    state = current_state()
+    if state.model is None:
+        return error('Model not loaded properly', 500)
+    
+    if not is_ready():
+        return {
+            'status': 'warming_up',
+            'message': 'Model is loaded, worker is still running its warm-up predictions',
+            'model_version': state.version
+        }, 503
+    
+    return {
+        'status': 'healthy',
+        'message': 'API is running and model is loaded',
+        'model_version': state.version
+    }, 200
+
+def predict_traits(data):
+    """
+    Validate and score the request body of /predict.
+    
+    Returns the response payload and status code.
+    """
+    # Check if model is loaded
+    state = current_state()
+    if state.model is None:
+        return error('Model not loaded properly', 500)
+    
+    with metrics.timed('validate'):
+        # Validate input
+        if not data or 'personality_traits' not in data:
+            return error('Request must include personality_traits array', 400)
+    
+        traits = data['personality_traits']
+    
+        # Check if the right number of traits is provided
+        if not isinstance(traits, list) or len(traits) != 5:
+            return error('personality_traits must be an array with 5 values '
+                         '(Openness, Conscientiousness, Extraversion, Agreeableness, Neuroticism)', 400)
+    
+        # Validate trait values
+        try:
+            traits = [float(trait) for trait in traits]
+            for i, trait in enumerate(traits):
+                # Written so that NaN fails too, as in validate_trait_matrix
+                if not 1 <= trait <= 10:
+                    return error(f'{EXPECTED_TRAITS[i]} score must be between 1 and 10', 400)
+        except (TypeError, ValueError):
+            return error('All personality trait scores must be numbers', 400)
+    
+        explain, failure = explain_flag(data, state)
+        if failure:
+            return failure
+    
+    # Make prediction
+    X = np.array([traits])
+    if explain:
+        *scored, bias, contributions = explain_trait_matrix(state, X)
+        result = add_explanations(format_predictions(state, X, *scored), bias, contributions)[0]
+        return {
+            'status': 'success',
+            'model_version': state.version,
+            **result
+        }, 200
+    
+    if batcher is not None:
+        with metrics.timed('micro_batch'):
+            *scored, states = batcher.submit(X[0])
+        state = states[0]
+    else:
+        scored = score_trait_matrix(state, X)
+    result = format_predictions(state, X, *scored)[0]
+    
+    return {
+        'status': 'success',
+        'model_version': state.version,
+        **result
+    }, 200
+
+def predict_trait_batch(data):
+    """
+    Validate and score the request body of /predict/batch.
+    
+    Returns the response payload and status code.
+    """
+    state = current_state()
+    if state.model is None:
+        return error('Model not loaded properly', 500)
+    
+    if not data or 'personality_traits' not in data or not isinstance(data['personality_traits'], list):
+        return error('Request must include personality_traits as an array of trait arrays', 400)
+    
+    rows = data['personality_traits']
+    if len(rows) > MAX_BATCH_SIZE:
+        return error(f'A batch may contain at most {MAX_BATCH_SIZE} trait arrays', 400)
+    
+    explain, failure = explain_flag(data, state)
+    if failure:
+        return failure
+    
+    with metrics.timed('validate'):
+        X, valid, errors = validate_trait_matrix(rows)
+    
+    results = [None] * len(rows)
+    if valid.any():
+        X_valid = X[valid]
+        if explain:
+            *scored, bias, contributions = explain_trait_matrix(state, X_valid)
+            scored = add_explanations(format_predictions(state, X_valid, *scored), bias, contributions)
+        else:
+            scored = format_predictions(state, X_valid, *score_trait_matrix(state, X_valid))
+        for i, result in zip(np.flatnonzero(valid), scored):
+            results[i] = result
+    
+    return {
+        'status': 'success',
+        'model_version': state.version,
+        'count': len(rows),
+        'valid_count': int(valid.sum()),
+        'results': results,
+        'errors': errors
+    }, 200
+
+def record_feedback(data):
+    """
+    Validate the request body of /feedback and queue it for the feedback log.
+    
+    Returns the response payload and status code.
+    """
+    state = current_state()
+    if state.model is None:
+        return error('Model not loaded properly', 500)
+    
+    if not data or 'personality_traits' not in data or 'career' not in data:
+        return error('Request must include personality_traits and the chosen career', 400)
+    
+    X, valid, errors = validate_trait_matrix([data['personality_traits']])
+    if not valid[0]:
+        return error(errors[0]['message'], 400)
+    
+    career = data['career']
+    # The forest can only learn careers it already predicts
+    if not isinstance(career, str) or career not in state.model.classes_:
+        return error(f'career must be one of {sorted(map(str, state.model.classes_))}', 400)
+    
+    if not feedback_log.append(X[0].tolist(), career, state.version):
+        return error('Too much feedback waiting to be written, try again later', 503)
+    
+    return {'status': 'accepted'}, 202
+
+def predict_packed(body, max_rows):
+    """
+    Score a packed float32 request body of at most max_rows trait vectors.
+
+    Returns (payload, status, headers): on success the payload is the packed
+    response bytes, otherwise an error dict as from error(). Rows that fail
+    validation get INVALID_CLASS_ID and NaN probabilities; the number of them
+    is in the X-Invalid-Rows header.
+    """
+    state = current_state()
+    if state.model is None:
+        return (*error('Model not loaded properly', 500), {})
+    if len(state.model.classes_) > INVALID_CLASS_ID:
+        return (*error('The packed protocol supports at most 255 careers', 500), {})
+
+    n_traits = len(EXPECTED_TRAITS)
+    row_bytes = 4 * n_traits
+    if not body or len(body) % row_bytes:
+        return (*error(f'Packed request body must be a non-empty multiple of {row_bytes} bytes '
+                       f'({n_traits} little-endian float32 traits per row)', 400), {})
+    if len(body) // row_bytes > max_rows:
+        limit = 'one trait vector' if max_rows == 1 else f'{max_rows} trait vectors'
+        return (*error(f'A packed request to this endpoint may contain at most {limit}', 400), {})
+
+    with metrics.timed('parse'):
+        # A read-only view of the body; no copy is made
+        X = np.frombuffer(body, dtype='<f4').reshape(-1, n_traits)
+
+    with metrics.timed('validate'):
+        valid = ((X >= 1) & (X <= 10)).all(axis=1)
+
+    scored = None
+    if valid.any():
+        scored = score_trait_matrix(state, X if valid.all() else X[valid])
+
+    with metrics.timed('serialize'):
+        result = np.empty(len(X), dtype=PACKED_RESULT)
+        result['classes'] = INVALID_CLASS_ID
+        result['probabilities'] = np.nan
+        if scored is not None:
+            _, top, top_probs = scored
+            result['classes'][valid] = top
+            result['probabilities'][valid] = top_probs
+        payload = result.tobytes()
+
+    return payload, 200, {
+        'X-Career-Classes': ','.join(str(c) for c in state.model.classes_),
+        'X-Top-K': str(TOP_K),
+        'X-Invalid-Rows': str(len(X) - int(valid.sum())),
+        'X-Model-Version': state.version or ''
+    }
+
+def authorize_admin(authorization):
+    """Error payload and status for a bad Authorization header, or None if it is accepted."""
+    if not ADMIN_TOKEN:
+        return error('Admin endpoints are disabled; set ADMIN_TOKEN to enable them', 403)
+    if not hmac.compare_digest(authorization or '', f'Bearer {ADMIN_TOKEN}'):
+        return error('Invalid or missing admin token', 401)
+    return None
+
+def model_info():
+    """Payload and status code of GET /admin/model."""
+    state = current_state()
+    if registry is None or not registry.exists():
+        return {
+            'status': 'success',
+            'registry': None,
+            'serving_version': state.version
+        }, 200
+    
+    manifest = registry.read_manifest()
+    return {
+        'status': 'success',
+        'registry': registry.path,
+        'active_version': manifest['active'],
+        'serving_version': state.version,
+        'history': manifest['history'],
+        'versions': manifest['versions'],
+        'last_swap': watcher.last_swap,
+        'last_reload_error': watcher.last_error
+    }, 200
+
+def rollback_model():
+    """Payload and status code of POST /admin/model/rollback."""
+    if registry is None or not registry.exists():
+        return error('No model registry is configured', 409)
+    try:
+        version = registry.rollback()
+    except RegistryError as e:
+        return error(str(e), 409)
+    
+    # Swap this worker now; the others follow at their next poll
+    watcher.check_now()
+    if current_state().version != version:
+        return error(f'Rolled back to {version} but could not load it: {watcher.last_error}', 500)
+    
+    return {
+        'status': 'success',
+        'active_version': version
+    }, 200
+
+# Process ids of the worker that started its warm-up and of the one that finished it
+warm_up_started_pid = None
+warmed_up_pid = None
+warm_up_lock = threading.Lock()
+# Set on the thread running the warm-up while it sends its requests
+warm_up_thread = threading.local()
+
+def is_ready():
+    """Whether this worker has finished its warm-up."""
+    return WARMUP_REQUESTS <= 0 or warmed_up_pid == os.getpid()
+
+def warm_up_requests(n_requests=WARMUP_REQUESTS, seed=0):
+    """
+    Synthetic (path, body, content_type) requests for warm_up.
+
+    They cycle through single, batch, explained and packed predictions so
+    that every path a real request can take has run once.
+    """
+    rng = np.random.default_rng(seed)
+    for i in range(n_requests):
+        X = np.round(rng.uniform(1, 10, (16, len(EXPECTED_TRAITS))), 1)
+        kind = i % 4
+        if kind == 0:
+            yield '/predict', json.dumps({'personality_traits': X[0].tolist()}).encode(), 'application/json'
+        elif kind == 1:
+            yield '/predict/batch', json.dumps({'personality_traits': X.tolist()}).encode(), 'application/json'
+        elif kind == 2 and EXPLANATIONS:
+            body = {'personality_traits': X[0].tolist(), 'explain': True}
+            yield '/predict', json.dumps(body).encode(), 'application/json'
+        else:
+            yield '/predict/batch', X.astype('<f4').tobytes(), BINARY_CONTENT_TYPE
+
+def handle_warm_up_request(path, body, content_type):
+    """Send a warm-up request straight to the handlers of this module."""
+    if content_type == BINARY_CONTENT_TYPE:
+        return predict_packed(body, MAX_BATCH_SIZE)
+    handler = predict_traits if path == '/predict' else predict_trait_batch
+    return handler(json.loads(body))
+
+def warm_up(send=None):
+    """
+    Run WARMUP_REQUESTS synthetic predictions, then report this worker ready.
+
+    send(path, body, content_type) routes them through the full stack of an
+    HTTP layer; by default they go straight to the handlers. Their latencies
+    are dropped from the metrics afterwards.
+    """
+    global warm_up_started_pid, warmed_up_pid
+    warm_up_started_pid = os.getpid()
+    start = time.perf_counter()
+    warm_up_thread.active = True
+    try:
+        for path, body, content_type in warm_up_requests():
+            (send or handle_warm_up_request)(path, body, content_type)
+    except Exception as e:
+        # A failing model shows up in the health check itself; do not keep
+        # the worker out of rotation forever because of its warm-up
+        print(f"Error during warm-up: {e}")
+    finally:
+        warm_up_thread.active = False
+    metrics.reset()
+    metrics.set_gauge('career_api_warm_up_seconds', time.perf_counter() - start)
+    warmed_up_pid = os.getpid()
+
+def ensure_warm_up(function=None):
+    """Run warm_up, or a function calling it, on a background thread unless this worker already started it."""
+    global warm_up_started_pid
+    if WARMUP_REQUESTS <= 0 or warm_up_started_pid == os.getpid():
+        return
+    with warm_up_lock:
+        if warm_up_started_pid != os.getpid():
+            # Threads do not survive fork, so each worker warms itself up
+            warm_up_started_pid = os.getpid()
+            threading.Thread(target=function or warm_up, name='warm-up', daemon=True).start()
+
+def in_warm_up():
+    """Whether the current thread is sending warm-up requests."""
+    return getattr(warm_up_thread, 'active', False)
+
+def logs_requests(endpoint):
+    """Whether requests to endpoint go to the request log; lets the HTTP layer skip collecting them."""
+    return request_log is not None and endpoint in LOGGED_ENDPOINTS and not in_warm_up()
+
+def log_request(started, method, endpoint, status, seconds, request_body, request_type, response_body,
+                response_type):
+    """Called by the HTTP layer after responding to a request for which logs_requests() is true."""
+    request_log.record(started, method, endpoint, status, seconds, request_body, request_type,
+                       response_body, response_type)
+
+def shadow_sampled(endpoint, status):
+    """Whether to mirror this response to the shadow model; lets the HTTP layer skip collecting it."""
+    return shadow is not None and endpoint == '/predict' and status == 200 and not in_warm_up() and shadow.sample()
+
+def mirror_to_shadow(request_body, request_type, response_body, response_classes=None):
+    """Called by the HTTP layer after sending a response for which shadow_sampled() was true."""
+    shadow.submit(request_body, request_type, response_body, response_classes)
+
+def controls_admission(endpoint):
+    """Whether requests to endpoint go through admit() and release()."""
+    return admission is not None and endpoint in ADMITTED_ENDPOINTS and not in_warm_up()
+
+def admit(endpoint):
+    """
+    Called by the HTTP layer before handling a request for which controls_admission() is true.
+    
+    Returns None to handle the request, or the payload, status code and
+    headers of the 503 response that sheds it. Either way release() must
+    follow.
+    """
+    wait = queue_wait()
+    metrics.observe_stage('queue_wait', wait)
+    if admission.enter(endpoint, wait):
+        return None
+    return (*error('Server is overloaded, try again later', 503), {'Retry-After': str(ADMISSION_RETRY_AFTER)})
+
+def release(endpoint, seconds, shed):
+    """Called by the HTTP layer when a request passed to admit() is done, also when its handler raised."""
+    admission.leave(endpoint, seconds, not shed)
+
+def shutdown():
+    """Called by the HTTP layer when a worker stops; writes what is still buffered."""
+    feedback_log.flush()
+    if request_log is not None:
+        request_log.close()
+
+def request_started():
+    """Called by the HTTP layer when a request starts, on the thread that handles it."""
+    if PROFILER and not profiler.running:
+        profiler.start(PROFILER_INTERVAL_MS / 1000)
+    profiler.request_started()
+
+def request_finished(endpoint, status, seconds):
+    """Called by the HTTP layer when a request has been handled."""
+    profiler.request_finished()
+    metrics.observe_request(endpoint, status, seconds)
+
+def metrics_text():
+    """Body of GET /metrics in the Prometheus text format."""
+    extra_histograms = []
+    extra_gauges = []
+    if batcher is not None:
+        extra_histograms = [
+            ('career_api_micro_batch_size', 'Rows scored per micro-batch', batcher.batch_sizes, 1),
+            ('career_api_micro_batch_queue_depth_at_flush', 'Queued rows when a micro-batch was flushed',
+             batcher.queue_depths, 1)
+        ]
+        extra_gauges = [('career_api_micro_batch_queue_depth', 'Rows waiting for the micro-batcher',
+                         batcher.stats()['queue_depth'])]
+    extra_gauges += [
+        ('career_api_feedback_pending', 'Feedback entries waiting to be written', feedback_log.pending),
+        ('career_api_feedback_written', 'Feedback entries written by this worker', feedback_log.written),
+        ('career_api_feedback_dropped', 'Feedback entries rejected because the buffer was full', feedback_log.dropped)
+    ]
+    if request_log is not None:
+        extra_gauges += [
+            ('career_api_request_log_queue_depth', 'Request log records waiting to be written', request_log.queue_depth),
+            ('career_api_request_log_written', 'Request log records written by this worker', request_log.written),
+            ('career_api_request_log_dropped', 'Request log records dropped because the queue was full',
+             request_log.dropped)
+        ]
+    if admission is not None:
+        stats = admission.stats()
+        extra_gauges += [
+            ('career_api_admission_in_flight', 'Requests subject to admission control being handled',
+             stats['in_flight']),
+            ('career_api_admission_service_seconds', 'Moving average of the handling time of admitted requests',
+             stats['service_time_seconds'], 'endpoint'),
+            ('career_api_admission_admitted', 'Requests admitted by admission control', stats['admitted'],
+             'endpoint'),
+            ('career_api_admission_shed', 'Requests rejected with 503 to keep latency within the target',
+             stats['shed'], 'endpoint')
+        ]
+    if shadow is not None:
+        stats = shadow.stats()
+        extra_histograms += [
+            ('career_api_shadow_inference_seconds', 'Shadow model predict_proba time per mirrored request',
+             shadow.latencies, 1e6),
+            ('career_api_shadow_probability_delta',
+             'Largest change of a served top-k probability under the shadow model, per row', shadow.deltas,
+             SHADOW_DELTA_SCALE)
+        ]
+        extra_gauges += [
+            ('career_api_shadow_compared', 'Rows scored by the shadow model', stats['compared']),
+            ('career_api_shadow_agreed', 'Rows for which the shadow model has the served top-1 career',
+             stats['agreed']),
+            ('career_api_shadow_dropped', 'Mirrored requests dropped because the shadow queue was full',
+             stats['dropped']),
+            ('career_api_shadow_errors', 'Mirrored requests the shadow model failed to score', stats['errors']),
+            ('career_api_shadow_queue_depth', 'Mirrored requests waiting for the shadow model',
+             stats['queue_depth'])
+        ]
+    return metrics.render(extra_histograms, extra_gauges)
+
+def start_profiler(interval_ms=None):
+    """Payload and status code of POST /admin/profile/start."""
+    try:
+        interval = float(interval_ms if interval_ms is not None else PROFILER_INTERVAL_MS) / 1000
+    except (TypeError, ValueError):
+        return error('interval_ms must be a number', 400)
+    if not 0 < interval <= 1:
+        return error('interval_ms must be between 0 and 1000', 400)
+    
+    profiler.start(interval)
+    return {
+        'status': 'success',
+        'message': f'Sampling request threads every {profiler.interval * 1000:g} ms in worker {os.getpid()}'
+    }, 200
+
+def stop_profiler():
+    """Payload and status code of POST /admin/profile/stop."""
+    profiler.stop()
+    return {
+        'status': 'success',
+        'message': f'Profiler stopped in worker {os.getpid()}'
+    }, 200
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compact, quantized representation of the career prediction forest.
+
+Trait scores only range from 1 to 10, so the forest does not need float64
+thresholds, 64-bit node indices or float64 class distributions at every
+node. The quantized forest stores:
+
+- thresholds as uint8 levels of a trait grid (--step, 0.05 by default);
+  inputs are rounded to the same grid before the trees are walked, so
+  on-grid inputs take exactly the branches of the original forest
+- split features as uint8 and children as tree-local int16 indices (int32
+  for trees of more than 32767 nodes)
+- class distributions for leaves only, as uint8 counts out of 255 or as
+  float16
+
+The export is a compiled forest directory (see forest_engine.py) that
+load_compiled_forest, the model registry and the API load like any other.
+The script reports artifact size, the RSS and PSS that loading each artifact
+adds to a fresh process, and latency before and after. It refuses to write
+a forest whose top-1 agreement with the original on random inputs is below
+--min-agreement:
+
+    python quantize_model.py [--step 0.05] [--leaf-dtype uint8] [--min-agreement 0.96] [--register]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from benchmark_model_load import memory_usage
+from forest_engine import (CHUNK_SIZE, DEFAULT_MODEL_PATH, CompiledForest, compile_forest,
+                           save_compiled_forest)
+from trait_grid import GRID_MIN, grid_levels
+
+DEFAULT_QUANTIZED_PATH = 'models/career_prediction_model_quantized'
+DEFAULT_STEP = 0.05
+LEAF_DTYPES = ('uint8', 'float16')
+
+# uint8 leaf distributions are stored as counts out of this total
+LEAF_SCALE = 255
+
+class QuantizedForest(CompiledForest):
+    """
+    CompiledForest with thresholds on a trait grid and compact integer arrays.
+
+    Inputs are encoded as grid levels 1..n_levels (the nearest grid value);
+    threshold[i] is the number of grid values <= the original threshold, so
+    a row goes right at node i exactly when its level is greater. children
+    holds tree-local indices, leaf maps each leaf node to its row of value.
+    """
+
+    array_names = ('feature', 'threshold', 'children', 'leaf', 'value', 'roots')
+
+    def __init__(self, classes, feature_names, feature, threshold, children, leaf, value, roots, depth,
+                 step, version=None):
+        self.classes_ = np.asarray(classes)
+        self.feature_names_in_ = np.asarray(feature_names)
+        self.feature = np.asarray(feature)
+        self.threshold = np.asarray(threshold)
+        self.children = np.asarray(children)
+        self.leaf = np.asarray(leaf)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots)
+        self.depth = int(depth)
+        self.step = float(step)
+        self.n_levels = grid_levels(self.step)
+        self.version = version
+
+    def manifest_fields(self):
+        return {'quantization': {'step': self.step}}
+
+    def encode(self, X):
+        """Grid level (1..n_levels) of every trait value."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        levels = np.rint((X - GRID_MIN) / self.step) + 1
+        return np.clip(levels, 1, self.n_levels).astype(np.uint8)
+
+    def apply(self, X):
+        """Return the leaf row of value reached in every tree, as an (n_trees, n_samples) array."""
+        codes = self.encode(X)
+        flat = codes.ravel()
+        row_offsets = np.arange(codes.shape[0]) * codes.shape[1]
+        roots = self.roots.astype(np.intp)[:, None]
+
+        node = np.repeat(roots, codes.shape[0], axis=1)
+        for _ in range(self.depth):
+            split_values = np.take(flat, np.take(self.feature, node) + row_offsets)
+            go_right = split_values > np.take(self.threshold, node)
+            node = np.take(self.children, 2 * node + go_right) + roots
+        return np.take(self.leaf, node)
+
+    def predict_proba(self, X):
+        """Mean class distribution over all trees, renormalized after quantization."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+
+        accumulator = np.uint32 if self.value.dtype == np.uint8 else np.float32
+        proba = np.empty((X.shape[0], self.value.shape[1]))
+        for start in range(0, X.shape[0], CHUNK_SIZE):
+            leaves = self.apply(X[start:start + CHUNK_SIZE])
+            proba[start:start + CHUNK_SIZE] = np.take(self.value, leaves, axis=0).sum(axis=0, dtype=accumulator)
+        # Rounded distributions no longer sum to exactly one per tree
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+def index_dtype(max_value):
+    return np.int16 if max_value <= np.iinfo(np.int16).max else np.int32
+
+def quantize_forest(forest, step=DEFAULT_STEP, leaf_dtype='uint8'):
+    """Quantize a CompiledForest onto a trait grid of the given step."""
+    if leaf_dtype not in LEAF_DTYPES:
+        raise ValueError(f"Leaf dtype must be one of {LEAF_DTYPES}, not {leaf_dtype}")
+    n_levels = grid_levels(step)
+    if n_levels > np.iinfo(np.uint8).max:
+        raise ValueError(f"Grid step {step} gives {n_levels} levels per trait; at most 255 fit in uint8 thresholds")
+    if forest.n_features_in_ > np.iinfo(np.uint8).max + 1:
+        raise ValueError(f"{forest.n_features_in_} features do not fit in uint8 split features")
+
+    n_nodes = len(forest.threshold)
+    roots = np.asarray(forest.roots, dtype=np.intp)
+    tree_sizes = np.diff(np.append(roots, n_nodes))
+    tree_of_node = np.repeat(np.arange(len(roots)), tree_sizes)
+    children = np.asarray(forest.children).reshape(-1, 2)
+    is_leaf = children[:, 0] == np.arange(n_nodes)
+
+    # Number of grid values at or below each threshold: level > code goes right
+    codes = np.floor((np.asarray(forest.threshold) - GRID_MIN) / step + 1e-9) + 1
+    threshold = np.where(is_leaf, 0, np.clip(codes, 0, n_levels)).astype(np.uint8)
+
+    local_children = children - roots[tree_of_node][:, None]
+    leaf = np.where(is_leaf, np.cumsum(is_leaf) - 1, 0)
+
+    value = np.asarray(forest.value)[is_leaf]
+    if leaf_dtype == 'uint8':
+        value = np.rint(value * LEAF_SCALE).astype(np.uint8)
+    else:
+        value = value.astype(np.float16)
+
+    return QuantizedForest(
+        classes=forest.classes_,
+        feature_names=forest.feature_names_in_,
+        feature=np.asarray(forest.feature).astype(np.uint8),
+        threshold=threshold,
+        children=local_children.ravel().astype(index_dtype(tree_sizes.max() - 1)),
+        leaf=leaf.astype(index_dtype(is_leaf.sum() - 1)),
+        value=value,
+        roots=roots.astype(np.int32),
+        depth=forest.depth,
+        step=step
+    )
+
+def agreement(reference, forest, X):
+    """Share of rows with the same top-1 class, and the largest probability difference."""
+    expected = reference.predict_proba(X)
+    actual = forest.predict_proba(X)
+    same = expected.argmax(axis=1) == actual.argmax(axis=1)
+    return float(same.mean()), float(np.abs(expected - actual).max())
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def memory_worker(artifact_format, path):
+    """Body of the --memory-worker process: load one artifact, predict, report the memory it added."""
+    if artifact_format == 'pickle':
+        import pandas as pd
+        import sklearn.ensemble  # noqa: F401 (counted in the baseline, not the model)
+    else:
+        from forest_engine import load_compiled_forest
+    baseline = memory_usage()
+
+    if artifact_format == 'pickle':
+        with open(path, 'rb') as f:
+            model = pickle.load(f)
+        predict = lambda X: model.predict_proba(pd.DataFrame(X, columns=model.feature_names_in_))
+    else:
+        # Memory-mapped, the way the API loads it
+        model = load_compiled_forest(path)
+        predict = model.predict_proba
+    # Scoring many rows touches the pages a worker ends up keeping resident;
+    # small batches keep scoring temporaries out of the figure
+    X = np.random.default_rng(0).uniform(1, 10, (10000, len(model.feature_names_in_)))
+    for start in range(0, len(X), 100):
+        predict(X[start:start + 100])
+
+    usage = memory_usage()
+    print(json.dumps({key: usage[key] - baseline[key] for key in usage}), flush=True)
+
+def memory_added(artifact_format, path):
+    """RSS and PSS (MB) that loading and using an artifact adds to a fresh process."""
+    worker = subprocess.run(
+        [sys.executable, '-W', 'ignore', __file__, '--memory-worker', artifact_format, path],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(worker.stdout)
+
+def latency(forest, X, repeats=200):
+    """Median single-row predict_proba latency in microseconds and batch throughput in rows/s."""
+    forest.predict_proba(X[:1])
+    timings = []
+    for i in range(repeats):
+        start = time.perf_counter()
+        forest.predict_proba(X[i:i + 1])
+        timings.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    forest.predict_proba(X)
+    return float(np.median(timings) * 1e6), len(X) / (time.perf_counter() - start)
+
+def print_report(rows):
+    print(f"\n{'':<12} {'artifact':>10} {'rss':>10} {'pss':>10} {'us/row':>8} {'rows/s':>10}")
+    for name, artifact, memory, single, throughput in rows:
+        pss = f"{memory['pss_mb']:>8.2f}MB" if 'pss_mb' in memory else f"{'-':>10}"
+        print(f"{name:<12} {artifact / 1e6:>8.2f}MB {memory['rss_mb']:>8.2f}MB {pss} {single:>8.0f} {throughput:>10,.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the career forest and report size, memory and latency.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled model to quantize")
+    parser.add_argument('--output', default=DEFAULT_QUANTIZED_PATH, help="where to write the quantized export")
+    parser.add_argument('--step', type=float, default=DEFAULT_STEP, help="trait grid resolution of the thresholds")
+    parser.add_argument('--leaf-dtype', choices=LEAF_DTYPES, default='uint8', help="storage of leaf distributions")
+    # Inputs between grid values are rounded to the nearest one, which moves
+    # decisions by up to step/2, while on-grid rows agree to within leaf
+    # rounding. At the default step, 20 retrains of train_model.py's forest on
+    # differently seeded data agreed on 97.39% to 97.93% of random rows (mean
+    # 97.57%); 0.96 leaves more than a point of margin below all of them and
+    # still rejects step 0.1 (95.6%)
+    parser.add_argument('--min-agreement', type=float, default=0.96,
+                        help="top-1 agreement with the original required on random inputs; at the default "
+                             "step retrained forests measure 97.4-97.9%%, so 0.96 leaves a point of margin")
+    parser.add_argument('--samples', type=int, default=100000, help="random rows for the agreement check")
+    parser.add_argument('--register', action='store_true', help="register the quantized forest in the model registry")
+    parser.add_argument('--memory-worker', nargs=2, metavar=('FORMAT', 'PATH'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.memory_worker:
+        memory_worker(*args.memory_worker)
+        return
+
+    if not os.path.exists(args.model):
+        print(f"Model file not found at {args.model}. Please run train_model.py first.")
+        sys.exit(1)
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+
+    forest = compile_forest(model)
+    try:
+        quantized = quantize_forest(forest, args.step, args.leaf_dtype)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    rng = np.random.default_rng(0)
+    X = rng.uniform(1, 10, (args.samples, forest.n_features_in_))
+    on_grid = GRID_MIN + rng.integers(0, quantized.n_levels, (args.samples, forest.n_features_in_)) * args.step
+    random_agreement, random_diff = agreement(forest, quantized, X)
+    grid_agreement, grid_diff = agreement(forest, quantized, on_grid)
+    print(f"Top-1 agreement on {args.samples} random rows: {random_agreement:.4%} "
+          f"(max probability difference {random_diff:.4f})")
+    print(f"Top-1 agreement on {args.samples} rows on the {args.step:g} grid: {grid_agreement:.4%} "
+          f"(max probability difference {grid_diff:.4f})")
+
+    import pandas as pd
+
+    rows = X[:10000]
+    staging = tempfile.mkdtemp()
+    try:
+        float_path = os.path.join(staging, 'float')
+        quantized_path = os.path.join(staging, 'quantized')
+        save_compiled_forest(forest, float_path)
+        save_compiled_forest(quantized, quantized_path)
+        report = [
+            # sklearn takes a DataFrame; slicing it by rows times the same inputs
+            ('pickle', os.path.getsize(args.model), memory_added('pickle', args.model),
+             *latency(model, pd.DataFrame(rows, columns=forest.feature_names_in_))),
+            ('compiled', directory_size(float_path), memory_added('compiled', float_path), *latency(forest, rows)),
+            ('quantized', directory_size(quantized_path), memory_added('compiled', quantized_path),
+             *latency(quantized, rows))
+        ]
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    print_report(report)
+
+    if random_agreement < args.min_agreement:
+        print(f"\nAgreement {random_agreement:.4%} is below the required {args.min_agreement:.4%}; "
+              f"nothing written. Try a finer --step.")
+        sys.exit(1)
+
+    save_compiled_forest(quantized, args.output)
+    print(f"\nQuantized forest {quantized.version} saved to {args.output}")
+
+    if args.register:
+        from model_registry import ModelRegistry
+        version = ModelRegistry().register(quantized, source=os.path.abspath(args.model))
+        print(f"Registered model version {version} (active)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Incremental refresh of the career forest from recorded feedback.
+
+Retraining on the whole feedback history gets slower as the history grows.
+Instead each refresh reads only the entries logged since the previous one
+(see feedback_log.py), fits --new-trees new trees on them with warm_start
+and retires as many of the oldest trees. The forest keeps its size, a
+refresh costs time proportional to the new feedback only, and after
+n_trees / new_trees refreshes every tree has been fitted on real outcomes.
+
+RandomForestClassifier resets classes_ on every fit, so each fit also sees
+a few anchor rows of every career, labelled by the data generator's rules;
+without them a career nobody chose since the last refresh would shift the
+class indices the existing trees vote with.
+
+Every fifth new entry is held out, and the refreshed model is only written
+if its accuracy on them is not worse than the current model's by more than
+--max-accuracy-loss. It replaces the pickled model and its compiled export
+(and is registered as a new active version with --register); the consumed
+log offset is then saved next to the log:
+
+    python refresh_model.py [--new-trees 10] [--min-feedback 100] [--register]
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from data_generator import CAREERS, DEFAULT_SEED, TRAITS, generate_chunk
+from feedback_log import read_feedback
+from forest_engine import DEFAULT_COMPILED_PATH, DEFAULT_MODEL_PATH, export_compiled_forest
+
+DEFAULT_FEEDBACK_LOG = 'feedback/feedback.jsonl'
+
+# Rule-labelled rows of every career added to each fit
+ANCHOR_ROWS_PER_CLASS = 20
+
+# Every HOLDOUT_EVERY-th new entry is kept out of the fit to compare the models on
+HOLDOUT_EVERY = 5
+
+def state_path(log_path):
+    return log_path + '.state.json'
+
+def read_state(log_path):
+    """Offset of the log consumed by the previous refresh, and when it ran."""
+    try:
+        with open(state_path(log_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'offset': 0}
+
+def write_state(log_path, state):
+    path = state_path(log_path)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def anchor_rows(classes, seed=DEFAULT_SEED):
+    """ANCHOR_ROWS_PER_CLASS rule-labelled trait rows of each of the given careers."""
+    columns = generate_chunk(0, 100 * ANCHOR_ROWS_PER_CLASS * len(CAREERS), seed)
+    X = np.column_stack([columns[trait] for trait in TRAITS])
+    careers = np.array(CAREERS)[columns['Career']]
+    rows = [np.flatnonzero(careers == career)[:ANCHOR_ROWS_PER_CLASS] for career in classes]
+    missing = [career for career, found in zip(classes, rows) if len(found) == 0]
+    if missing:
+        raise ValueError(f"The data generator labels no rows as {missing}; cannot anchor these classes")
+    rows = np.concatenate(rows)
+    return X[rows], careers[rows]
+
+def refresh_forest(model, X, y, new_trees):
+    """Fit new_trees trees on (X, y) with warm_start and retire as many of the oldest trees."""
+    classes = model.classes_.copy()
+    if not 0 < new_trees <= len(model.estimators_):
+        raise ValueError(f"Can replace between 1 and {len(model.estimators_)} trees, not {new_trees}")
+
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + new_trees)
+    model.fit(pd.DataFrame(X, columns=model.feature_names_in_), y)
+    if not np.array_equal(model.classes_, classes):
+        raise ValueError("Refresh data changed the model's classes; every class needs anchor rows")
+
+    model.estimators_ = model.estimators_[new_trees:]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_))
+    return model
+
+def accuracy(model, X, y):
+    if len(y) == 0:
+        return float('nan')
+    return float((model.predict(pd.DataFrame(X, columns=model.feature_names_in_)) == y).mean())
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the career forest with trees fitted on recent feedback.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled model to refresh in place")
+    parser.add_argument('--compiled', default=DEFAULT_COMPILED_PATH, help="compiled export to rewrite")
+    parser.add_argument('--feedback', default=DEFAULT_FEEDBACK_LOG, help="feedback log written by the API")
+    parser.add_argument('--new-trees', type=int, default=10, help="trees added, and oldest trees retired, per refresh")
+    parser.add_argument('--min-feedback', type=int, default=100, help="new entries needed before refreshing")
+    parser.add_argument('--max-accuracy-loss', type=float, default=0.02,
+                        help="accuracy on held-out feedback the refreshed model may give up")
+    parser.add_argument('--register', action='store_true', help="register the refreshed model in the model registry")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"Model file not found at {args.model}. Please run train_model.py first.")
+        sys.exit(1)
+
+    state = read_state(args.feedback)
+    X, careers, offset = read_feedback(args.feedback, state['offset'])
+    if len(careers) < args.min_feedback:
+        print(f"{len(careers)} new feedback entries since the last refresh; waiting for {args.min_feedback}.")
+        return
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    known = np.isin(careers, model.classes_)
+    if not known.all():
+        print(f"Skipping {int((~known).sum())} entries with careers the model does not predict")
+    X, careers = X[known], careers[known]
+
+    holdout = np.arange(len(careers)) % HOLDOUT_EVERY == HOLDOUT_EVERY - 1
+    X_anchor, y_anchor = anchor_rows(model.classes_)
+    X_fit = np.concatenate([X[~holdout], X_anchor])
+    y_fit = np.concatenate([careers[~holdout], y_anchor])
+    before = accuracy(model, X[holdout], careers[holdout])
+
+    start = time.perf_counter()
+    # Seed the new trees by the log position; with a fixed random_state every
+    # refresh of a same-sized forest would draw the same tree seeds
+    model.random_state = offset
+    refresh_forest(model, X_fit, y_fit, args.new_trees)
+    print(f"Fitted {args.new_trees} trees on {len(careers) - holdout.sum()} feedback entries and "
+          f"{len(y_anchor)} anchor rows in {time.perf_counter() - start:.2f}s; retired the {args.new_trees} oldest")
+
+    after = accuracy(model, X[holdout], careers[holdout])
+    print(f"Accuracy on {int(holdout.sum())} held-out feedback entries: {before:.4f} before, {after:.4f} after")
+    if after < before - args.max_accuracy_loss:
+        print(f"The refreshed model loses more than {args.max_accuracy_loss:g} accuracy; nothing written.")
+        sys.exit(1)
+
+    with open(args.model + '.tmp', 'wb') as f:
+        pickle.dump(model, f)
+    os.replace(args.model + '.tmp', args.model)
+    forest = export_compiled_forest(model, args.compiled)
+    print(f"Refreshed model {forest.version} saved to {args.model}")
+
+    if args.register:
+        from model_registry import ModelRegistry
+        version = ModelRegistry().register(forest, source=os.path.abspath(args.model))
+        print(f"Registered model version {version} (active)")
+
+    write_state(args.feedback, {
+        'offset': offset,
+        'refreshed': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'model_version': forest.version
+    })
+
+if __name__ == "__main__":
+    main()
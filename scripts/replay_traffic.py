@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Replay recorded API traffic against a server.
+
+Reads the request logs the API writes (see request_log.py; plain or
+gzipped, files or whole directories) and sends the logged /predict,
+/predict/batch and /feedback requests again on their recorded schedule, or
+--speed times faster (--speed 0 sends them as fast as the connections
+allow). Up to --connections keep-alive connections are used, so the
+recorded bursts and client concurrency reach the server as they happened;
+latency is measured from each request's scheduled time, as in the open-loop
+runs of benchmark_api.py.
+
+Besides throughput and latency percentiles, every response is compared
+with the recorded one: changed status codes, changed top-1 careers and the
+largest change of a top-k probability. Run it before rolling out a new
+model or server mode:
+
+    python replay_traffic.py logs/ --server gunicorn-asgi --speed 2
+    python replay_traffic.py logs/requests-4121.jsonl.gz --url http://127.0.0.1:5000 --max-changed 0.01
+
+--max-changed fails the run (exit status 1) when a larger share of the
+requests changed status or top-1 career. Requests shed with 503 by
+admission control, when recorded or when replayed, say nothing about the
+model and are counted separately.
+
+/feedback requests are skipped unless --include-feedback is given, since a
+replayed entry would be trained on by refresh_model.py as a real outcome.
+A server started by --server writes no request log and keeps its feedback
+log in a temporary directory either way; for --server url, that is up to
+the server.
+"""
+
+import argparse
+import base64
+import glob
+import gzip
+import http.client
+import json
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+from benchmark_api import PERCENTILES, SERVERS, Client, format_ms, start_server, summarize, wait_until_healthy
+
+LOG_PATTERNS = ('requests-*.jsonl', 'requests-*.jsonl.gz')
+BINARY_CONTENT_TYPE = 'application/octet-stream'
+INVALID_CLASS_ID = 255
+N_TRAITS = 5
+
+# Status of requests shed by admission control (see admission.py)
+SHED_STATUS = 503
+
+class Recorded:
+    """A logged request and the response it got."""
+
+    __slots__ = ('time', 'path', 'body', 'content_type', 'status', 'response', 'response_type')
+
+    def __init__(self, time, path, body, content_type, status, response, response_type):
+        self.time = time
+        self.path = path
+        self.body = body
+        self.content_type = content_type
+        self.status = status
+        self.response = response
+        self.response_type = response_type
+
+def log_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in LOG_PATTERNS:
+                files.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def read_log(paths, include_feedback=False):
+    """Logged requests that can be replayed, ordered by time, and the number of skipped lines."""
+    records = []
+    skipped = 0
+    for path in log_files(paths):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                # Truncated records have no bodies to send
+                if entry.get('method') != 'POST' or entry.get('truncated') or (
+                        entry.get('path') == '/feedback' and not include_feedback):
+                    skipped += 1
+                    continue
+                if 'request' in entry:
+                    body, content_type = json.dumps(entry['request']).encode(), 'application/json'
+                elif 'request_b64' in entry:
+                    body, content_type = base64.b64decode(entry['request_b64']), entry['request_type']
+                else:
+                    skipped += 1
+                    continue
+                if 'response' in entry:
+                    response, response_type = entry['response'], 'application/json'
+                elif 'response_b64' in entry:
+                    response, response_type = base64.b64decode(entry['response_b64']), entry['response_type']
+                else:
+                    response, response_type = None, ''
+                records.append(Recorded(entry['time'], entry['path'], body, content_type, entry['status'],
+                                        response, response_type))
+    records.sort(key=lambda record: record.time)
+    return records, skipped
+
+def replay(url, records, speed, connections):
+    """
+    Send every record at its recorded offset divided by speed.
+
+    Returns (results, seconds) with one (latency, status, body, content type)
+    per record.
+    """
+    scheduled = queue.Queue()
+    results = [None] * len(records)
+
+    def sender():
+        client = Client(url)
+        while True:
+            item = scheduled.get()
+            if item is None:
+                break
+            i, send_at = item
+            # Unpaced replays measure from the moment a connection is free
+            send_at = send_at or time.perf_counter()
+            record = records[i]
+            try:
+                status, body, content_type = client.send(record.path, record.body, record.content_type)
+            except (http.client.HTTPException, OSError):
+                status, body, content_type = 0, b'', ''
+            results[i] = (time.perf_counter() - send_at, status, body, content_type)
+        client.close()
+
+    threads = [threading.Thread(target=sender) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    first = records[0].time
+    for i, record in enumerate(records):
+        send_at = None
+        if speed:
+            send_at = start + (record.time - first) / speed
+            delay = send_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        scheduled.put((i, send_at))
+    for _ in threads:
+        scheduled.put(None)
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+def request_rows(record):
+    """Trait rows a request asked to score; requests that are not a list of rows (e.g. rejected ones) count as 1."""
+    if record.content_type == BINARY_CONTENT_TYPE:
+        return len(record.body) // (4 * N_TRAITS)
+    if record.path != '/predict/batch':
+        return 1
+    try:
+        traits = json.loads(record.body).get('personality_traits')
+    except (ValueError, AttributeError):
+        return 1
+    return len(traits) if isinstance(traits, list) else 1
+
+def top_careers(record, response, content_type):
+    """
+    The top-k careers and probabilities of each row of a prediction response.
+
+    Returns a list with a (careers, probabilities) pair per row, None for
+    rows that failed validation; packed responses identify careers by class
+    id. Feedback and error responses, including non-JSON ones such as
+    Flask's HTML 400 page for a malformed body, have no rows.
+    """
+    if content_type.startswith(BINARY_CONTENT_TYPE):
+        n_rows = len(record.body) // (4 * N_TRAITS)
+        if not n_rows or len(response) % (5 * n_rows):
+            return []
+        k = len(response) // (5 * n_rows)
+        rows = np.frombuffer(response, dtype=[('classes', 'u1', (k,)), ('probabilities', '<f4', (k,))])
+        return [None if row['classes'][0] == INVALID_CLASS_ID
+                else (tuple(row['classes'].tolist()), row['probabilities'].astype(float)) for row in rows]
+
+    if not content_type.startswith('application/json'):
+        return []
+    payload = json.loads(response) if isinstance(response, bytes) else response
+    if not isinstance(payload, dict) or payload.get('status') != 'success':
+        return []
+    results = payload['results'] if record.path == '/predict/batch' else [payload]
+    return [None if result is None else
+            (tuple(match['career'] for match in result['top_careers']),
+             np.array([match['probability'] for match in result['top_careers']]))
+            for result in results]
+
+def compare(record, status, response, content_type):
+    """Whether the status or a row's top-1 career changed, and the largest top-k probability change."""
+    if status != record.status:
+        return True, 0.0
+    try:
+        expected = top_careers(record, record.response, record.response_type)
+        actual = top_careers(record, response, content_type)
+    except (ValueError, KeyError, TypeError):
+        return True, 0.0
+    if len(expected) != len(actual):
+        return True, 0.0
+    changed = False
+    delta = 0.0
+    for before, after in zip(expected, actual):
+        if (before is None) != (after is None):
+            changed = True
+        elif before is not None:
+            changed = changed or before[0][0] != after[0][0]
+            if before[0] == after[0]:
+                delta = max(delta, float(np.abs(before[1] - after[1]).max()))
+    return changed, delta
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged API requests and compare the responses.")
+    parser.add_argument('logs', nargs='+', help="request log files or directories holding them")
+    parser.add_argument('--server', choices=SERVERS, default='url',
+                        help="server to replay against, started as in benchmark_api.py, or url")
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server to target with --server url")
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn workers")
+    parser.add_argument('--threads', type=int,
+                        help="threads per gunicorn worker (default: as in gunicorn_flask.conf.py)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="replay speed relative to the recording; 0 sends as fast as possible")
+    parser.add_argument('--connections', type=int, default=64, help="concurrent keep-alive connections")
+    parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    parser.add_argument('--max-changed', type=float,
+                        help="largest share of requests allowed to change status or top-1 career")
+    parser.add_argument('--show', type=int, default=5, help="changed requests to print")
+    parser.add_argument('--include-feedback', action='store_true',
+                        help="replay /feedback requests too; point the server's FEEDBACK_LOG at scratch space")
+    args = parser.parse_args()
+
+    records, skipped = read_log(args.logs, args.include_feedback)
+    records = records[:args.limit]
+    if not records:
+        print(f"No replayable requests in {', '.join(args.logs)}")
+        sys.exit(1)
+    recorded_seconds = records[-1].time - records[0].time
+    print(f"Replaying {len(records)} requests recorded over {recorded_seconds:.1f}s "
+          f"({skipped} log lines skipped) at {f'{args.speed:g}x speed' if args.speed else 'full speed'}")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        # Keep the replayed requests out of the logs being replayed and the feedback trained on
+        env = {'REQUEST_LOG': '0', 'FEEDBACK_LOG': os.path.join(scratch, 'feedback.jsonl')}
+        url, stop = start_server(args, env)
+        try:
+            health = wait_until_healthy(url)
+            results, seconds = replay(url, records, args.speed, args.connections)
+        finally:
+            stop()
+
+    latencies = [result[0] for result in results]
+    statuses = [result[1] for result in results]
+    rows = sum(request_rows(record) for record in records)
+    summary = summarize(latencies, statuses, seconds, rows / len(records))
+    print(f"\n{'req/s':>9} {'rows/s':>10} {'errors':>7} " + ' '.join(f"{f'p{p:g} ms':>9}" for p in PERCENTILES))
+    print(f"{summary['requests_per_second']:>9.1f} {summary['rows_per_second']:>10.0f} {summary['errors']:>7} "
+          + ' '.join(format_ms(summary[f'p{p:g}_ms']) for p in PERCENTILES))
+
+    changed = []
+    deltas = []
+    shed_recorded = shed_replayed = 0
+    for record, (_, status, body, content_type) in zip(records, results):
+        if SHED_STATUS in (record.status, status):
+            shed_recorded += record.status == SHED_STATUS
+            shed_replayed += status == SHED_STATUS
+            continue
+        is_changed, delta = compare(record, status, body, content_type)
+        deltas.append(delta)
+        if is_changed:
+            changed.append((record, status))
+    compared = len(deltas)
+    print(f"\nCompared with the recorded responses (now serving model {health.get('model_version')}):")
+    print(f"  {shed_recorded} requests were shed with {SHED_STATUS} when recorded and {shed_replayed} when "
+          f"replayed; they are left out")
+    print(f"  {len(changed)} of {compared} requests ({len(changed) / max(compared, 1):.2%}) changed status or "
+          f"top-1 career")
+    if deltas:
+        print(f"  top-k probability change: largest {max(deltas):.4f}, p99 {np.percentile(deltas, 99):.4f}")
+    for record, status in changed[:args.show]:
+        change = f"status {record.status} -> {status}" if status != record.status else "top-1 career changed"
+        print(f"  {record.path} at {time.strftime('%H:%M:%S', time.gmtime(record.time))}: {change}")
+
+    if args.max_changed is not None and len(changed) / max(compared, 1) > args.max_changed:
+        print(f"\nMore than {args.max_changed:.2%} of the requests changed")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
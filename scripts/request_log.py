@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Structured log of API requests and their responses.
+
+Request handlers only hand a tuple of already available values (raw request
+and response bodies, status, timing) to RequestLog.record(), which puts it
+on a bounded queue and never blocks: when the queue is full the record is
+dropped and counted. A background thread takes records off the queue in
+batches, turns them into JSON lines and writes each batch with one write.
+
+Each worker writes its own file, requests-<pid>.jsonl in the log directory,
+so workers never contend for a file or rotate one under each other. When
+the file exceeds max_bytes or is older than rotate_seconds it is renamed
+with a timestamp and gzipped, and only the newest `backups` rotated files
+of the directory are kept. Files left by workers that have exited are
+rotated the same way when a new writer starts. A line looks like:
+
+    {"time": 1760781234.123456, "worker": 4121, "method": "POST", "path": "/predict", "status": 200,
+     "duration_ms": 1.82, "request": {"personality_traits": [...]}, "response": {"prediction": ...}}
+
+Packed (application/octet-stream) bodies are stored base64-encoded in
+request_b64 and response_b64; bodies larger than max_body_bytes are left
+out and the record is marked "truncated". replay_traffic.py replays these
+logs against a server.
+"""
+
+import atexit
+import base64
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+# Put on the queue by close() to stop the writer thread
+_STOP = object()
+
+class RequestLog:
+    """Bounded, batched, rotating request log writer for one worker."""
+
+    def __init__(self, directory, max_queue=10000, batch_size=500, flush_interval=1.0,
+                 max_bytes=64 * 1024 * 1024, rotate_seconds=3600, backups=20, max_body_bytes=64 * 1024):
+        self.directory = directory
+        self.max_queue = int(max_queue)
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        self.max_bytes = int(max_bytes)
+        self.rotate_seconds = float(rotate_seconds)
+        self.backups = int(backups)
+        self.max_body_bytes = int(max_body_bytes)
+
+        self._queue = queue.Queue(self.max_queue)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._file = None
+        self._opened = None
+
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        # Servers close the log on shutdown themselves; this covers the other exits
+        atexit.register(self.close)
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own writer
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.max_queue)
+                self._file = None
+                self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def record(self, started, method, path, status, seconds, request_body, request_type,
+               response_body, response_type):
+        """Queue a request for logging; returns False if the queue was full and it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((started, method, path, status, seconds, request_body, request_type,
+                                    response_body, response_type))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'requests-{os.getpid()}.jsonl')
+
+    def _run(self):
+        try:
+            self._rotate_leftovers()
+        except OSError as e:
+            print(f"Error rotating leftover request logs in {self.directory}: {e}")
+        stopping = False
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if any(record is _STOP for record in batch):
+                batch = [record for record in batch if record is not _STOP]
+                stopping = True
+            try:
+                self._write(batch)
+            except OSError as e:
+                self.dropped += len(batch)
+                print(f"Error writing the request log to {self.directory}: {e}")
+
+    def _encode(self, record):
+        started, method, path, status, seconds, request_body, request_type, response_body, response_type = record
+        entry = {
+            'time': round(started, 6),
+            'worker': os.getpid(),
+            'method': method,
+            'path': path,
+            'status': status,
+            'duration_ms': round(seconds * 1000, 3)
+        }
+        bodies = []
+        if len(request_body) + len(response_body) > self.max_body_bytes:
+            entry['truncated'] = True
+        else:
+            for name, body, content_type in (('request', request_body, request_type),
+                                             ('response', response_body, response_type)):
+                if not body:
+                    continue
+                if content_type == 'application/json':
+                    body = body.strip()
+                    # Valid single-line JSON is embedded as it is, which costs a
+                    # fraction of decoding and re-encoding it
+                    if b'\n' not in body and self._is_json(body):
+                        bodies.append(b',"' + name.encode() + b'":' + body)
+                        continue
+                entry[f'{name}_b64'] = base64.b64encode(body).decode('ascii')
+                entry[f'{name}_type'] = content_type
+        line = json.dumps(entry, separators=(',', ':')).encode()
+        return b''.join([line[:-1], *bodies, b'}\n'])
+
+    @staticmethod
+    def _is_json(body):
+        try:
+            json.loads(body)
+        except ValueError:
+            return False
+        return True
+
+    def _write(self, batch):
+        with self._write_lock:
+            if self._pid != os.getpid():
+                return
+            if self._file is not None and (self._file.tell() >= self.max_bytes
+                                           or time.time() - self._opened >= self.rotate_seconds):
+                self._rotate()
+            if not batch:
+                return
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, 'ab')
+                self._opened = time.time()
+            self._file.write(b''.join(self._encode(record) for record in batch))
+            self._file.flush()
+            self.written += len(batch)
+
+    def _rotate(self):
+        """Close the current file, gzip it under a timestamped name and prune old files."""
+        self._file.close()
+        self._file = None
+        self._gzip(self.path, os.getpid())
+        self._prune()
+
+    def _gzip(self, path, pid):
+        """Rename a worker's log file with a timestamp and gzip it."""
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime())
+        rotated = os.path.join(self.directory, f'requests-{pid}-{stamp}-{self.rotations}.jsonl')
+        # Only one writer wins the rename of a leftover file
+        os.replace(path, rotated)
+        self.rotations += 1
+        with open(rotated, 'rb') as source, gzip.open(rotated + '.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(rotated)
+
+    def _rotate_leftovers(self):
+        """Rotate the files of workers that are no longer running."""
+        with self._write_lock:
+            for path in glob.glob(os.path.join(self.directory, 'requests-*.jsonl')):
+                pid = os.path.basename(path)[len('requests-'):-len('.jsonl')]
+                if not pid.isdigit() or int(pid) == os.getpid() or _running(int(pid)):
+                    continue
+                try:
+                    self._gzip(path, pid)
+                except FileNotFoundError:
+                    # Another worker rotated it first
+                    pass
+            self._prune()
+
+    def _prune(self):
+        old = sorted(glob.glob(os.path.join(self.directory, 'requests-*.jsonl.gz')), key=os.path.getmtime)
+        for path in old[:max(0, len(old) - self.backups)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # Another worker pruned it first
+                pass
+
+    def close(self, timeout=5.0):
+        """Stop the writer thread, write everything still queued and close the file."""
+        if self._pid != os.getpid():
+            return
+        if self._thread is not None and self._thread.is_alive():
+            # The writer finishes the batch it holds before it stops
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                self._thread.join(timeout)
+            except queue.Full:
+                pass
+        batch = []
+        try:
+            while True:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        self._write([record for record in batch if record is not _STOP])
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
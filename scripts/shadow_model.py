@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Shadow evaluation of a candidate model on live traffic.
+
+A sampled share of the prediction requests is mirrored to a ShadowScorer
+once the response has been sent. Handlers only draw the sample and queue
+the raw request and response bodies, never waiting: when max_queue jobs are
+already waiting the job is dropped and counted. A small pool of background
+threads decodes each job into the trait rows and the served top-k careers
+and probabilities, scores the rows with the shadow model and records:
+
+- agreement: whether the shadow model's top-1 career is the served one
+- probability delta: the largest absolute difference, over the served
+  top-k careers, between the served probability and the shadow model's
+- shadow latency: the shadow model's predict_proba time
+
+The pool runs in the serving worker and shares its CPU, so sample_rate
+bounds the extra work to about that share of the model calls.
+"""
+
+import os
+import queue
+import random
+import threading
+import time
+import numpy as np
+
+from metrics import Histogram, MAX_LATENCY_US
+
+# Probability deltas are kept in units of 1e-4, so the histogram's
+# power-of-two buckets run from 0.0001 to 1
+DELTA_SCALE = 10000
+
+class ShadowScorer:
+    """
+    Bounded, sampled background scoring of served predictions with a second model.
+
+    decode_fn takes the arguments given to submit() and returns (X, careers,
+    probabilities): the (N, n_features) rows that were served, and the
+    served top-k careers (N, k) and probabilities (N, k) of each.
+    """
+
+    def __init__(self, model, decode_fn, sample_rate=0.1, max_queue=100, workers=1):
+        self.model = model
+        self.decode_fn = decode_fn
+        self.sample_rate = float(sample_rate)
+        self.max_queue = int(max_queue)
+        self.workers = int(workers)
+        self.version = getattr(model, 'version', None)
+        self._classes = [str(c) for c in model.classes_]
+        self._class_index = {career: i for i, career in enumerate(self._classes)}
+
+        self._queue = queue.Queue(self.max_queue)
+        self._lock = threading.Lock()
+        self._pid = None
+
+        self.latencies = Histogram(MAX_LATENCY_US)
+        self.deltas = Histogram(DELTA_SCALE)
+        self.compared = 0
+        self.agreed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _ensure_started(self):
+        # Threads do not survive fork, so each worker starts its own pool
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.max_queue)
+                for i in range(self.workers):
+                    threading.Thread(target=self._run, name=f'shadow-scorer-{i}', daemon=True).start()
+                self._pid = os.getpid()
+
+    def sample(self):
+        """Whether to mirror the current request; draw it before collecting anything for submit()."""
+        return random.random() < self.sample_rate
+
+    def submit(self, *job):
+        """Queue a served request for shadow scoring; returns False if the queue was full and it was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        return True
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._compare(*self.decode_fn(*job))
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Error scoring a request with the shadow model: {e}")
+
+    def _compare(self, X, careers, probabilities):
+        if len(X) == 0:
+            return
+        start = time.perf_counter()
+        shadow = self.model.predict_proba(X)
+        seconds = time.perf_counter() - start
+
+        # Probability the shadow model gives each served career; 0 for
+        # careers it does not know
+        columns = np.array([[self._class_index.get(career, -1) for career in row] for row in careers])
+        shadow_probs = np.where(columns >= 0, np.take_along_axis(shadow, np.maximum(columns, 0), axis=1), 0.0)
+        deltas = np.abs(shadow_probs - probabilities).max(axis=1)
+        shadow_top = [self._classes[i] for i in shadow.argmax(axis=1)]
+        agreed = sum(shadow_career == row[0] for shadow_career, row in zip(shadow_top, careers))
+
+        with self._lock:
+            self.latencies.observe(seconds * 1e6)
+            for delta in deltas.tolist():
+                self.deltas.observe(delta * DELTA_SCALE)
+            self.compared += len(X)
+            self.agreed += agreed
+
+    def stats(self):
+        """Counters of this worker's shadow comparisons."""
+        return {
+            'shadow_version': self.version,
+            'sample_rate': self.sample_rate,
+            'compared': self.compared,
+            'agreed': self.agreed,
+            'agreement': self.agreed / self.compared if self.compared else None,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queue_depth': self.queue_depth
+        }
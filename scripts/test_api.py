@@ -4,11 +4,77 @@
 """
 Test script for the Flask career prediction API.
 This sends sample personality trait data to the API and prints the response.
+
+It also includes a client for the packed float32 protocol of the prediction
+endpoints and a throughput comparison of that protocol against JSON:
+
+    python test_api.py [url] [--compare-packed] [--rows 100000] [--batch-size 1000]
 """
 
+import argparse
 import requests
 import json
 import sys
+import time
+import numpy as np
+
+PACKED_CONTENT_TYPE = 'application/octet-stream'
+INVALID_CLASS_ID = 255
+
+def predict_packed(url, traits, session=requests):
+    """
+    Score an (N, 5) array of traits through the packed protocol of /predict/batch.
+
+    Returns the top career names as an (N, k) object array (None for rows
+    that failed validation) and their float32 probabilities (NaN for those
+    rows).
+    """
+    body = np.ascontiguousarray(traits, dtype='<f4').tobytes()
+    response = session.post(f"{url}/predict/batch", data=body, headers={"Content-Type": PACKED_CONTENT_TYPE})
+    if response.status_code != 200:
+        raise requests.HTTPError(f"{response.status_code}: {response.text}", response=response)
+
+    k = int(response.headers['X-Top-K'])
+    result = np.frombuffer(response.content, dtype=[('classes', 'u1', (k,)), ('probabilities', '<f4', (k,))])
+    careers = np.full(INVALID_CLASS_ID + 1, None, dtype=object)
+    classes = response.headers['X-Career-Classes'].split(',')
+    careers[:len(classes)] = classes
+    return careers[result['classes']], result['probabilities']
+
+def predict_json(url, traits, session=requests):
+    """Score an (N, 5) array of traits through the JSON protocol of /predict/batch; returns the top careers."""
+    response = session.post(f"{url}/predict/batch", json={"personality_traits": np.asarray(traits).tolist()})
+    response.raise_for_status()
+    return [
+        [career['career'] for career in result['top_careers']] if result else [None] * 3
+        for result in response.json()['results']
+    ]
+
+def compare_packed_throughput(url, n_rows=100000, batch_size=1000, seed=0):
+    """Score the same random rows through JSON and packed batches and print rows/s of each."""
+    rng = np.random.default_rng(seed)
+    # float32 values, so both protocols score exactly the same inputs
+    traits = rng.uniform(1, 10, (n_rows, 5)).astype(np.float32)
+    batches = [traits[i:i + batch_size] for i in range(0, n_rows, batch_size)]
+    session = requests.Session()
+
+    timings = {}
+    predictions = {}
+    for name, client in (('json', predict_json), ('packed', predict_packed)):
+        client(url, batches[0], session)
+        start = time.perf_counter()
+        results = [client(url, batch, session) for batch in batches]
+        timings[name] = time.perf_counter() - start
+        if name == 'packed':
+            results = [careers for careers, _ in results]
+        predictions[name] = np.concatenate([np.asarray(result, dtype=object)[:, 0] for result in results])
+
+    agree = (predictions['json'] == predictions['packed']).mean()
+    print(f"Scored {n_rows} rows in batches of {batch_size}:")
+    for name, seconds in timings.items():
+        print(f"  {name:<7} {seconds:6.2f}s  {n_rows / seconds:>10,.0f} rows/s")
+    print(f"  packed is {timings['json'] / timings['packed']:.1f}x faster; "
+          f"top-1 predictions agree on {agree:.2%} of rows")
 
 def test_api(url='http://127.0.0.1:5000'):
     """Test the career prediction API with sample data."""
@@ -83,8 +149,27 @@ def test_api(url='http://127.0.0.1:5000'):
             print(f"Request error: {e}")
             
         print("\n" + "-"*50 + "\n")
+    
+    # Score all profiles again in one packed float32 request
+    print("Testing the packed protocol with all profiles in one request")
+    try:
+        careers, probabilities = predict_packed(url, [test_case['traits'] for test_case in test_cases])
+        for test_case, row_careers, row_probabilities in zip(test_cases, careers, probabilities):
+            matches = ', '.join(f"{career} ({probability:.2f})" for career, probability in zip(row_careers, row_probabilities))
+            print(f"  - {test_case['name']}: {matches}")
+    except requests.RequestException as e:
+        print(f"Request error: {e}")
 
 if __name__ == "__main__":
-    # Allow specifying a different base URL as command line argument
-    base_url = sys.argv[1] if len(sys.argv) > 1 else 'http://localhost:5000'
-    test_api(base_url) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Send sample requests to the career prediction API.")
+    parser.add_argument('url', nargs='?', default='http://localhost:5000', help="base URL of the API")
+    parser.add_argument('--compare-packed', action='store_true',
+                        help="compare the throughput of packed and JSON batch requests instead")
+    parser.add_argument('--rows', type=int, default=100000, help="rows scored by each protocol in the comparison")
+    parser.add_argument('--batch-size', type=int, default=1000, help="rows per request in the comparison")
+    args = parser.parse_args()
+    
+    if args.compare_packed:
+        compare_packed_throughput(args.url, args.rows, args.batch_size)
+    else:
+        test_api(args.url)
\ No newline at end of file
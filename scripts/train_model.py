@@ -14,6 +14,9 @@ from sklearn.metrics import classification_report, accuracy_score
 import pickle
 import os
 
+from data_generator import CAREERS, label_careers
+from forest_engine import export_compiled_forest
+
 # Create directory for model if it doesn't exist
 os.makedirs('models', exist_ok=True)
 
@@ -29,27 +32,9 @@ def generate_sample_data(n_samples=1000):
     agreeableness = np.random.uniform(1, 10, n_samples)
     neuroticism = np.random.uniform(1, 10, n_samples)
     
-    # Define careers based on personality traits
-    careers = []
-    for i in range(n_samples):
-        if openness[i] > 7 and conscientiousness[i] > 7:
-            careers.append('Research Scientist')
-        elif openness[i] > 7 and extraversion[i] > 7:
-            careers.append('Marketing Creative')
-        elif conscientiousness[i] > 7 and agreeableness[i] > 7:
-            careers.append('Healthcare Professional')
-        elif extraversion[i] > 7 and agreeableness[i] > 7:
-            careers.append('Sales Representative')
-        elif conscientiousness[i] > 7 and neuroticism[i] < 4:
-            careers.append('Financial Analyst')
-        elif openness[i] > 7 and neuroticism[i] < 4:
-            careers.append('Software Developer')
-        elif extraversion[i] > 7 and neuroticism[i] < 4:
-            careers.append('Entrepreneur')
-        else:
-            # Assign randomly for other combinations
-            career_options = ['Project Manager', 'Teacher', 'HR Professional', 'Designer']
-            careers.append(np.random.choice(career_options))
+    # Define careers based on personality traits (see data_generator.py)
+    codes = label_careers(openness, conscientiousness, extraversion, agreeableness, neuroticism, np.random)
+    careers = np.array(CAREERS)[codes]
     
     # Create DataFrame
     data = pd.DataFrame({
@@ -120,6 +105,11 @@ def main():
     with open(model_path, 'wb') as f:
         pickle.dump(model, f)
     
+    # Export the compiled forest used by the prediction server
+    compiled_path = 'models/career_prediction_model'
+    print(f"\nExporting compiled forest to {compiled_path}...")
+    export_compiled_forest(model, compiled_path)
+    
     print("\nModel training and saving completed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Out-of-core training of the career prediction forest.
+
+train_model.py holds the whole dataset in one DataFrame. This script trains
+on a chunked dataset written by data_generator.py without ever loading more
+than one chunk: the forest is grown in rounds, each fitting a batch of new
+trees (warm_start) on a random sample of one chunk, and is then evaluated
+on a holdout streamed chunk by chunk. Peak memory is bounded by the chunk
+size and the per-round sample, whatever the dataset size.
+
+    python train_out_of_core.py --data data/synthetic [--trees 100] [--trees-per-round 10] [--rows-per-round 200000]
+
+The pickled model and compiled export are written to the paths
+flask_server.py loads by default.
+"""
+
+import argparse
+import resource
+import time
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from data_generator import DEFAULT_SEED, load_chunk, read_manifest
+from forest_engine import DEFAULT_COMPILED_PATH, DEFAULT_MODEL_PATH, compile_forest, export_compiled_forest
+
+# Rows of each class carried into every round so that every fit sees every
+# class; RandomForestClassifier resets classes_ on each warm_start fit
+EXEMPLARS_PER_CLASS = 20
+
+def peak_memory_mb():
+    """Peak resident set size of this process so far (ru_maxrss is in kB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def holdout_mask(seed, chunk_index, n_rows, fraction):
+    """Rows of a chunk held out for evaluation, fixed by the seed and chunk number."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index, 1)))
+    return rng.random(n_rows) < fraction
+
+def collect_exemplars(path, manifest, seed, holdout_fraction, n_classes):
+    """A few training rows of every class present in the dataset, scanning chunks until all are seen."""
+    X_parts, y_parts = [], []
+    counts = np.zeros(n_classes, dtype=int)
+    for chunk_index in range(len(manifest['chunks'])):
+        X, codes = load_chunk(path, manifest, chunk_index)
+        train = ~holdout_mask(seed, chunk_index, len(codes), holdout_fraction)
+        for code in np.flatnonzero(counts < EXEMPLARS_PER_CLASS):
+            rows = np.flatnonzero(train & (codes == code))[:EXEMPLARS_PER_CLASS - counts[code]]
+            X_parts.append(X[rows])
+            y_parts.append(codes[rows])
+            counts[code] += len(rows)
+        if (counts >= EXEMPLARS_PER_CLASS).all():
+            break
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+def train_streaming(path, n_trees=100, trees_per_round=10, rows_per_round=200_000, max_depth=10,
+                    holdout_fraction=0.2, seed=DEFAULT_SEED):
+    """Grow a RandomForestClassifier over sampled chunks, trees_per_round trees at a time."""
+    manifest = read_manifest(path)
+    classes = np.array(manifest['classes'])
+    n_chunks = len(manifest['chunks'])
+    rng = np.random.default_rng(seed)
+
+    X_exemplars, y_exemplars = collect_exemplars(path, manifest, seed, holdout_fraction, len(classes))
+
+    model = RandomForestClassifier(n_estimators=trees_per_round, max_depth=max_depth, random_state=seed, warm_start=True)
+    chunk_order = rng.permutation(n_chunks)
+    n_rounds = -(-n_trees // trees_per_round)
+    for round_index in range(n_rounds):
+        start = time.perf_counter()
+        chunk_index = int(chunk_order[round_index % n_chunks])
+        X, codes = load_chunk(path, manifest, chunk_index)
+        train = np.flatnonzero(~holdout_mask(seed, chunk_index, len(codes), holdout_fraction))
+        sample = rng.choice(train, size=min(rows_per_round, len(train)), replace=False)
+
+        X_round = np.concatenate([X[sample], X_exemplars])
+        y_round = classes[np.concatenate([codes[sample], y_exemplars])]
+        del X, codes
+
+        model.n_estimators = min(n_trees, (round_index + 1) * trees_per_round)
+        model.fit(pd.DataFrame(X_round, columns=manifest['traits']), y_round)
+        print(f"Round {round_index + 1}/{n_rounds}: {model.n_estimators} trees, {len(y_round)} rows from "
+              f"chunk {chunk_index} in {time.perf_counter() - start:.1f}s (peak RSS {peak_memory_mb():.0f} MB)")
+
+    return model
+
+def evaluate_streaming(forest, path, holdout_fraction=0.2, seed=DEFAULT_SEED):
+    """Confusion matrix of the forest over the holdout rows of every chunk."""
+    manifest = read_manifest(path)
+    classes = list(manifest['classes'])
+    # The forest orders its classes alphabetically, the dataset by code
+    to_code = np.array([classes.index(str(c)) for c in forest.classes_])
+
+    confusion = np.zeros((len(classes), len(classes)), dtype=np.int64)
+    for chunk_index in range(len(manifest['chunks'])):
+        X, codes = load_chunk(path, manifest, chunk_index)
+        holdout = holdout_mask(seed, chunk_index, len(codes), holdout_fraction)
+        predicted = to_code[forest.predict_proba(X[holdout]).argmax(axis=1)]
+        np.add.at(confusion, (codes[holdout], predicted), 1)
+    return confusion
+
+def print_report(confusion, classes):
+    """Accuracy and per-class precision and recall, like sklearn's classification_report."""
+    print(f"Accuracy: {np.trace(confusion) / confusion.sum():.4f}")
+    print(f"\n{'':>24} {'precision':>9} {'recall':>9} {'support':>9}")
+    for i, career in enumerate(classes):
+        predicted = confusion[:, i].sum()
+        support = confusion[i].sum()
+        precision = confusion[i, i] / predicted if predicted else 0.0
+        recall = confusion[i, i] / support if support else 0.0
+        print(f"{career:>24} {precision:>9.2f} {recall:>9.2f} {support:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the career forest on a chunked dataset without loading it into memory.")
+    parser.add_argument('--data', required=True, help="dataset directory written by data_generator.py")
+    parser.add_argument('--trees', type=int, default=100, help="trees in the final forest")
+    parser.add_argument('--trees-per-round', type=int, default=10, help="trees fitted on each sampled chunk")
+    parser.add_argument('--rows-per-round', type=int, default=200_000, help="rows sampled from a chunk per round")
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--holdout', type=float, default=0.2, help="fraction of every chunk held out for evaluation")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="where to write the pickled model")
+    parser.add_argument('--compiled', default=DEFAULT_COMPILED_PATH, help="where to write the compiled export")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = train_streaming(args.data, args.trees, args.trees_per_round, args.rows_per_round,
+                            args.max_depth, args.holdout, args.seed)
+    print(f"\nTrained {model.n_estimators} trees in {time.perf_counter() - start:.1f}s")
+
+    print("\nEvaluating on the streamed holdout...")
+    confusion = evaluate_streaming(compile_forest(model), args.data, args.holdout, args.seed)
+    print_report(confusion, read_manifest(args.data)['classes'])
+
+    print(f"\nSaving model to {args.model}...")
+    with open(args.model, 'wb') as f:
+        pickle.dump(model, f)
+    print(f"Exporting compiled forest to {args.compiled}...")
+    export_compiled_forest(model, args.compiled)
+
+    print(f"\nPeak memory: {peak_memory_mb():.0f} MB RSS")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Precomputed lookup table of career predictions over the trait grid.
+
+Quiz answers map to scores between 1 and 10 on each of the five traits, so
+at a fixed resolution every possible answer can be scored once ahead of time.
+The table stores, for each grid cell, the predicted class and the top 3
+classes with their probabilities (uint8 class ids and float16 probabilities,
+about 25 MB at the default 0.5 step). Serving an on-grid input is then a
+single index computation.
+
+Run this script to build the table for the current model:
+
+    python trait_grid.py [--step 0.5]
+"""
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+from forest_engine import DEFAULT_COMPILED_PATH, DEFAULT_MODEL_PATH, load_forest, top_k_classes
+
+DEFAULT_GRID_PATH = 'models/career_trait_grid.npz'
+DEFAULT_STEP = 0.5
+GRID_MIN = 1.0
+GRID_MAX = 10.0
+
+# Cells scored per predict_proba call while building the table
+BUILD_CHUNK_SIZE = 65536
+
+class TraitGrid:
+    """Dense table of predictions indexed by the grid cell of a trait vector."""
+
+    def __init__(self, classes, step, predicted, top_classes, top_probs, model_version=None):
+        self.classes_ = np.asarray(classes)
+        self.model_version = model_version
+        self.step = float(step)
+        self.n_levels = grid_levels(self.step)
+        self.predicted = predicted
+        self.top_classes = top_classes
+        self.top_probs = top_probs
+
+    @property
+    def k(self):
+        return self.top_classes.shape[1]
+
+    def locate(self, X):
+        """
+        Map trait vectors to grid cells.
+
+        Returns a boolean mask of the rows lying exactly on the grid and the
+        flat cell index of every row (only meaningful where the mask is set).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        scaled = (X - GRID_MIN) / self.step
+        levels = np.rint(scaled)
+        on_grid = ((np.abs(scaled - levels) <= 1e-9) & (levels >= 0) & (levels < self.n_levels)).all(axis=1)
+
+        levels = np.where(on_grid[:, None], levels, 0).astype(np.intp)
+        cells = levels @ (self.n_levels ** np.arange(X.shape[1] - 1, -1, -1))
+        return on_grid, cells
+
+def grid_levels(step):
+    """Number of grid values per trait between GRID_MIN and GRID_MAX."""
+    n_steps = (GRID_MAX - GRID_MIN) / step
+    if step <= 0 or abs(n_steps - round(n_steps)) > 1e-9:
+        raise ValueError(f"Grid step {step} must evenly divide the {GRID_MIN:g}-{GRID_MAX:g} trait range")
+    return int(round(n_steps)) + 1
+
+def grid_points(n_levels, n_features, step, cells):
+    """Trait vectors of the given flat cell indices."""
+    levels = np.stack(np.unravel_index(cells, (n_levels,) * n_features), axis=1)
+    return GRID_MIN + levels * step
+
+def build_trait_grid(forest, step=DEFAULT_STEP, k=3):
+    """Score every grid cell with the forest and return the resulting TraitGrid."""
+    n_levels = grid_levels(step)
+    n_features = forest.n_features_in_
+    n_cells = n_levels ** n_features
+    if len(forest.classes_) > 256:
+        raise ValueError("uint8 class ids support at most 256 classes")
+
+    predicted = np.empty(n_cells, dtype=np.uint8)
+    top_classes = np.empty((n_cells, k), dtype=np.uint8)
+    top_probs = np.empty((n_cells, k), dtype=np.float16)
+
+    for start in range(0, n_cells, BUILD_CHUNK_SIZE):
+        cells = np.arange(start, min(start + BUILD_CHUNK_SIZE, n_cells))
+        probabilities = forest.predict_proba(grid_points(n_levels, n_features, step, cells))
+        top = top_k_classes(probabilities, k)
+
+        predicted[cells] = probabilities.argmax(axis=1)
+        top_classes[cells] = top
+        top_probs[cells] = np.take_along_axis(probabilities, top, axis=1)
+
+    return TraitGrid(forest.classes_, step, predicted, top_classes, top_probs, forest.version)
+
+def save_trait_grid(grid, path=DEFAULT_GRID_PATH):
+    """Write the table to an uncompressed .npz file."""
+    extra = {}
+    if grid.model_version is not None:
+        extra['model_version'] = np.array(grid.model_version)
+    np.savez(
+        path,
+        classes=grid.classes_,
+        step=np.array(grid.step),
+        predicted=grid.predicted,
+        top_classes=grid.top_classes,
+        top_probs=grid.top_probs,
+        **extra
+    )
+
+def load_trait_grid(path=DEFAULT_GRID_PATH):
+    """Load a table written by save_trait_grid."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Trait grid not found at {path}. Please run trait_grid.py first.")
+
+    with np.load(path, allow_pickle=False) as arrays:
+        return TraitGrid(
+            classes=arrays['classes'],
+            step=arrays['step'],
+            predicted=arrays['predicted'],
+            top_classes=arrays['top_classes'],
+            top_probs=arrays['top_probs'],
+            model_version=str(arrays['model_version']) if 'model_version' in arrays else None
+        )
+
+def export_trait_grid(forest, path=DEFAULT_GRID_PATH, step=DEFAULT_STEP):
+    """Build the table for the forest and save it."""
+    n_cells = grid_levels(step) ** forest.n_features_in_
+    print(f"Scoring {n_cells} trait grid cells at step {step:g}...")
+    start = time.perf_counter()
+    grid = build_trait_grid(forest, step)
+    save_trait_grid(grid, path)
+    print(f"Trait grid built in {time.perf_counter() - start:.1f}s; saved to {path} "
+          f"({os.path.getsize(path) / 1e6:.1f} MB)")
+    return grid
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the trait grid lookup table for the current model.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled model")
+    parser.add_argument('--compiled', default=DEFAULT_COMPILED_PATH, help="compiled forest export")
+    parser.add_argument('--output', default=DEFAULT_GRID_PATH, help="where to write the table")
+    parser.add_argument('--step', type=float, default=DEFAULT_STEP, help="grid resolution in trait points")
+    args = parser.parse_args()
+
+    try:
+        forest = load_forest(args.model, args.compiled)
+        export_trait_grid(forest, args.output, args.step)
+    except (FileNotFoundError, ValueError) as e:
+        print(e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
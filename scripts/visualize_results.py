@@ -4,54 +4,201 @@
 """
 This script visualizes the results from the trained RandomForestClassifier,
 including career distribution and feature importance.
+
+Each plot is keyed by a hash of its inputs (the model file, the data
+parameters and this script), and plots whose key has not changed since the
+last run are skipped. The aggregates behind the plots (career counts,
+per-career trait means, trait correlations and the confusion matrix) are
+computed in one streaming pass over the data, so a chunked dataset from
+data_generator.py never has to fit in memory, and the figures are then
+rendered in parallel worker processes:
+
+    python visualize_results.py [--data data/synthetic] [--workers 4] [--force]
 """
 
+import argparse
+import hashlib
+import json
+import os
 import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-import pandas as pd
+import matplotlib
+# Render to files only; no display is needed or wanted in worker processes
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import os
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import confusion_matrix, ConfusionMatrixDisplay
 
-# Import functions from train_model.py
-from train_model import generate_sample_data
+from data_generator import CAREERS, TRAITS, iter_chunks, read_manifest
 
-def load_model(model_path='models/career_prediction_model.pkl'):
+DEFAULT_MODEL_PATH = 'models/career_prediction_model.pkl'
+PLOTS_DIR = 'plots'
+CACHE_NAME = '.plot_cache.json'
+
+PLOTS = {
+    'career_distribution': ('data',),
+    'feature_importance': ('model',),
+    'trait_correlations': ('data',),
+    'traits_by_career': ('data',),
+    'confusion_matrix': ('data', 'model')
+}
+
+def load_model(model_path=DEFAULT_MODEL_PATH):
     """Load the trained model from disk."""
     if not os.path.exists(model_path):
         raise FileNotFoundError(f"Model file not found at {model_path}. Please run train_model.py first.")
-    
+
     with open(model_path, 'rb') as f:
         model = pickle.load(f)
-    
+
     return model
 
-def plot_career_distribution(data):
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def input_fingerprints(model_path, data_path, n_samples):
+    """Hashes of the inputs each plot can depend on."""
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at {model_path}. Please run train_model.py first.")
+
+    if data_path is None:
+        data = {'source': 'generate_sample_data', 'n_samples': n_samples}
+    else:
+        # Chunks are written once per dataset, so names, sizes and mtimes identify them
+        manifest = read_manifest(data_path)
+        data = {'source': os.path.abspath(data_path), 'manifest': manifest, 'chunks': [
+            [name, os.path.getsize(os.path.join(data_path, name)), os.path.getmtime(os.path.join(data_path, name))]
+            for name in manifest['chunks']
+        ]}
+    return {
+        'model': file_hash(model_path),
+        'data': hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest(),
+        'code': file_hash(os.path.abspath(__file__))
+    }
+
+def plot_keys(fingerprints):
+    return {
+        name: hashlib.sha256(json.dumps([name, fingerprints['code']] + [fingerprints[i] for i in inputs]).encode()).hexdigest()
+        for name, inputs in PLOTS.items()
+    }
+
+class StreamingAggregates:
+    """Career counts, per-career trait sums, trait co-moments and a confusion matrix, updated chunk by chunk."""
+
+    # Traits are shifted by the middle of the scale before squaring to keep
+    # the running sums well conditioned
+    SHIFT = 5.5
+
+    def __init__(self, careers, model_classes):
+        self.careers = list(careers)
+        self.model_classes = [str(c) for c in model_classes]
+        n_traits = len(TRAITS)
+        self.n = 0
+        self.counts = np.zeros(len(self.careers), dtype=np.int64)
+        self.trait_sums_by_career = np.zeros((len(self.careers), n_traits))
+        self.sums = np.zeros(n_traits)
+        self.cross = np.zeros((n_traits, n_traits))
+        self.confusion = np.zeros((len(self.model_classes), len(self.model_classes)), dtype=np.int64)
+        # Dataset career code -> row of the confusion matrix (model class order)
+        self._to_model = np.array([self.model_classes.index(career) if career in self.model_classes else -1
+                                   for career in self.careers])
+        # Evaluated rows per dataset career code whose career the model does not know
+        self.unknown = np.zeros(len(self.careers), dtype=np.int64)
+
+    def update(self, X, codes):
+        """Add a chunk of traits and career codes to the distribution aggregates."""
+        self.n += len(codes)
+        self.counts += np.bincount(codes, minlength=len(self.careers))
+        np.add.at(self.trait_sums_by_career, codes, X)
+        shifted = X - self.SHIFT
+        self.sums += shifted.sum(axis=0)
+        self.cross += shifted.T @ shifted
+
+    def update_confusion(self, codes, predicted):
+        """Add true career codes and predicted model class indices to the confusion matrix."""
+        rows = self._to_model[codes]
+        known = rows >= 0
+        self.unknown += np.bincount(codes[~known], minlength=len(self.careers))
+        np.add.at(self.confusion, (rows[known], predicted[known]), 1)
+
+    def unknown_careers(self):
+        """Careers the model does not know that were left out of the confusion matrix, with their row counts."""
+        return {self.careers[i]: int(self.unknown[i]) for i in np.flatnonzero(self.unknown)}
+
+    def correlations(self):
+        mean = self.sums / self.n
+        covariance = self.cross / self.n - np.outer(mean, mean)
+        std = np.sqrt(np.diag(covariance))
+        return covariance / np.outer(std, std)
+
+    def career_means(self):
+        """Mean traits of each career present in the data, careers in alphabetical order."""
+        present = [i for i in np.argsort(self.careers) if self.counts[i]]
+        return [self.careers[i] for i in present], self.trait_sums_by_career[present] / self.counts[present, None]
+
+def aggregate(model, data_path, n_samples):
+    """
+    Compute every aggregate in one pass over the data.
+
+    Without data_path this is train_model.py's sample data, with the
+    confusion matrix over the same test split train_model.py evaluated on.
+    With data_path it is a chunked dataset, streamed, with the confusion
+    matrix over the holdout rows train_out_of_core.py does not train on.
+    """
+    from forest_engine import compile_forest
+    forest = compile_forest(model)
+    aggregates = StreamingAggregates(CAREERS, model.classes_)
+
+    if data_path is None:
+        from sklearn.model_selection import train_test_split
+        from train_model import generate_sample_data
+        data = generate_sample_data(n_samples)
+        X = data[TRAITS].to_numpy()
+        codes = np.array([CAREERS.index(career) for career in data['Career']])
+        aggregates.update(X, codes)
+        _, X_test, _, codes_test = train_test_split(X, codes, test_size=0.2, random_state=42)
+        aggregates.update_confusion(codes_test, forest.predict_proba(X_test).argmax(axis=1))
+        return aggregates
+
+    from train_out_of_core import holdout_mask
+    manifest = read_manifest(data_path)
+    if manifest['classes'] != CAREERS:
+        raise ValueError(f"Dataset at {data_path} has classes {manifest['classes']}, expected {CAREERS}")
+    for chunk_index, (X, codes) in enumerate(iter_chunks(data_path)):
+        aggregates.update(X, codes)
+        holdout = holdout_mask(manifest['seed'], chunk_index, len(codes), 0.2)
+        aggregates.update_confusion(codes[holdout], forest.predict_proba(X[holdout]).argmax(axis=1))
+    return aggregates
+
+def save_plot(name):
+    path = os.path.join(PLOTS_DIR, f'{name}.png')
+    plt.savefig(path)
+    plt.close('all')
+    return path
+
+def plot_career_distribution(careers, counts):
     """Plot the distribution of careers in the dataset."""
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+
     plt.figure(figsize=(12, 6))
-    career_counts = data['Career'].value_counts()
-    
-    career_counts.plot(kind='bar', color='skyblue')
+    plt.bar(range(len(order)), counts[order], color='skyblue')
     plt.title('Distribution of Careers in Dataset', fontsize=15)
     plt.xlabel('Career', fontsize=12)
     plt.ylabel('Count', fontsize=12)
-    plt.xticks(rotation=45, ha='right')
+    plt.xticks(range(len(order)), [careers[i] for i in order], rotation=45, ha='right')
     plt.tight_layout()
-    
-    # Save the plot
-    os.makedirs('plots', exist_ok=True)
-    plt.savefig('plots/career_distribution.png')
-    plt.close()
-    
-    print(f"Career distribution plot saved to plots/career_distribution.png")
-
-def plot_feature_importance(model, feature_names):
+
+    return save_plot('career_distribution')
+
+def plot_feature_importance(importances, feature_names):
     """Plot feature importance from the trained model."""
-    # Get feature importance
-    importances = model.feature_importances_
     indices = np.argsort(importances)[::-1]
-    
+
     plt.figure(figsize=(10, 6))
     plt.bar(range(len(importances)), importances[indices], color='skyblue')
     plt.title('Feature Importance', fontsize=15)
@@ -59,49 +206,33 @@ def plot_feature_importance(model, feature_names):
     plt.ylabel('Importance', fontsize=12)
     plt.xticks(range(len(importances)), [feature_names[i] for i in indices], rotation=45, ha='right')
     plt.tight_layout()
-    
-    # Save the plot
-    os.makedirs('plots', exist_ok=True)
-    plt.savefig('plots/feature_importance.png')
-    plt.close()
-    
-    print(f"Feature importance plot saved to plots/feature_importance.png")
-
-def plot_trait_correlations(data):
+
+    return save_plot('feature_importance')
+
+def plot_trait_correlations(corr):
     """Plot correlations between personality traits."""
-    traits = ['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness', 'Neuroticism']
-    
-    # Calculate correlation matrix
-    corr = data[traits].corr()
-    
     plt.figure(figsize=(10, 8))
     plt.imshow(corr, cmap='coolwarm', vmin=-1, vmax=1)
-    
+
     # Add correlation values
-    for i in range(len(traits)):
-        for j in range(len(traits)):
-            plt.text(j, i, f'{corr.iloc[i, j]:.2f}', 
+    for i in range(len(TRAITS)):
+        for j in range(len(TRAITS)):
+            plt.text(j, i, f'{corr[i, j]:.2f}',
                      ha='center', va='center', color='black')
-    
+
     plt.colorbar()
     plt.title('Correlation Between Personality Traits', fontsize=15)
-    plt.xticks(range(len(traits)), traits, rotation=45)
-    plt.yticks(range(len(traits)), traits)
+    plt.xticks(range(len(TRAITS)), TRAITS, rotation=45)
+    plt.yticks(range(len(TRAITS)), TRAITS)
     plt.tight_layout()
-    
-    # Save the plot
-    os.makedirs('plots', exist_ok=True)
-    plt.savefig('plots/trait_correlations.png')
-    plt.close()
-    
-    print(f"Trait correlations plot saved to plots/trait_correlations.png")
-
-def plot_traits_by_career(data):
+
+    return save_plot('trait_correlations')
+
+def plot_traits_by_career(careers, means):
     """Plot average personality traits for each career."""
-    # Group by career and calculate mean of traits
-    career_traits = data.groupby('Career')[['Openness', 'Conscientiousness', 'Extraversion', 'Agreeableness', 'Neuroticism']].mean()
-    
-    plt.figure(figsize=(14, 8))
+    import pandas as pd
+
+    career_traits = pd.DataFrame(means, index=pd.Index(careers, name='Career'), columns=TRAITS)
     career_traits.plot(kind='bar', figsize=(14, 8))
     plt.title('Average Personality Traits by Career', fontsize=15)
     plt.xlabel('Career', fontsize=12)
@@ -109,64 +240,110 @@ def plot_traits_by_career(data):
     plt.legend(title='Personality Trait')
     plt.xticks(rotation=45, ha='right')
     plt.tight_layout()
-    
-    # Save the plot
-    os.makedirs('plots', exist_ok=True)
-    plt.savefig('plots/traits_by_career.png')
-    plt.close()
-    
-    print(f"Traits by career plot saved to plots/traits_by_career.png")
-
-def plot_confusion_matrix(model, X_test, y_test):
+
+    return save_plot('traits_by_career')
+
+def plot_confusion_matrix(confusion, labels):
     """Plot confusion matrix for the model predictions."""
-    y_pred = model.predict(X_test)
-    
-    # Create and plot confusion matrix
-    cm = confusion_matrix(y_test, y_pred, labels=model.classes_)
-    disp = ConfusionMatrixDisplay(confusion_matrix=cm, display_labels=model.classes_)
-    
+    from sklearn.metrics import ConfusionMatrixDisplay
+
+    disp = ConfusionMatrixDisplay(confusion_matrix=confusion, display_labels=labels)
     plt.figure(figsize=(12, 10))
     disp.plot(cmap='Blues', xticks_rotation=45)
     plt.title('Confusion Matrix', fontsize=15)
     plt.tight_layout()
-    
-    # Save the plot
-    os.makedirs('plots', exist_ok=True)
-    plt.savefig('plots/confusion_matrix.png')
-    plt.close()
-    
-    print(f"Confusion matrix plot saved to plots/confusion_matrix.png")
+
+    return save_plot('confusion_matrix')
+
+PLOT_FUNCTIONS = {
+    'career_distribution': plot_career_distribution,
+    'feature_importance': plot_feature_importance,
+    'trait_correlations': plot_trait_correlations,
+    'traits_by_career': plot_traits_by_career,
+    'confusion_matrix': plot_confusion_matrix
+}
+
+def plot_arguments(name, model, aggregates):
+    """The small arrays a plot is drawn from, so workers never see the data or the model."""
+    if name == 'career_distribution':
+        return aggregates.careers, aggregates.counts
+    if name == 'feature_importance':
+        return model.feature_importances_, list(model.feature_names_in_)
+    if name == 'trait_correlations':
+        return (aggregates.correlations(),)
+    if name == 'traits_by_career':
+        return aggregates.career_means()
+    return aggregates.confusion, aggregates.model_classes
+
+def _render(task):
+    name, args = task
+    return PLOT_FUNCTIONS[name](*args)
+
+def load_cache():
+    try:
+        with open(os.path.join(PLOTS_DIR, CACHE_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache):
+    with open(os.path.join(PLOTS_DIR, CACHE_NAME), 'w') as f:
+        json.dump(cache, f, indent=2)
 
 def main():
+    parser = argparse.ArgumentParser(description="Render plots of the training data and model.")
+    parser.add_argument('--model', default=DEFAULT_MODEL_PATH, help="pickled model")
+    parser.add_argument('--data', help="chunked dataset from data_generator.py (default: train_model.py sample data)")
+    parser.add_argument('--samples', type=int, default=1000, help="rows of sample data when --data is not given")
+    parser.add_argument('--workers', type=int, help="rendering processes (default: number of cores)")
+    parser.add_argument('--force', action='store_true', help="render every plot even if its inputs are unchanged")
+    args = parser.parse_args()
+
     print("Visualizing model results...")
-    
+
     try:
-        # Generate the same data used for training
-        data = generate_sample_data()
-        
-        # Load the trained model
-        model = load_model()
-        
-        # Create visualizations
-        plot_career_distribution(data)
-        plot_feature_importance(model, data.drop('Career', axis=1).columns)
-        plot_trait_correlations(data)
-        plot_traits_by_career(data)
-        
-        # Split for confusion matrix
-        from sklearn.model_selection import train_test_split
-        X = data.drop('Career', axis=1)
-        y = data['Career']
-        _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-        
-        plot_confusion_matrix(model, X_test, y_test)
-        
-        print("\nAll visualizations have been saved to the 'plots' directory.")
-        
-    except FileNotFoundError as e:
+        os.makedirs(PLOTS_DIR, exist_ok=True)
+        keys = plot_keys(input_fingerprints(args.model, args.data, args.samples))
+        cache = load_cache()
+        stale = [
+            name for name in PLOTS
+            if args.force or cache.get(name) != keys[name]
+            or not os.path.exists(os.path.join(PLOTS_DIR, f'{name}.png'))
+        ]
+        for name in PLOTS:
+            if name not in stale:
+                print(f"{name} is up to date")
+        if not stale:
+            print(f"\nAll visualizations in the '{PLOTS_DIR}' directory are up to date.")
+            return
+
+        model = load_model(args.model)
+        aggregates = None
+        if any('data' in PLOTS[name] for name in stale):
+            aggregates = aggregate(model, args.data, args.samples)
+            unknown = aggregates.unknown_careers()
+            if unknown:
+                print(f"Left {sum(unknown.values())} evaluated rows out of the confusion matrix; the model does not "
+                      f"know their careers: {', '.join(f'{career} ({n})' for career, n in unknown.items())}")
+        tasks = [(name, plot_arguments(name, model, aggregates)) for name in stale]
+
+        workers = min(len(tasks), args.workers or os.cpu_count() or 1)
+        if workers == 1:
+            paths = [_render(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                paths = list(executor.map(_render, tasks))
+
+        for name, path in zip(stale, paths):
+            cache[name] = keys[name]
+            print(f"{name.replace('_', ' ').capitalize()} plot saved to {path}")
+        save_cache(cache)
+
+        print(f"\nAll visualizations have been saved to the '{PLOTS_DIR}' directory.")
+
+    except (FileNotFoundError, ValueError) as e:
         print(e)
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()